@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# (c) EMBL-EBI 2024
+"""Check the vectorised trace converters in src/utilities.py give the same
+values as the former loop-based ones, and time both.
+
+Values are taken from the trace files listed in a benchmarking JSON file
+(e.g. tracefiles.json) if given, otherwise from a synthetic trace covering
+every duration and memory format Nextflow writes.
+"""
+
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.utilities import convert_memory, convert_process_names, convert_realtime
+
+
+def reference_convert_memory(mem):
+    """Former loop-based convert_memory()"""
+    raw_mem = []
+    for item in mem:
+        if item == '-' or item == '0':
+            raw_mem.append(0)
+        elif item.endswith('KB'):
+            raw_mem.append(float(item.split()[0]) / 1000)
+        elif item.endswith('MB'):
+            raw_mem.append(float(item.split()[0]))
+        elif item.endswith('GB'):
+            raw_mem.append(float(item.split()[0]) * 1000)
+        else:
+            raw_mem.append(None)  # previously dropped
+    return raw_mem
+
+
+def reference_convert_process_names(processes):
+    """Former loop-based convert_process_names()"""
+    shortened_processses = []
+    for process in processes:
+        if process.startswith(
+            (
+                'PARSE_SEQUENCE', 'SEQUENCE_PRECALC',
+                'AGGREGATE_PARSED_SEQS', 'AGGREGATE_RESULTS',
+                'REPRESENTATIVE_DOMAINS', 'XREFS', 'WRITE_RESULTS'
+            )
+        ):
+            shortened_processses.append(process)
+        elif process.startswith('SEQUENCE_ANALYSIS:'):
+            shortened_processses.append(process.replace('SEQUENCE_ANALYSIS:', ''))
+        else:
+            shortened_processses.append(None)
+    return shortened_processses
+
+
+def reference_convert_realtime(realtimes):
+    """Former loop-based convert_realtime()"""
+    patterns = [
+        (re.compile(r"^(\d+)m$"), lambda m: int(m.group(1)) * 60),
+        (re.compile(r"^(\d+)m\s(\d+)s$"), lambda m: int(m.group(1)) * 60 + int(m.group(2))),
+        (re.compile(r"^(\d+\.\d+|\d+)s$"), lambda m: float(m.group(1))),
+        (re.compile(r"^(\d+)h\s(\d+)s$"), lambda m: int(m.group(1)) * 60 * 60 + int(m.group(2))),
+        (re.compile(r"^(\d+)h\s(\d+)m$"), lambda m: int(m.group(1)) * 60 * 60 + int(m.group(2)) * 60),
+        (re.compile(r"^(\d+)h\s(\d+)m\s(\d+)s$"),
+         lambda m: int(m.group(1)) * 60 * 60 + int(m.group(2)) * 60 + int(m.group(3))),
+    ]
+    raw_realtime = []
+    for value in realtimes:
+        value = value.strip()
+        if value == '-':
+            raw_realtime.append(0)
+            continue
+        if value.endswith('ms'):
+            raw_realtime.append(int(value.strip('ms')) / 1000)
+            continue
+        for pattern, convert in patterns:
+            match = pattern.match(value)
+            if match:
+                raw_realtime.append(convert(match))
+                break
+        else:
+            raw_realtime.append(None)  # previously dropped
+    return raw_realtime
+
+
+def synthetic_trace(n: int, seed: int = 1) -> pd.DataFrame:
+    rng = random.Random(seed)
+    durations = [
+        lambda: f"{rng.randint(0, 999)}ms",
+        lambda: f"{rng.randint(1, 59)}.{rng.randint(0, 9)}s",
+        lambda: f"{rng.randint(1, 59)}s",
+        lambda: f"{rng.randint(1, 59)}m",
+        lambda: f"{rng.randint(1, 59)}m {rng.randint(1, 59)}s",
+        lambda: f"{rng.randint(1, 23)}h {rng.randint(1, 59)}s",
+        lambda: f"{rng.randint(1, 23)}h {rng.randint(1, 59)}m",
+        lambda: f"{rng.randint(1, 23)}h {rng.randint(1, 59)}m {rng.randint(1, 59)}s",
+        lambda: f"{rng.randint(1, 9)}d {rng.randint(1, 23)}h {rng.randint(1, 59)}m {rng.randint(1, 59)}s",
+        lambda: "-",
+    ]
+    memory = [
+        lambda: f"{rng.randint(1, 999)}.{rng.randint(0, 9)} KB",
+        lambda: f"{rng.randint(1, 999)}.{rng.randint(0, 9)} MB",
+        lambda: f"{rng.randint(1, 99)}.{rng.randint(0, 9)} GB",
+        lambda: f"{rng.randint(1, 9)}.{rng.randint(0, 9)} TB",
+        lambda: f"{rng.randint(1, 999)} B",
+        lambda: "0",
+        lambda: "-",
+    ]
+    processes = [
+        'PARSE_SEQUENCE', 'SEQUENCE_PRECALC:LOOKUP_CHECK', 'AGGREGATE_RESULTS', 'XREFS:ENTRIES', 'WRITE_RESULTS',
+        'SEQUENCE_ANALYSIS:PFAM_HMMER_RUNNER', 'SEQUENCE_ANALYSIS:PANTHER_POST_PROCESSER',
+    ]
+    return pd.DataFrame({
+        "realtime": [rng.choice(durations)() for _ in range(n)],
+        "rss": [rng.choice(memory)() for _ in range(n)],
+        "peak_rss": [rng.choice(memory)() for _ in range(n)],
+        "process": [rng.choice(processes) for _ in range(n)],
+    })
+
+
+def compare(name: str, reference: list, observed: pd.Series) -> int:
+    """Count the values the former converter understood that now differ"""
+    reference = pd.Series(reference, index=observed.index)
+    known = reference.notna()
+    if observed.dtype.kind == "f":
+        same = np.isclose(observed[known].astype(float), reference[known].astype(float), rtol=0, atol=0)
+    else:
+        same = (observed[known] == reference[known]).to_numpy()
+    different = int((~same).sum())
+    print(f"{name:<16}: {int(known.sum())} values compared, {different} different, "
+          f"{int((~known).sum())} only understood by the new converter")
+    return different
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="IPS6-benchmarking-converters",
+        description="Compare and time the trace value converters",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("data_files", type=Path, nargs="?", default=None, help="JSON file listing trace files")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of synthetic trace rows")
+    args = parser.parse_args()
+
+    if args.data_files:
+        with open(args.data_files, "r") as fh:
+            paths = sorted({path for file_list in json.load(fh).values() for path in file_list})
+        trace = pd.concat([pd.read_table(path) for path in paths], ignore_index=True)
+    else:
+        trace = synthetic_trace(args.rows)
+
+    different = 0
+    for name, column, reference, vectorised in [
+        ("realtime", "realtime", reference_convert_realtime, convert_realtime),
+        ("rss", "rss", reference_convert_memory, convert_memory),
+        ("peak_rss", "peak_rss", reference_convert_memory, convert_memory),
+        ("process", "process", reference_convert_process_names, convert_process_names),
+    ]:
+        expected, loop_time = timed(reference, trace[column])
+        observed, vector_time = timed(vectorised, trace[column])
+        different += compare(name, expected, observed)
+        print(f"{'':<16}  loop {loop_time:.3f}s, vectorised {vector_time:.3f}s ({len(trace)} rows)")
+
+    if different:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
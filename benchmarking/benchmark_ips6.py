@@ -6,40 +6,62 @@
 import logging
 import json
 import sys
+import time
 
 from pathlib import Path
 from typing import List, Optional
 
+import numpy as np
+import pandas as pd
+
+from src.analysis import (
+    STAGES,
+    concurrency,
+    cpu_efficiency,
+    critical_path,
+    has_timestamps,
+    prepare_tasks,
+    run_summary
+)
 from src.plots import (
     plot_total_runtime,
     plot_process_runtime,
     plot_process_runtime_piechart,
-    plot_overall_summary
+    plot_overall_summary,
+    plot_makespan,
+    plot_concurrency,
+    plot_cpu_efficiency,
+    plot_critical_path
+)
+from src.compare import compare_groups
+from src.render import PlotJob, render_plots
+from src import rightsize
+from src.simulate import Executor, parse_submit_rate, read_executor_settings, simulate, task_resources
+from src.scaling import candidate_batch_sizes, fit_models, nextflow_config, recommend
+from src.utilities import (
+    build_compare_parser,
+    build_parser,
+    build_recommend_parser,
+    build_rightsize_parser,
+    build_simulate_parser,
+    build_watch_parser,
+    load_data,
+    parse_memory
 )
-from src.utilities import build_parser, load_data
+from src.watch import RollingStats, TraceTail, format_summary, write_prometheus
 
 
 logger = logging.getLogger(__name__)
 
 
-def main(argv: Optional[List[str]] = None):
-    if argv is None:
-        parser = build_parser()
-        args = parser.parse_args()
-    else:
-        parser = build_parser(argv)
-        args = parser.parse_args()
-
-    if not args.data_files.exists():
-        logger.error("Could not find file listing trace files at %s", args.data_files)
+def read_trace_files(data_files: Path) -> dict[str, list[str]]:
+    """Read the JSON file listing the trace files of each group, exit if any file is missing"""
+    if not data_files.exists():
+        logger.error("Could not find file listing trace files at %s", data_files)
         sys.exit(1)
 
-    if not args.outdir.is_dir():
-        args.outdir.mkdir(parents=True, exist_ok=True)
-
     missing_files = set()
-    group_order = []
-    with open(args.data_files, "r") as fh:
+    with open(data_files, "r") as fh:
         trace_files = json.load(fh)
     trace_file_paths = {}
 
@@ -47,111 +69,326 @@ def main(argv: Optional[List[str]] = None):
         trace_file_paths[str(grp)] = file_list
 
     for grp, paths in trace_file_paths.items():
-        group_order.append(grp)
         for fp in paths:
             if not Path(fp).exists():
                 missing_files.add(fp)
 
     if missing_files:
-        missing_files = ''.join(missing_files)
+        missing_files = '\n'.join(missing_files)
         logger.error("Could not find the following trace file(s):\n%s", missing_files)
         sys.exit(1)
 
-    all_data = load_data(trace_file_paths, args)
-    all_data.to_csv("benchmarking/test.csv")
+    return trace_file_paths
 
-    plot_total_runtime(
-        all_data,
-        args.group_name,
-        args.outdir,
-        args.format,
-        group_order
-    )
 
-    plot_process_runtime(
-        all_data,
-        args.group_name,
-        args.outdir,
-        args.format,
-        group_order
-    )
+def compare(argv: List[str]):
+    """Compare a candidate group of runs with a baseline group,
+    exit with status 1 on significant regressions"""
+    args = build_compare_parser().parse_args(argv)
+    trace_file_paths = read_trace_files(args.data_files)
+    for grp in (args.baseline, args.candidate):
+        if grp not in trace_file_paths:
+            logger.error("Group '%s' not found in %s", grp, args.data_files)
+            sys.exit(1)
 
-    plot_process_runtime_piechart(
+    all_data = load_data(
+        {grp: trace_file_paths[grp] for grp in dict.fromkeys([args.baseline, args.candidate])},
+        args
+    )
+    results = compare_groups(
         all_data,
-        args.group_name,
-        args.outdir,
-        args.format
+        "Groups",
+        args.baseline,
+        args.candidate,
+        {"raw_realtime": args.max_runtime_increase, "raw_max_memory": args.max_memory_increase},
+        alpha=args.alpha,
+        min_tasks=args.min_tasks,
+        resamples=args.bootstrap,
+        seed=args.seed
     )
 
-    fig_size = (args.fig_size[0], args.fig_size[1]) if args.fig_size else None
+    if args.outdir:
+        args.outdir.mkdir(parents=True, exist_ok=True)
+        results.to_csv((args.outdir / "compare.csv"), index=False)
 
-    # plot overall memory usage
-    plot_overall_summary(
-        all_data,
-        args.group_name,
-        args.outdir,
-        args.format,
-        "overall_memory_usage",
-        args.group_name if args.group_name else "Groups",
-        args.group_name if args.group_name else "Groups",
-        'raw_memory_MB',
-        'Memory (MB)',
-        'Memory Usuage',
-        'groups',
-        group_order,
-        fig_size
+    regressions = results[results["regression"]]
+    print(f"Baseline: {args.baseline}, candidate: {args.candidate}, {len(results)} process/metric pairs tested")
+    if regressions.empty:
+        print("No significant regression")
+        return
+
+    print(f"{len(regressions)} significant regression(s), ranked by median increase:")
+    print(regressions[[
+        "process", "metric", "baseline_median", "candidate_median",
+        "change_pct", "ci_low_pct", "ci_high_pct", "q_value", "threshold_pct"
+    ]].to_string(index=False, float_format=lambda value: f"{value:.3g}"))
+    sys.exit(1)
+
+
+def recommend_batch_size(argv: List[str]):
+    """Recommend the batch size and process resources from groups of runs with different batch sizes"""
+    args = build_recommend_parser().parse_args(argv)
+    trace_file_paths = read_trace_files(args.data_files)
+    if not all(grp.isdigit() for grp in trace_file_paths):
+        logger.error("Groups must be named after their batch size, got: %s", ", ".join(trace_file_paths))
+        sys.exit(1)
+    if len(trace_file_paths) < 2:
+        logger.error("At least two batch sizes are needed to fit the cost models")
+        sys.exit(1)
+
+    max_memory = parse_memory(pd.Series([args.max_memory])).iloc[0]
+    if pd.isna(max_memory):
+        logger.error("Memory value not recognised: %s", args.max_memory)
+        sys.exit(1)
+
+    sequences = args.sequences or args.benchmark_sequences
+    tested = sorted(int(grp) for grp in trace_file_paths)
+    all_data = load_data(trace_file_paths, args)
+    models = fit_models(all_data, "Groups", args.benchmark_sequences, args.raw)
+    predictions, cpus, batch_size = recommend(
+        models,
+        args.batch_sizes or candidate_batch_sizes(tested),
+        sequences,
+        args.total_cpus,
+        max_memory,
+        args.memory_headroom,
+        args.max_cpus
     )
 
-    # plot overall maximum memory usage
-    plot_overall_summary(
-        all_data,
-        args.group_name,
-        args.outdir,
-        args.format,
-        "overall_max_memory_usage",
-        args.group_name if args.group_name else "Groups",
-        args.group_name if args.group_name else "Groups",
-        'raw_max_memory',
-        'Max. memory (MB)',
-        'Maximum Memory Usage',
-        'groups',
-        group_order,
-        fig_size
+    args.outdir.mkdir(parents=True, exist_ok=True)
+    models.to_csv(args.outdir / "batch_size_models.csv")
+    predictions.to_csv(args.outdir / "batch_size_predictions.csv", index=False)
+    cpus.to_csv(args.outdir / "batch_size_cpus.csv", index_label="batch_size")
+    if batch_size is None:
+        logger.error("No candidate batch size fits in %s: see %s", args.max_memory, args.outdir / "batch_size_predictions.csv")
+        sys.exit(1)
+
+    prediction = predictions.set_index("batch_size").loc[batch_size]
+    prediction["batch_size"] = batch_size
+    config = nextflow_config(models, batch_size, cpus.loc[batch_size], prediction, sequences, args.total_cpus, args.memory_headroom)
+    (args.outdir / "batch_size.config").write_text(config)
+    print(
+        f"Recommended batch size: {batch_size} "
+        f"(predicted makespan {prediction['makespan_s'] / 3600:.2f} h for {sequences} sequences "
+        f"on {args.total_cpus} CPUs, largest task {prediction['max_task_memory_MB']:.0f} MB)\n"
+        f"Use it with: nextflow run ... -c {args.outdir / 'batch_size.config'}"
     )
 
-    # plot mem per process
-    plot_overall_summary(
+
+def rightsize_resources(argv: List[str]):
+    """Compare the requested and used resources of each process, and propose right-sized requests"""
+    args = build_rightsize_parser().parse_args(argv)
+    node_memory = parse_memory(pd.Series([args.node_memory])).iloc[0]
+    if pd.isna(node_memory):
+        logger.error("Memory value not recognised: %s", args.node_memory)
+        sys.exit(1)
+
+    try:
+        selectors = rightsize.read_profiles(args.pipeline_dir, args.profile)
+    except FileNotFoundError:
+        sys.exit(1)
+    process_labels = rightsize.read_process_labels(args.pipeline_dir)
+
+    all_data = load_data(read_trace_files(args.data_files), args)
+    report = rightsize.rightsize(
         all_data,
-        args.group_name,
-        args.outdir,
-        args.format,
-        "memory_per_process",
-        'raw_process',
-        'Process',
-        'raw_memory_MB',
-        'Memory (MB)',
-        'Memory Usage',
-        'process',
-        group_order,
-        fig_size
+        process_labels,
+        selectors,
+        args.quantile,
+        args.memory_headroom,
+        args.time_headroom,
+        args.node_cpus,
+        node_memory,
+        args.raw
     )
 
-    # plot max mem per process
-    plot_overall_summary(
-        all_data,
-        args.group_name,
-        args.outdir,
-        args.format,
-        "max_memory_per_process",
-        'raw_process',
-        'Process',
-        'raw_max_memory',
-        'Max. memory (MB)',
-        'Memory Usage',
-        'process',
-        group_order,
-        fig_size
+    args.outdir.mkdir(parents=True, exist_ok=True)
+    report.to_csv(args.outdir / "rightsize.csv", index=False)
+    (args.outdir / "rightsize.config").write_text(rightsize.nextflow_config(report, args.profile))
+
+    print(report[[
+        "process", "label", "requested_cpus", "cpus_used", "proposed_cpus",
+        "requested_memory_MB", "peak_rss_max_MB", "proposed_memory_MB", "proposed_label",
+        "tasks_per_node", "proposed_tasks_per_node"
+    ]].fillna({"label": "-", "proposed_label": "-"}).to_string(index=False, float_format=lambda value: f"{value:.1f}", na_rep="-"))
+    under = report.loc[report["under_requested"], "process"]
+    if not under.empty:
+        print(f"Under-requested (tasks used more memory or time than requested): {', '.join(under)}")
+    print(f"Use the proposed requests with: nextflow run ... -c {args.outdir / 'rightsize.config'}")
+
+
+def simulate_executor(argv: List[str]):
+    """Predict the makespan of the recorded runs on another executor configuration"""
+    args = build_simulate_parser().parse_args(argv)
+    settings = read_executor_settings(args.pipeline_dir, args.profile)
+    node_memory = parse_memory(pd.Series([args.node_memory])).iloc[0] if args.node_memory else np.inf
+    if pd.isna(node_memory):
+        logger.error("Memory value not recognised: %s", args.node_memory)
+        sys.exit(1)
+    submit_rate = args.submit_rate or settings.get("submitRateLimit")
+    try:
+        submit_rate = parse_submit_rate(submit_rate) if submit_rate else np.inf
+    except ValueError as err:
+        logger.error(err)
+        sys.exit(1)
+
+    cores = args.nodes * args.cores_per_node
+    queue_size = args.queue_size or (cores if args.profile == "local" else int(settings.get("queueSize", cores)))
+    executor = Executor(args.nodes, args.cores_per_node, queue_size, submit_rate, node_memory, args.scheduler_delay)
+
+    all_data = load_data(read_trace_files(args.data_files), args)
+    if not has_timestamps(all_data):
+        sys.exit(1)
+    tasks = prepare_tasks(all_data, "Groups", args.raw)
+    summary = run_summary(tasks, concurrency(tasks, "Groups"), "Groups")
+    results = simulate(task_resources(all_data, tasks, args.raw), summary, "Groups", executor)
+
+    if args.outdir:
+        args.outdir.mkdir(parents=True, exist_ok=True)
+        results.to_csv((args.outdir / "simulate.csv"), index=False)
+
+    print(
+        f"{args.profile} executor: {args.nodes} node(s) x {args.cores_per_node} cores, "
+        f"queue size {queue_size}, submit rate {submit_rate:g}/s"
     )
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.1f}"))
+
+
+def watch(argv: List[str]):
+    """Follow the trace file of a running analysis and report rolling statistics until interrupted"""
+    args = build_watch_parser().parse_args(argv)
+    tail = TraceTail(args.trace_file)
+    stats = RollingStats(args.window, args.raw, args.batch_size)
+
+    try:
+        while True:
+            trace = tail.read()
+            if tail.header is None:
+                logger.warning("Waiting for %s", args.trace_file)
+            stats.update(trace)
+            summary = stats.summary()
+            print(format_summary(summary, stats, args.trace_file), end="\n\n", flush=True)
+            if args.prom_file:
+                write_prometheus(summary, stats, args.prom_file)
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+MODES = {
+    "compare": compare,
+    "recommend": recommend_batch_size,
+    "rightsize": rightsize_resources,
+    "simulate": simulate_executor,
+    "watch": watch,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in MODES:
+        MODES[argv[0]](argv[1:])
+        return
+
+    args = build_parser().parse_args(argv)
+
+    if not args.outdir.is_dir():
+        args.outdir.mkdir(parents=True, exist_ok=True)
+
+    trace_file_paths = read_trace_files(args.data_files)
+    group_order = list(trace_file_paths)
+
+    all_data = load_data(trace_file_paths, args)
+    grp_col = args.group_name if args.group_name else "Groups"
+    # Each figure only gets the columns it plots, so unrelated columns do not change its hash
+    plot_data = all_data[[grp_col, "Run", "raw_process", "raw_realtime", "raw_memory_MB", "raw_max_memory"]]
+    common = {"group": args.group_name, "outdir": args.outdir, "fig_formats": args.format}
+    fig_size = (args.fig_size[0], args.fig_size[1]) if args.fig_size else None
+    max_points = args.max_points or None
+
+    jobs = [
+        PlotJob("total_runtime", plot_total_runtime, plot_data, {**common, "group_order": group_order}),
+        PlotJob(
+            "process_runtime",
+            plot_process_runtime,
+            plot_data,
+            {**common, "group_order": group_order, "max_points": max_points}
+        ),
+        PlotJob(
+            "process_runtime_piechart",
+            plot_process_runtime_piechart,
+            plot_data[["raw_process", "raw_realtime"]],
+            common,
+            ["pie_chart_values.csv"]
+        ),
+    ]
+
+    for fig_name, x, x_label, y, y_label, title, hue_order in [
+        # plot overall memory usage
+        ("overall_memory_usage", grp_col, grp_col, 'raw_memory_MB', 'Memory (MB)', 'Memory Usuage', 'groups'),
+        # plot overall maximum memory usage
+        ("overall_max_memory_usage", grp_col, grp_col, 'raw_max_memory', 'Max. memory (MB)', 'Maximum Memory Usage', 'groups'),
+        # plot mem per process
+        ("memory_per_process", 'raw_process', 'Process', 'raw_memory_MB', 'Memory (MB)', 'Memory Usage', 'process'),
+        # plot max mem per process
+        ("max_memory_per_process", 'raw_process', 'Process', 'raw_max_memory', 'Max. memory (MB)', 'Memory Usage', 'process'),
+    ]:
+        jobs.append(PlotJob(
+            fig_name,
+            plot_overall_summary,
+            plot_data[[grp_col, "raw_process", y]],
+            {
+                **common,
+                "fig_name": fig_name,
+                "x": x,
+                "x_label": x_label,
+                "y": y,
+                "y_label": y_label,
+                "title": title,
+                "hue_order": hue_order,
+                "group_order": group_order,
+                "fix_size": fig_size,
+                "max_points": max_points
+            }
+        ))
+
+    # wall-clock analyses: makespan, queue wait, concurrency, CPU efficiency, critical path
+    if has_timestamps(all_data):
+        tasks = prepare_tasks(all_data, grp_col, args.raw)
+        running = concurrency(tasks, grp_col)
+
+        summary = run_summary(tasks, running, grp_col)
+        summary.to_csv((args.outdir / "makespan_summary.csv"), index=False)
+        path = critical_path(tasks, grp_col)
+        path.to_csv((args.outdir / "critical_path.csv"), index=False)
+        cpu_efficiency(tasks, grp_col).to_csv((args.outdir / "cpu_efficiency.csv"), index=False)
+
+        jobs += [
+            PlotJob("makespan", plot_makespan, summary, {**common, "group_order": group_order}),
+            PlotJob(
+                "concurrency",
+                plot_concurrency,
+                running,
+                {**common, "group_order": group_order, "max_points": max_points}
+            ),
+            PlotJob(
+                "cpu_efficiency",
+                plot_cpu_efficiency,
+                tasks[[grp_col, "raw_process", "cpu_efficiency"]],
+                {**common, "group_order": group_order}
+            ),
+            PlotJob(
+                "critical_path",
+                plot_critical_path,
+                path,
+                {**common, "stage_order": [stage for stage, _ in STAGES]}
+            ),
+        ]
+
+    rendered, skipped = render_plots(jobs, args.outdir, args.threads, args.force)
+    logger.info("Rendered %d figure(s), %d unchanged", len(rendered), len(skipped))
 
     if args.save_data:
         all_data.to_csv((args.outdir / "ips6_trace_data.csv"))
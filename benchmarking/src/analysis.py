@@ -0,0 +1,154 @@
+"""Wall-clock analyses of IPS6 runs from the submit/start/complete
+timestamps of the trace files: makespan, queue wait, concurrency,
+CPU efficiency and the critical path through the pipeline stages."""
+
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+TIMESTAMP_COLUMNS = ["submit", "start", "complete"]
+
+# Pipeline stages in dependency order, matched on the (shortened) process name prefix.
+# Processes not matching any stage are member database runners/parsers.
+MEMBER_STAGE = "MEMBER_ANALYSES"
+STAGES = [
+    ("PARSE_SEQUENCE", ("GET_ORFS", "PARSE_SEQUENCE", "SEQUENCE_PRECALC", "AGGREGATE_PARSED_SEQS")),
+    (MEMBER_STAGE, ()),
+    ("AGGREGATE_RESULTS", ("AGGREGATE_RESULTS", "REPRESENTATIVE_DOMAINS")),
+    ("XREFS", ("XREFS",)),
+    ("WRITE_RESULTS", ("WRITE_RESULTS",)),
+]
+
+
+def has_timestamps(df: pd.DataFrame) -> bool:
+    missing = [col for col in TIMESTAMP_COLUMNS if col not in df.columns]
+    if missing:
+        logger.warning(
+            "Trace files do not include the %s column(s): skipping the wall-clock analyses",
+            ", ".join(missing)
+        )
+        return False
+    return True
+
+
+def convert_timestamps(values: pd.Series, raw: bool) -> pd.Series:
+    """Convert trace timestamps ('2024-08-26 10:00:00.123', or epoch milliseconds if raw) to datetimes"""
+    if raw:
+        return pd.to_datetime(pd.to_numeric(values, errors="coerce"), unit="ms")
+    return pd.to_datetime(values, format="ISO8601", errors="coerce")
+
+
+def convert_cpu_percent(values: pd.Series) -> pd.Series:
+    """Convert '%cpu' values (e.g. '187.5%') to floats"""
+    return pd.to_numeric(values.astype(str).str.rstrip("%"), errors="coerce")
+
+
+def assign_stage(processes: pd.Series) -> pd.Series:
+    stages = pd.Series(MEMBER_STAGE, index=processes.index)
+    for stage, prefixes in STAGES:
+        if prefixes:
+            stages = stages.mask(processes.str.startswith(prefixes), stage)
+    return stages
+
+
+def prepare_tasks(df: pd.DataFrame, group_col, raw: bool) -> pd.DataFrame:
+    """Select the columns needed by the wall-clock analyses, as seconds since the start of each run"""
+    tasks = df[[group_col, "Run", "raw_process", "raw_realtime"]].copy()
+    for col in TIMESTAMP_COLUMNS:
+        tasks[col] = convert_timestamps(df[col], raw)
+    tasks = tasks.dropna(subset=TIMESTAMP_COLUMNS)
+
+    run_start = tasks.groupby([group_col, "Run"])["submit"].transform("min")
+    for col in TIMESTAMP_COLUMNS:
+        tasks[f"{col}_s"] = (tasks[col] - run_start).dt.total_seconds()
+
+    tasks["queue_wait_s"] = tasks["start_s"] - tasks["submit_s"]
+    tasks["stage"] = assign_stage(tasks["raw_process"])
+
+    if "%cpu" in df.columns and "cpus" in df.columns:
+        cpu_percent = convert_cpu_percent(df.loc[tasks.index, "%cpu"])
+        cpus = pd.to_numeric(df.loc[tasks.index, "cpus"], errors="coerce")
+        tasks["cpu_efficiency"] = cpu_percent / (100 * cpus)
+    else:
+        tasks["cpu_efficiency"] = np.nan
+
+    return tasks
+
+
+def concurrency(tasks: pd.DataFrame, group_col) -> pd.DataFrame:
+    """Number of tasks running after each task start or completion, per run"""
+    events = pd.concat([
+        tasks[[group_col, "Run", "start_s"]].rename(columns={"start_s": "time_s"}).assign(change=1),
+        tasks[[group_col, "Run", "complete_s"]].rename(columns={"complete_s": "time_s"}).assign(change=-1),
+    ], ignore_index=True)
+    # Completions before starts at the same time, so the count never overshoots
+    events = events.sort_values([group_col, "Run", "time_s", "change"], kind="stable")
+    events["running"] = events.groupby([group_col, "Run"])["change"].cumsum()
+    return events[[group_col, "Run", "time_s", "running"]].reset_index(drop=True)
+
+
+def run_summary(tasks: pd.DataFrame, running: pd.DataFrame, group_col) -> pd.DataFrame:
+    """Makespan, queue wait and concurrency of each run"""
+    runs = tasks.groupby([group_col, "Run"])
+    summary = pd.DataFrame({
+        "tasks": runs.size(),
+        "makespan_s": runs["complete_s"].max(),
+        "total_realtime_s": runs["raw_realtime"].sum(),
+        "queue_wait_mean_s": runs["queue_wait_s"].mean(),
+        "queue_wait_median_s": runs["queue_wait_s"].median(),
+        "queue_wait_max_s": runs["queue_wait_s"].max(),
+        "peak_concurrency": running.groupby([group_col, "Run"])["running"].max(),
+    })
+    busy = (tasks["complete_s"] - tasks["start_s"]).groupby([tasks[group_col], tasks["Run"]]).sum()
+    summary["mean_concurrency"] = busy / summary["makespan_s"]
+    summary["parallelism"] = summary["total_realtime_s"] / summary["makespan_s"]
+    return summary.reset_index()
+
+
+def critical_path(tasks: pd.DataFrame, group_col) -> pd.DataFrame:
+    """Time each stage adds to the makespan of each run.
+
+    A stage cannot finish before the previous one, so the time it adds is the
+    time between the end of the previous stage and its own end. The task that
+    completes last in the stage is its bottleneck.
+    """
+    rows = []
+    for (group, run), run_tasks in tasks.groupby([group_col, "Run"]):
+        previous_end = 0.0
+        for stage, _ in STAGES:
+            stage_tasks = run_tasks[run_tasks["stage"] == stage]
+            if stage_tasks.empty:
+                continue
+            last = stage_tasks.loc[stage_tasks["complete_s"].idxmax()]
+            stage_end = max(last["complete_s"], previous_end)
+            rows.append({
+                group_col: group,
+                "Run": run,
+                "stage": stage,
+                "stage_start_s": stage_tasks["start_s"].min(),
+                "stage_end_s": stage_end,
+                "added_s": stage_end - previous_end,
+                "bottleneck_process": last["raw_process"],
+                "bottleneck_realtime_s": last["raw_realtime"],
+                "bottleneck_queue_wait_s": last["queue_wait_s"],
+            })
+            previous_end = stage_end
+    return pd.DataFrame(rows)
+
+
+def cpu_efficiency(tasks: pd.DataFrame, group_col) -> pd.DataFrame:
+    """CPU efficiency (%cpu / (100 * cpus)) per process"""
+    processes = tasks.dropna(subset=["cpu_efficiency"]).groupby([group_col, "raw_process"])
+    summary = pd.DataFrame({
+        "tasks": processes.size(),
+        "cpu_efficiency_mean": processes["cpu_efficiency"].mean(),
+        "cpu_efficiency_median": processes["cpu_efficiency"].median(),
+        "queue_wait_median_s": processes["queue_wait_s"].median(),
+    })
+    return summary.reset_index()
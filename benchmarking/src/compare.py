@@ -0,0 +1,132 @@
+"""Per-process comparison of a baseline and a candidate group of runs,
+to detect performance regressions (e.g. after a member database or
+IPS6 upgrade)."""
+
+
+import math
+
+import numpy as np
+import pandas as pd
+
+
+METRICS = {
+    "raw_realtime": "runtime",
+    "raw_max_memory": "max memory",
+}
+
+
+def mann_whitney_greater(baseline: np.ndarray, candidate: np.ndarray) -> float:
+    """One-sided p-value of the Mann-Whitney U test that candidate values
+    tend to be larger than baseline values (normal approximation, with tie
+    and continuity corrections)"""
+    n1, n2 = len(baseline), len(candidate)
+    n = n1 + n2
+    values = pd.Series(np.concatenate([baseline, candidate]))
+    ranks = values.rank(method="average").to_numpy()
+    u = ranks[n1:].sum() - n2 * (n2 + 1) / 2
+
+    ties = values.value_counts().to_numpy(dtype=float)
+    tie_term = ((ties ** 3) - ties).sum() / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return 1.0
+
+    z = (u - n1 * n2 / 2 - 0.5) / sigma
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def bootstrap_ratio(
+    baseline: np.ndarray,
+    candidate: np.ndarray,
+    rng: np.random.Generator,
+    resamples: int = 1000,
+    confidence: float = 0.95,
+    chunk: int = 100
+) -> tuple[float, float]:
+    """Percentile bootstrap confidence interval of median(candidate) / median(baseline)"""
+    ratios = []
+    for start in range(0, resamples, chunk):
+        size = min(chunk, resamples - start)
+        base = np.median(rng.choice(baseline, (size, len(baseline))), axis=1)
+        cand = np.median(rng.choice(candidate, (size, len(candidate))), axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios.append(cand / base)
+    ratios = np.concatenate(ratios)
+    alpha = (1 - confidence) / 2
+    return tuple(np.nanquantile(ratios, [alpha, 1 - alpha])) if np.isfinite(ratios).any() else (np.nan, np.nan)
+
+
+def change_pct(baseline_median: float, candidate_median: float) -> float:
+    """Change of the median in %, infinite from a zero baseline to a non-zero candidate
+    so that it can still be flagged as a regression"""
+    if baseline_median == 0:
+        return 0.0 if candidate_median == 0 else np.copysign(np.inf, candidate_median)
+    return 100 * (candidate_median / baseline_median - 1)
+
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    """False discovery rate adjusted p-values (q-values)"""
+    p_values = np.asarray(p_values, dtype=float)
+    n = len(p_values)
+    if n == 0:
+        return p_values
+    order = np.argsort(p_values)
+    adjusted = p_values[order] * n / np.arange(1, n + 1)
+    adjusted = np.minimum.accumulate(adjusted[::-1])[::-1]
+    q_values = np.empty(n)
+    q_values[order] = np.minimum(adjusted, 1)
+    return q_values
+
+
+def compare_groups(
+    df: pd.DataFrame,
+    group_col,
+    baseline: str,
+    candidate: str,
+    thresholds: dict[str, float],
+    alpha: float = 0.05,
+    min_tasks: int = 5,
+    resamples: int = 1000,
+    seed: int = 0
+) -> pd.DataFrame:
+    """Compare the tasks of each process between the baseline and candidate groups.
+
+    A process is a regression for a metric when the candidate is significantly
+    larger (Benjamini-Hochberg adjusted one-sided Mann-Whitney p-value < alpha)
+    and its median is larger by more than the metric's threshold (e.g. 0.1 = 10%).
+    """
+    rng = np.random.default_rng(seed)
+    groups = df[group_col].astype(str)
+    rows = []
+    for process in sorted(set(df["raw_process"])):
+        is_process = df["raw_process"] == process
+        for metric in thresholds:
+            base = df.loc[is_process & (groups == baseline), metric].dropna().to_numpy(dtype=float)
+            cand = df.loc[is_process & (groups == candidate), metric].dropna().to_numpy(dtype=float)
+            if len(base) < min_tasks or len(cand) < min_tasks:
+                continue
+
+            base_median, cand_median = np.median(base), np.median(cand)
+            ci_low, ci_high = bootstrap_ratio(base, cand, rng, resamples)
+            rows.append({
+                "process": process,
+                "metric": METRICS.get(metric, metric),
+                "baseline_tasks": len(base),
+                "candidate_tasks": len(cand),
+                "baseline_median": base_median,
+                "candidate_median": cand_median,
+                "change_pct": change_pct(base_median, cand_median),
+                "ci_low_pct": 100 * (ci_low - 1),
+                "ci_high_pct": 100 * (ci_high - 1),
+                "p_value": mann_whitney_greater(base, cand),
+                "threshold_pct": 100 * thresholds[metric],
+            })
+
+    columns = [
+        "process", "metric", "baseline_tasks", "candidate_tasks", "baseline_median", "candidate_median",
+        "change_pct", "ci_low_pct", "ci_high_pct", "p_value", "threshold_pct"
+    ]
+    results = pd.DataFrame(rows, columns=columns)
+    results["q_value"] = benjamini_hochberg(results["p_value"].to_numpy())
+    results["regression"] = (results["q_value"] < alpha) & (results["change_pct"] > results["threshold_pct"])
+    return results.sort_values("change_pct", ascending=False, ignore_index=True)
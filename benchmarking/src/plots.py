@@ -1,9 +1,11 @@
-import statistics
-
 from collections import namedtuple
 from pathlib import Path
 
+import matplotlib
+matplotlib.use("Agg")  # figures are only written to files, also from worker processes
+
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import seaborn as sns
 
@@ -39,6 +41,31 @@ PROCESSES = [
 ]
 
 
+def sample_points(df: pd.DataFrame, keys: list, max_points: int|None, seed: int = 0) -> pd.DataFrame:
+    """Random sample of at most max_points rows, shared equally between the
+    combinations of the key columns, for the strip plots: drawing millions of
+    markers is slow and does not show more than a sample does"""
+    if not max_points or len(df) <= max_points:
+        return df
+    keys = [key for key in keys if key]
+    shuffled = df.sample(frac=1, random_state=seed)
+    per_group = max(1, max_points // shuffled.groupby(keys, observed=True).ngroups)
+    keep = shuffled.groupby(keys, observed=True).cumcount() < per_group
+    # Keep the row order: the strip plots order the categories as they appear
+    return df[keep.reindex(df.index).to_numpy()]
+
+
+def downsample_steps(running: pd.DataFrame, keys: list, max_points: int|None) -> pd.DataFrame:
+    """Bin the task concurrency of each run into at most max_points time bins,
+    keeping the largest number of running tasks of each bin"""
+    if not max_points or running.groupby(keys).size().max() <= max_points:
+        return running
+    span = running.groupby(keys)["time_s"].transform("max").clip(lower=1)
+    bins = np.floor(running["time_s"] / span * (max_points - 1))
+    binned = running.assign(time_s=bins * span / (max_points - 1))
+    return binned.groupby(keys + ["time_s"], as_index=False)["running"].max()
+
+
 def plot_total_runtime(
     df: pd.DataFrame,
     group: str|None,
@@ -47,14 +74,12 @@ def plot_total_runtime(
     group_order: list
 ):
     """Plot the total run time with one series per group"""
-    total_run_times = []
     grp_col = group if group else "Groups"
-    for grp in set(df[grp_col]):
-        for run in set(df['Run']):
-            rows = df[(df[grp_col] == grp) & (df['Run'] == run)]
-            total_run_times.append([grp, sum(rows['raw_realtime'])])
-
-    total_rt_df = pd.DataFrame(total_run_times, columns=[grp_col, 'Real Runtime (s)'])
+    total_rt_df = (
+        df.groupby([grp_col, 'Run'])['raw_realtime'].sum()
+        .rename('Real Runtime (s)')
+        .reset_index()[[grp_col, 'Real Runtime (s)']]
+    )
     total_rt_df = total_rt_df.sort_values(grp_col)
 
     fig, ax = plt.subplots()
@@ -93,7 +118,8 @@ def plot_process_runtime(
     group: str|None,
     outdir: Path,
     fig_formats: set,
-    group_order: list
+    group_order: list,
+    max_points: int|None = None
 ):
     """Plot the runtimes, broken down by process. This will help to identify
     slower running (or bottleneck) processes."""
@@ -101,11 +127,12 @@ def plot_process_runtime(
     y = "raw_realtime"
     grp_col = group if group else "Groups"
     df = df.sort_values(grp_col)
-    hue = grp_col if len(set(df[grp_col])) > 1 else None
-    process_order = [_ for _ in PROCESSES if _ in set(df["raw_process"])]
+    hue = grp_col if df[grp_col].nunique() > 1 else None
+    processes = set(df["raw_process"].unique())
+    process_order = [_ for _ in PROCESSES if _ in processes]
 
     # If there is only one group then colour code by process
-    if len(set(df[grp_col])) > 1:
+    if hue:
         hue_order = group_order
     else:
         hue_order = process_order
@@ -113,7 +140,7 @@ def plot_process_runtime(
     # Write the processes out in the correct order
     df.sort_values(
         by="raw_process",
-        key=lambda column: column.map(lambda e: process_order.index(e)),
+        key=lambda column: column.map({process: i for i, process in enumerate(process_order)}),
         inplace=True
     )
 
@@ -123,10 +150,11 @@ def plot_process_runtime(
         fig, ax = plt.subplots()
 
     sns.set(font_scale=0.7)
+    strip_df = sample_points(df, [x, hue], max_points)
 
     if hue:
         g = sns.stripplot(
-            data=df,
+            data=strip_df,
             x=x,
             y=y,
             hue=hue,
@@ -138,7 +166,7 @@ def plot_process_runtime(
         )
     else:
         g = sns.stripplot(
-            data=df,
+            data=strip_df,
             x=x,
             y=y,
             color='black',
@@ -179,10 +207,10 @@ def plot_process_runtime_piechart(
     slower running (or bottleneck) processes."""
     processes = []
     Process = namedtuple('Process', ['name', 'average', 'sd'])
-    for process_name in set(df['raw_process']):
-        p_rows = df[df['raw_process'] == process_name]
-        p_mean = round(statistics.mean(p_rows['raw_realtime']), 1)
-        p_sd = round(statistics.stdev(p_rows['raw_realtime']), 1) if len(p_rows['raw_realtime']) >= 2 else "na"
+    runtimes = df.groupby('raw_process')['raw_realtime'].agg(['mean', 'std', 'size'])
+    for process_name, p_stats in runtimes.iterrows():
+        p_mean = round(p_stats['mean'], 1)
+        p_sd = round(p_stats['std'], 1) if p_stats['size'] >= 2 else "na"
         processes.append(
             Process(
                 process_name,
@@ -229,13 +257,15 @@ def plot_overall_summary(
     title: str,
     hue_order: str,
     group_order: list,
-    fix_size: tuple[int]|None
+    fix_size: tuple[int]|None,
+    max_points: int|None = None
 ):
     """Plot all data across all processes grouped together,
     only separate by the user defined 'groups'."""
-    process_order = [_ for _ in PROCESSES if _ in set(df["raw_process"])]
+    processes = set(df["raw_process"].unique())
+    process_order = [_ for _ in PROCESSES if _ in processes]
     grp_col = group if group else "Groups"
-    hue = grp_col if len(set(df[grp_col])) > 1 else None
+    hue = grp_col if df[grp_col].nunique() > 1 else None
 
     if hue_order == 'groups':  # do not break up the data by process
         hue_order = group_order
@@ -249,7 +279,7 @@ def plot_overall_summary(
         x_axis_order = process_order
         df.sort_values(
             by="raw_process",
-            key=lambda column: column.map(lambda e: process_order.index(e)),
+            key=lambda column: column.map({process: i for i, process in enumerate(process_order)}),
             inplace=True
         )
 
@@ -268,10 +298,11 @@ def plot_overall_summary(
     df[x] = df[x].astype(str)
 
     sns.set(font_scale=0.75)
+    strip_df = sample_points(df, [x, hue], max_points)
 
     if hue:
         g = sns.stripplot(
-            data=df,
+            data=strip_df,
             x=x,
             y=y,
             hue=hue,
@@ -283,7 +314,7 @@ def plot_overall_summary(
         )
     else:
         g = sns.stripplot(
-            data=df,
+            data=strip_df,
             x=x,
             y=y,
             color='black',
@@ -312,3 +343,150 @@ def plot_overall_summary(
         plt.savefig((outdir / f"{fig_name}.{fig_format}"), bbox_inches='tight', format=fig_format)
 
     plt.clf()
+
+
+def plot_makespan(
+    summary: pd.DataFrame,
+    group: str|None,
+    outdir: Path,
+    fig_formats: set,
+    group_order: list
+):
+    """Plot the wall-clock time (from the first submission to the last
+    completion) of each run, with one series per group"""
+    grp_col = group if group else "Groups"
+    df = summary.assign(**{'Makespan (s)': summary['makespan_s']})
+    df[grp_col] = df[grp_col].astype(str)
+
+    fig, ax = plt.subplots()
+    g = sns.stripplot(
+        data=df,
+        x=grp_col,
+        y='Makespan (s)',
+        color='black',
+        size=4,
+        ax=ax,
+        order=group_order,
+    )
+    g = sns.boxplot(
+        data=df,
+        x=grp_col,
+        y='Makespan (s)',
+        fliersize=0,
+        ax=ax,
+        order=group_order,
+    )
+    plt.xticks(rotation=90)
+    g.set_ylabel(ylabel='Makespan (s)')
+    g.set_xlabel(xlabel=grp_col)
+    g.set(title='InterProScan Wall-Clock Runtime')
+
+    for fig_format in fig_formats:
+        plt.savefig((outdir / f"makespan.{fig_format}"), bbox_inches='tight', format=fig_format)
+
+    plt.clf()
+
+
+def plot_concurrency(
+    running: pd.DataFrame,
+    group: str|None,
+    outdir: Path,
+    fig_formats: set,
+    group_order: list,
+    max_points: int|None = None
+):
+    """Plot the number of tasks running over time, one line per run"""
+    grp_col = group if group else "Groups"
+    running = downsample_steps(running, [grp_col, 'Run'], max_points)
+    df = running.assign(**{'Time (h)': running['time_s'] / 3600})
+    df[grp_col] = df[grp_col].astype(str)
+
+    fig, ax = plt.subplots(figsize=(12, 5))
+    g = sns.lineplot(
+        data=df,
+        x='Time (h)',
+        y='running',
+        hue=grp_col,
+        hue_order=group_order,
+        units='Run',
+        estimator=None,
+        drawstyle='steps-post',
+        linewidth=0.75,
+        ax=ax,
+    )
+    g.set_ylabel(ylabel='Running tasks')
+    g.set_xlabel(xlabel='Time since first submission (h)')
+    g.set(title='Task Concurrency')
+
+    for fig_format in fig_formats:
+        plt.savefig((outdir / f"concurrency.{fig_format}"), bbox_inches='tight', format=fig_format)
+
+    plt.clf()
+
+
+def plot_cpu_efficiency(
+    tasks: pd.DataFrame,
+    group: str|None,
+    outdir: Path,
+    fig_formats: set,
+    group_order: list
+):
+    """Plot the CPU efficiency (%cpu / requested cpus) of the tasks of each process"""
+    grp_col = group if group else "Groups"
+    df = tasks.dropna(subset=['cpu_efficiency']).copy()
+    df[grp_col] = df[grp_col].astype(str)
+    processes = set(df["raw_process"].unique())
+    process_order = [_ for _ in PROCESSES if _ in processes]
+    process_order += sorted(processes - set(process_order))
+    hue = grp_col if len(group_order) > 1 else None
+
+    fig, ax = plt.subplots(figsize=(20, 5) if len(process_order) > 30 else None)
+    g = sns.boxplot(
+        data=df,
+        x='raw_process',
+        y='cpu_efficiency',
+        hue=hue,
+        hue_order=group_order if hue else None,
+        order=process_order,
+        fliersize=0,
+        ax=ax,
+        linewidth=0.75,
+    )
+    ax.axhline(1, color='grey', linestyle='--', linewidth=0.75)
+    plt.xticks(rotation=90)
+    g.set_ylabel(ylabel='CPU efficiency (%cpu / cpus)')
+    g.set_xlabel(xlabel='Process')
+    g.set(title='CPU Efficiency Per Process')
+
+    for fig_format in fig_formats:
+        plt.savefig((outdir / f"cpu_efficiency.{fig_format}"), bbox_inches='tight', format=fig_format)
+
+    plt.clf()
+
+
+def plot_critical_path(
+    path: pd.DataFrame,
+    group: str|None,
+    outdir: Path,
+    fig_formats: set,
+    stage_order: list
+):
+    """Plot the time each pipeline stage adds to the makespan of each run,
+    as one stacked bar per run"""
+    grp_col = group if group else "Groups"
+    df = path.pivot_table(index=[grp_col, 'Run'], columns='stage', values='added_s', aggfunc='sum', fill_value=0)
+    df = df[[_ for _ in stage_order if _ in df.columns]]
+    df.index = [f"{grp} - run {run}" for grp, run in df.index]
+
+    fig, ax = plt.subplots(figsize=(10, max(3, 0.3 * len(df))))
+    df.plot.barh(stacked=True, ax=ax, width=0.75)
+    ax.invert_yaxis()
+    ax.set_xlabel('Time added to the makespan (s)')
+    ax.set_ylabel(grp_col)
+    ax.set_title('Critical Path Per Run')
+    ax.legend(title='Stage', bbox_to_anchor=(1.01, 1), loc='upper left')
+
+    for fig_format in fig_formats:
+        plt.savefig((outdir / f"critical_path.{fig_format}"), bbox_inches='tight', format=fig_format)
+
+    plt.clf()
@@ -0,0 +1,102 @@
+"""Render the report figures in parallel, skipping the figures whose input
+data and options have not changed since they were last written."""
+
+
+import hashlib
+import json
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+# Hashes of the figures written in an output dir, by figure name
+STATE_FILE = ".plot_hashes.json"
+# Change to render all figures again, e.g. after changing a plot function
+RENDER_VERSION = 1
+
+
+@dataclass
+class PlotJob:
+    """A figure: the plot function, its data and its other arguments"""
+    name: str
+    func: Callable
+    data: pd.DataFrame
+    kwargs: dict
+    extra_outputs: list = field(default_factory=list)
+
+    def outputs(self, outdir: Path) -> list[Path]:
+        formats = sorted(self.kwargs.get("fig_formats", []))
+        return [outdir / f"{self.name}.{fig_format}" for fig_format in formats] + [
+            outdir / output for output in self.extra_outputs
+        ]
+
+    def digest(self) -> str:
+        """Hash of the data, the options and the plot function"""
+        sha = hashlib.sha256()
+        sha.update(f"{RENDER_VERSION}\0{self.func.__module__}.{self.func.__qualname__}\0".encode())
+        sha.update(",".join(f"{col}:{dtype}" for col, dtype in self.data.dtypes.items()).encode())
+        sha.update(pd.util.hash_pandas_object(self.data, index=False).to_numpy().tobytes())
+        options = {
+            key: sorted(value) if isinstance(value, set) else value
+            for key, value in self.kwargs.items()
+            if key != "outdir"
+        }
+        sha.update(json.dumps(options, sort_keys=True, default=str).encode())
+        return sha.hexdigest()
+
+
+def render(job: PlotJob):
+    """Render a figure from the default style: plot functions change the
+    global matplotlib and seaborn state"""
+    plt.rcdefaults()
+    try:
+        job.func(job.data, **job.kwargs)
+    finally:
+        plt.close("all")
+    return job.name
+
+
+def render_plots(jobs: list[PlotJob], outdir: Path, threads: int = 1, force: bool = False) -> tuple[list, list]:
+    """Render the figures whose hash changed (or all of them if force), over `threads` processes.
+    Return the names of the rendered and skipped figures."""
+    state_path = outdir / STATE_FILE
+    try:
+        state = json.loads(state_path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+
+    digests = {job.name: job.digest() for job in jobs}
+    todo = [
+        job for job in jobs
+        if force or state.get(job.name) != digests[job.name] or not all(path.exists() for path in job.outputs(outdir))
+    ]
+    rendered = {job.name for job in todo}
+    skipped = [job.name for job in jobs if job.name not in rendered]
+
+    # Forget the figures being rendered, so an interrupted run renders them again
+    for job in todo:
+        state.pop(job.name, None)
+    threads = min(threads or 1, len(todo))
+    try:
+        if threads > 1:
+            with ProcessPoolExecutor(max_workers=threads) as pool:
+                for name in pool.map(render, todo):
+                    state[name] = digests[name]
+        else:
+            for job in todo:
+                state[render(job)] = digests[job.name]
+    finally:
+        tmp_path = state_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True))
+        os.replace(tmp_path, state_path)
+    return [job.name for job in todo], skipped
@@ -0,0 +1,263 @@
+"""Compare the resources requested for each process (through the labels of
+the modules and the profiles in conf/profiles) with the resources its tasks
+used, and propose right-sized requests."""
+
+
+import logging
+import math
+import re
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import convert_cpu_percent
+from src.scaling import format_memory
+from src.utilities import DURATION_UNITS, MEMORY_UNITS, standard_units
+
+
+logger = logging.getLogger(__name__)
+
+
+RESOURCES = ("cpus", "memory", "time")
+SELECTOR_PATTERN = re.compile(r"(withLabel|withName)\s*:\s*(?:'([^']+)'|\"([^\"]+)\"|([\w|]+))\s*\{")
+ASSIGNMENT_PATTERN = re.compile(r"^\s*(cpus|memory|time)\s*=\s*(.+?)\s*$", re.MULTILINE)
+VALUE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*\.?\s*([A-Za-z]*)")
+PROCESS_PATTERN = re.compile(r"^process\s+(\w+)\s*\{(.*?)^\}", re.MULTILINE | re.DOTALL)
+LABEL_PATTERN = re.compile(r"^\s*label\s+(.+?)\s*$", re.MULTILINE)
+TIME_UNITS = {**DURATION_UNITS, "min": 60, "ms": 0.001}
+
+
+def parse_value(resource: str, value: str) -> float:
+    """Value of a cpus, memory (MB) or time (s) directive at the first attempt,
+    e.g. '{ 2.GB * task.attempt }', '4', "'8 GB'" """
+    match = VALUE_PATTERN.search(value)
+    if not match:
+        return np.nan
+    number, unit = float(match.group(1)), match.group(2)
+    if resource == "memory":
+        unit = unit.upper() if unit.upper().endswith("B") else f"{unit.upper()}B"
+        return number * 1000.0 ** MEMORY_UNITS[unit] if unit in MEMORY_UNITS else np.nan
+    if resource == "time":
+        return number * TIME_UNITS[unit] if unit in TIME_UNITS else np.nan
+    return number
+
+
+def block_end(text: str, start: int) -> int:
+    """Index of the brace closing the block opened just before `start`"""
+    depth = 1
+    for i in range(start, len(text)):
+        if text[i] == "{":
+            depth += 1
+        elif text[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(text)
+
+
+def parse_selectors(text: str) -> list[tuple[str, str, dict]]:
+    """The withLabel and withName blocks of a config, with their cpus, memory and time"""
+    selectors = []
+    for match in SELECTOR_PATTERN.finditer(text):
+        kind, name = match.group(1), next(group for group in match.groups()[1:] if group)
+        body = text[match.end():block_end(text, match.end())]
+        resources = {
+            resource: parse_value(resource, value)
+            for resource, value in ASSIGNMENT_PATTERN.findall(body)
+        }
+        if resources:
+            selectors.append((kind, name, resources))
+    return selectors
+
+
+def read_profiles(pipeline_dir: Path, profile: str) -> list[tuple[str, str, dict]]:
+    """Resource selectors of the base profile, then of the given profile (which take precedence)"""
+    paths = [pipeline_dir / "conf" / "profiles" / "base.config"]
+    if profile not in ("base", "local"):
+        paths.append(pipeline_dir / "conf" / "profiles" / f"{profile}.config")
+    selectors = []
+    for path in paths:
+        if not path.exists():
+            logger.error("Could not find the %s profile at %s", profile, path)
+            raise FileNotFoundError(path)
+        selectors += parse_selectors(path.read_text())
+    return selectors
+
+
+def read_process_labels(pipeline_dir: Path) -> dict[str, list[str]]:
+    """Labels of each process of the modules"""
+    labels = {}
+    for path in sorted((pipeline_dir / "modules").rglob("*.nf")):
+        for name, body in PROCESS_PATTERN.findall(path.read_text()):
+            labels[name] = [
+                label.strip().strip("'\"")
+                for line in LABEL_PATTERN.findall(body)
+                for label in line.split(",")
+            ]
+    return labels
+
+
+def label_resources(selectors: list[tuple[str, str, dict]]) -> dict[str, dict]:
+    """Resources of each label, e.g. {'tiny': {'cpus': 1, 'memory': 2000, 'time': 7200}}"""
+    labels = {}
+    for kind, name, resources in selectors:
+        if kind == "withLabel":
+            for label in name.split("|"):
+                labels.setdefault(label, {}).update(resources)
+    return labels
+
+
+def requested_resources(
+    process: str,
+    labels: list[str],
+    resource_labels: dict[str, dict],
+    selectors: list[tuple[str, str, dict]]
+) -> tuple[str | None, dict]:
+    """Resource label and requested resources of a process, applying the
+    withLabel then withName selectors in the order Nextflow does"""
+    label = next((label for label in reversed(labels) if label in resource_labels), None)
+    resources = dict(resource_labels.get(label, {}))
+    for kind, name, overrides in selectors:
+        if kind == "withName" and re.fullmatch(name, process):
+            resources.update(overrides)
+    return label, resources
+
+
+def observed_resources(tasks: pd.DataFrame, quantile: float) -> dict:
+    """CPUs used, peak memory and run time of the tasks of a process"""
+    cores = convert_cpu_percent(tasks["%cpu"]) / 100 if "%cpu" in tasks.columns else pd.Series(dtype=float)
+    return {
+        "tasks": len(tasks),
+        "cpus_used": cores.quantile(quantile),
+        "peak_rss_MB": tasks["raw_max_memory"].quantile(quantile),
+        "peak_rss_max_MB": tasks["raw_max_memory"].max(),
+        "realtime_s": tasks["raw_realtime"].quantile(quantile),
+        "realtime_max_s": tasks["raw_realtime"].max(),
+    }
+
+
+def propose(observed: dict, memory_headroom: float, time_headroom: float) -> dict:
+    """Smallest requests covering the observed usage, with headroom"""
+    cpus = observed["cpus_used"]
+    memory = observed["peak_rss_max_MB"] * memory_headroom
+    hours = observed["realtime_max_s"] * time_headroom / 3600
+    return {
+        # Tasks briefly above a whole number of CPUs do not need one more
+        "cpus": max(1, math.ceil(cpus - 0.1)) if not np.isnan(cpus) else np.nan,
+        "memory": memory_ceiling(memory) if not np.isnan(memory) else np.nan,
+        "time": max(1, math.ceil(hours)) * 3600 if not np.isnan(hours) else np.nan,
+    }
+
+
+def memory_ceiling(megabytes: float) -> float:
+    """Memory rounded up as written in the config, see format_memory()"""
+    if megabytes < 1000:
+        return max(100, math.ceil(megabytes / 100) * 100)
+    return math.ceil(megabytes / 1000) * 1000
+
+
+def smallest_label(proposed: dict, resource_labels: dict[str, dict]) -> str | None:
+    """Smallest resource label covering the proposed resources"""
+    covering = [
+        (resources.get("memory", np.inf), resources.get("cpus", 1), resources.get("time", np.inf), label)
+        for label, resources in resource_labels.items()
+        if all(
+            np.isnan(proposed[resource]) or proposed[resource] <= resources.get(resource, np.inf)
+            for resource in RESOURCES
+        )
+    ]
+    return min(covering)[-1] if covering else None
+
+
+def tasks_per_node(cpus: float, memory: float, node_cpus: int, node_memory: float) -> float:
+    cpus = 1 if np.isnan(cpus) else cpus
+    per_node = node_cpus // cpus
+    if not np.isnan(memory) and memory > 0:
+        per_node = min(per_node, node_memory // memory)
+    return per_node
+
+
+def rightsize(
+    df: pd.DataFrame,
+    process_labels: dict[str, list[str]],
+    selectors: list[tuple[str, str, dict]],
+    quantile: float = 0.95,
+    memory_headroom: float = 1.2,
+    time_headroom: float = 2.0,
+    node_cpus: int = 32,
+    node_memory: float = 128000,
+    raw: bool = False
+) -> pd.DataFrame:
+    """Requested and observed resources of each process, and the proposed requests"""
+    df = standard_units(df, raw)
+    resource_labels = label_resources(selectors)
+    rows = []
+    for process, tasks in df.groupby("raw_process"):
+        # Trace names are qualified by the (sub)workflows, e.g. SCAN_SEQUENCES:PFAM:RUN_HMMER
+        name = process.split(":")[-1]
+        label, requested = requested_resources(name, process_labels.get(name, []), resource_labels, selectors)
+        observed = observed_resources(tasks, quantile)
+        requested = {resource: requested.get(resource, np.nan) for resource in RESOURCES}
+        if np.isnan(requested["cpus"]):
+            requested["cpus"] = 1  # Nextflow default
+        # Keep the current request when the trace does not record the usage
+        proposed = {
+            resource: requested[resource] if np.isnan(value) else value
+            for resource, value in propose(observed, memory_headroom, time_headroom).items()
+        }
+
+        rows.append({
+            "process": process,
+            "label": label,
+            **{f"requested_{resource}": requested[resource] for resource in RESOURCES},
+            **observed,
+            **{f"proposed_{resource}": proposed[resource] for resource in RESOURCES},
+            "proposed_label": smallest_label(proposed, resource_labels),
+            "under_requested": (
+                observed["peak_rss_max_MB"] > requested["memory"]
+                or observed["realtime_max_s"] > requested["time"]
+            ),
+            "tasks_per_node": tasks_per_node(requested["cpus"], requested["memory"], node_cpus, node_memory),
+            "proposed_tasks_per_node": tasks_per_node(proposed["cpus"], proposed["memory"], node_cpus, node_memory),
+        })
+
+    report = pd.DataFrame(rows)
+    report["requested_memory_MB"] = report.pop("requested_memory")
+    report["proposed_memory_MB"] = report.pop("proposed_memory")
+    return report
+
+
+def format_time(seconds: float) -> str:
+    return f"{math.ceil(seconds / 3600)}.h"
+
+
+def nextflow_config(report: pd.DataFrame, profile: str) -> str:
+    """Nextflow config overriding the resources of the processes whose requests should change"""
+    lines = [
+        f"// Generated by benchmarking/benchmark_ips6.py rightsize for the {profile} profile",
+        "// Resources scale with task.attempt, as in conf/profiles/base.config",
+        "process {",
+    ]
+    for _, row in report.iterrows():
+        changes = [
+            not (row[f"proposed_{resource}"] == row[f"requested_{resource}"]
+                 or (pd.isna(row[f"proposed_{resource}"]) and pd.isna(row[f"requested_{resource}"])))
+            for resource in ("cpus", "memory_MB", "time")
+        ]
+        if not any(changes):
+            continue
+        current = f"label '{row['label']}'" if pd.notna(row["label"]) else "no resource label"
+        suggestion = f", or label '{row['proposed_label']}'" if pd.notna(row["proposed_label"]) else ""
+        lines.append(f"    // {current}{suggestion}")
+        lines.append(f"    withName: '(.*:)?{row['process']}' {{")
+        if not np.isnan(row["proposed_cpus"]):
+            lines.append(f"        cpus   = {{ {int(row['proposed_cpus'])}    * task.attempt }}")
+        if not np.isnan(row["proposed_memory_MB"]):
+            lines.append(f"        memory = {{ {format_memory(row['proposed_memory_MB'])} * task.attempt }}")
+        if not np.isnan(row["proposed_time"]):
+            lines.append(f"        time   = {{ {format_time(row['proposed_time'])}  * task.attempt }}")
+        lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
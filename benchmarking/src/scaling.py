@@ -0,0 +1,262 @@
+"""Batch size scaling model: per-process cost models fitted across groups
+of runs with different batch sizes, used to recommend the batch size and
+per-process CPUs and memory minimising the makespan within a memory cap."""
+
+
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import STAGES, assign_stage, convert_cpu_percent
+from src.utilities import standard_units
+
+
+logger = logging.getLogger(__name__)
+
+
+def fit_linear(x: np.ndarray, y: np.ndarray) -> tuple[float, float, float]:
+    """Least squares fit of y = intercept + slope * x, with a non-negative
+    intercept and slope (costs do not decrease with the batch size).
+    Return the intercept, slope and coefficient of determination."""
+    if len(np.unique(x)) < 2:
+        return float(np.mean(y)), 0.0, np.nan
+    slope, intercept = np.polyfit(x, y, 1)
+    if slope < 0:
+        intercept, slope = np.mean(y), 0.0
+    elif intercept < 0:
+        intercept, slope = 0.0, np.sum(x * y) / np.sum(x * x)
+    residuals = y - (intercept + slope * x)
+    total = np.sum((y - np.mean(y)) ** 2)
+    r2 = 1 - np.sum(residuals ** 2) / total if total > 0 else np.nan
+    return float(intercept), float(slope), float(r2)
+
+
+def speedup(parallel_fraction, cpus):
+    """Amdahl's law: speedup of a task on `cpus` CPUs over a single CPU"""
+    return 1 / ((1 - parallel_fraction) + parallel_fraction / cpus)
+
+
+def fit_parallel_fraction(requested: pd.Series, used: pd.Series) -> float:
+    """Parallel fraction of the tasks of a process, from the CPUs they requested and the
+    CPUs they kept busy on average (%cpu / 100), which is their speedup over one CPU.
+    NaN without tasks run on several CPUs: the %cpu of a single CPU task tells nothing
+    about how it scales."""
+    mask = (requested > 1) & used.notna()
+    if not mask.any():
+        return np.nan
+    cpus = requested[mask]
+    used = used[mask].clip(lower=1).clip(upper=cpus)
+    fractions = (1 - 1 / used) / (1 - 1 / cpus)
+    return float(np.clip(fractions.median(), 0, 1))
+
+
+def fit_models(df: pd.DataFrame, group_col, benchmark_sequences: int, raw: bool = False) -> pd.DataFrame:
+    """Fit the cost models of each process across the batch size groups.
+
+    - tasks: per-batch processes run `tasks_per_batch` tasks per batch of sequences,
+      per-run processes the same number of tasks whatever the batch size
+    - run time (s) of a task on one CPU = time_fixed_s + time_per_seq_s * batch size,
+      and on n CPUs that time divided by speedup(parallel_fraction, n)
+    - parallel_fraction: Amdahl parallel fraction fitted from the CPUs requested and the
+      %cpu of the tasks (NaN if they never ran on several CPUs, the CPUs are then not changed)
+    - peak RSS (MB) of a task = memory_fixed_MB + memory_per_seq_MB * batch size,
+      fitted to the 95th percentile of each group to leave room for the larger tasks
+    - cpus_used: the CPUs used by the tasks (90th percentile of %cpu), at most the CPUs requested
+    """
+    df = standard_units(df, raw).assign(batch_size=df[group_col].astype(int))
+    df["batches"] = np.ceil(benchmark_sequences / df["batch_size"])
+
+    rows = []
+    for process, tasks in df.groupby("raw_process"):
+        counts = tasks.groupby(["batch_size", "Run"]).agg(tasks=("raw_process", "size"), batches=("batches", "first"))
+        per_run = counts["tasks"].nunique() == 1 and counts["batches"].nunique() > 1
+
+        requested = pd.to_numeric(tasks["cpus"], errors="coerce") if "cpus" in tasks.columns else pd.Series(np.nan, index=tasks.index)
+        used = convert_cpu_percent(tasks["%cpu"]) / 100 if "%cpu" in tasks.columns else pd.Series(np.nan, index=tasks.index)
+        parallel_fraction = fit_parallel_fraction(requested.fillna(1), used)
+        # Run times on a single CPU, so that runs with different CPUs fit the same model
+        serial_time = tasks["raw_realtime"] * speedup(np.nan_to_num(parallel_fraction), requested.fillna(1))
+
+        if per_run:
+            # Not run per batch: its cost does not depend on the batch size
+            time_fixed, time_per_seq, time_r2 = serial_time.median(), 0.0, np.nan
+            memory_fixed, memory_per_seq, memory_r2 = tasks["raw_max_memory"].quantile(0.95), 0.0, np.nan
+        else:
+            time_fixed, time_per_seq, time_r2 = fit_linear(
+                tasks["batch_size"].to_numpy(float), serial_time.to_numpy(float)
+            )
+            memory = tasks.groupby("batch_size")["raw_max_memory"].quantile(0.95)
+            memory_fixed, memory_per_seq, memory_r2 = fit_linear(memory.index.to_numpy(float), memory.to_numpy(float))
+
+        cpus_used = max(1, math.ceil(used.quantile(0.9))) if used.notna().any() else np.nan
+        cpus_used = min(cpus_used, requested.max()) if requested.notna().any() else cpus_used
+
+        rows.append({
+            "process": process,
+            "per_run": per_run,
+            "tasks_per_batch": (counts["tasks"] / counts["batches"]).median(),
+            "tasks_per_run": counts["tasks"].median(),
+            "time_fixed_s": time_fixed,
+            "time_per_seq_s": time_per_seq,
+            "time_r2": time_r2,
+            "memory_fixed_MB": memory_fixed,
+            "memory_per_seq_MB": memory_per_seq,
+            "memory_r2": memory_r2,
+            "cpus_requested": requested.max(),
+            "cpus_used": cpus_used,
+            "parallel_fraction": parallel_fraction,
+        })
+
+    models = pd.DataFrame(rows).set_index("process")
+    models["stage"] = assign_stage(models.index.to_series())
+    return models
+
+
+def task_counts(models: pd.DataFrame, batch_size: int, sequences: int) -> np.ndarray:
+    batches = math.ceil(sequences / batch_size)
+    return np.where(models["per_run"], models["tasks_per_run"], np.ceil(models["tasks_per_batch"] * batches))
+
+
+def makespan(
+    serial_time: np.ndarray,
+    parallel_fraction: np.ndarray,
+    cpus: np.ndarray,
+    tasks: np.ndarray,
+    stages: np.ndarray,
+    total_cpus: int
+) -> tuple[float, float, float]:
+    """Predicted makespan, CPU time and stage chain time (s) of tasks run on `cpus` CPUs.
+
+    The makespan is bounded by the CPU time of all tasks shared over the
+    available CPUs, and by the time a batch takes to go through the stages
+    one after the other; the larger of the two is taken.
+    """
+    task_time = serial_time / speedup(parallel_fraction, cpus)
+    cpu_time = float((tasks * task_time * cpus).sum())
+    chain = float(sum(task_time[stages == stage].max() for stage, _ in STAGES if (stages == stage).any()))
+    return max(cpu_time / total_cpus, chain), cpu_time, chain
+
+
+def optimise_cpus(models: pd.DataFrame, batch_size: int, sequences: int, total_cpus: int, max_cpus: int) -> pd.Series:
+    """CPUs of each process minimising the predicted makespan, by greedy search: starting
+    from one CPU per task, give one more CPU to the process that reduces the makespan the
+    most, until none does. More CPUs shorten the tasks (and the stage chain) but increase
+    their CPU time, as the serial fraction of a task keeps the other CPUs idle.
+    Processes with no parallel fraction keep the CPUs they requested."""
+    serial_time = (models["time_fixed_s"] + models["time_per_seq_s"] * batch_size).to_numpy(float)
+    fixed = models["parallel_fraction"].isna().to_numpy()
+    parallel_fraction = models["parallel_fraction"].fillna(0).to_numpy(float)
+    tasks = task_counts(models, batch_size, sequences)
+    stages = models["stage"].to_numpy()
+    cpus = np.where(fixed, models["cpus_requested"].fillna(1).to_numpy(float), 1.0)
+
+    best = makespan(serial_time, parallel_fraction, cpus, tasks, stages, total_cpus)[0]
+    while True:
+        trials = []
+        for i in np.flatnonzero(~fixed & (cpus < max_cpus)):
+            trial = cpus.copy()
+            trial[i] += 1
+            trials.append((makespan(serial_time, parallel_fraction, trial, tasks, stages, total_cpus)[0], i))
+        if not trials:
+            break
+        trial_makespan, i = min(trials)
+        if trial_makespan >= best:
+            break
+        best = trial_makespan
+        cpus[i] += 1
+    return pd.Series(cpus.astype(int), index=models.index)
+
+
+def predict(models: pd.DataFrame, batch_size: int, sequences: int, total_cpus: int, cpus: pd.Series) -> dict:
+    """Predicted makespan of an analysis of `sequences` sequences with the given batch size
+    and CPUs per process"""
+    batches = math.ceil(sequences / batch_size)
+    predicted, cpu_time, chain = makespan(
+        (models["time_fixed_s"] + models["time_per_seq_s"] * batch_size).to_numpy(float),
+        models["parallel_fraction"].fillna(0).to_numpy(float),
+        cpus.reindex(models.index).to_numpy(float),
+        task_counts(models, batch_size, sequences),
+        models["stage"].to_numpy(),
+        total_cpus
+    )
+    memory = (models["memory_fixed_MB"] + models["memory_per_seq_MB"] * batch_size)[~models["per_run"]]
+    return {
+        "batch_size": batch_size,
+        "batches": batches,
+        "cpu_time_s": cpu_time,
+        "chain_s": chain,
+        "makespan_s": predicted,
+        "max_task_memory_MB": memory.max() if not memory.empty else 0.0,
+    }
+
+
+def candidate_batch_sizes(tested: list[int], steps: int = 30) -> list[int]:
+    """Batch sizes between the smallest and largest tested ones: the model is not extrapolated"""
+    grid = np.geomspace(min(tested), max(tested), steps)
+    grid = np.round(grid / 100) * 100
+    return sorted({int(size) for size in grid if size > 0} | set(tested))
+
+
+def recommend(
+    models: pd.DataFrame,
+    batch_sizes: list[int],
+    sequences: int,
+    total_cpus: int,
+    max_memory: float,
+    memory_headroom: float = 1.2,
+    max_cpus: int = 16
+) -> tuple[pd.DataFrame, pd.DataFrame, int | None]:
+    """Optimise the CPUs of each process for each candidate batch size, predict its
+    makespan, and select the fastest one whose tasks fit in `max_memory` (MB, with headroom).
+    Return the predictions, the CPUs of each process ([batch size, process]) and the batch size."""
+    cpus = pd.DataFrame({size: optimise_cpus(models, size, sequences, total_cpus, max_cpus) for size in batch_sizes}).T
+    predictions = pd.DataFrame([predict(models, size, sequences, total_cpus, cpus.loc[size]) for size in batch_sizes])
+    predictions["fits_memory"] = predictions["max_task_memory_MB"] * memory_headroom <= max_memory
+    feasible = predictions[predictions["fits_memory"]]
+    if feasible.empty:
+        return predictions, cpus, None
+    # Prefer the larger batch size when predicted equally fast: fewer tasks to schedule
+    best = feasible.sort_values(["makespan_s", "batch_size"], ascending=[True, False]).iloc[0]
+    return predictions, cpus, int(best["batch_size"])
+
+
+def format_memory(megabytes: float) -> str:
+    """Memory as a Nextflow memory unit, rounded up to the GB (or to 100 MB below 1 GB)"""
+    if megabytes < 1000:
+        return f"{max(100, math.ceil(megabytes / 100) * 100)}.MB"
+    return f"{math.ceil(megabytes / 1000)}.GB"
+
+
+def nextflow_config(
+    models: pd.DataFrame,
+    batch_size: int,
+    cpus: pd.Series,
+    prediction: pd.Series,
+    sequences: int,
+    total_cpus: int,
+    memory_headroom: float = 1.2
+) -> str:
+    """Nextflow config setting the batch size and the CPUs and memory of each process"""
+    lines = [
+        "// Generated by benchmarking/benchmark_ips6.py recommend",
+        f"// Predicted makespan for {sequences} sequences on {total_cpus} CPUs: "
+        f"{prediction['makespan_s'] / 3600:.2f} h ({int(prediction['batches'])} batches)",
+        "// CPUs minimise the makespan given the parallel fraction fitted for each process;",
+        "// processes never run on several CPUs in the benchmarks keep the CPUs they requested",
+        "params {",
+        f"    batchSize = {batch_size}",
+        "}",
+        "",
+        "process {",
+    ]
+    for process, model in models.iterrows():
+        memory = model["memory_fixed_MB"] + model["memory_per_seq_MB"] * batch_size
+        lines.append(f"    withName: '(.*:)?{process}' {{")
+        if not (np.isnan(model["parallel_fraction"]) and np.isnan(model["cpus_requested"])):
+            lines.append(f"        cpus   = {int(cpus[process])}")
+        lines.append(f"        memory = {{ {format_memory(memory * memory_headroom)} * task.attempt }}")
+        lines.append("    }")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,226 @@
+"""Discrete-event simulation of the execution of recorded runs on another
+executor configuration (number of nodes, cores per node, executor queue
+size and submit rate), to predict their makespan and utilisation."""
+
+
+import bisect
+import heapq
+import logging
+import re
+
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.rightsize import block_end
+from src.utilities import convert_memory
+
+
+logger = logging.getLogger(__name__)
+
+
+RATE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(?:/\s*(\d+(?:\.\d+)?)?\s*)?(ms|s|sec|m|min|h|hour)?\s*$")
+RATE_UNITS = {"ms": 0.001, "s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600}
+
+
+@dataclass
+class Executor:
+    """Executor configuration to simulate"""
+    nodes: int
+    cores_per_node: int
+    queue_size: int
+    submit_rate: float = np.inf  # tasks per second
+    node_memory: float = np.inf  # MB
+    scheduler_delay: float = 0.0  # seconds between the submission of a task and it being schedulable
+
+    @property
+    def cores(self) -> int:
+        return self.nodes * self.cores_per_node
+
+
+def parse_submit_rate(value: str) -> float:
+    """Tasks per second of a Nextflow submitRateLimit, e.g. '1/1sec', '50/2min', '10sec', 100"""
+    match = RATE_PATTERN.match(str(value).strip("'\""))
+    if not match:
+        raise ValueError(f"Invalid submitRateLimit '{value}'")
+    tasks, period, unit = match.groups()
+    return float(tasks) / (float(period or 1) * RATE_UNITS[unit or "s"])
+
+
+def read_executor_settings(pipeline_dir: Path, profile: str) -> dict:
+    """queueSize and submitRateLimit of the executor block of the base profile, then of the given profile"""
+    paths = [pipeline_dir / "conf" / "profiles" / "base.config"]
+    if profile not in ("base", "local"):
+        paths.append(pipeline_dir / "conf" / "profiles" / f"{profile}.config")
+
+    settings = {}
+    for path in paths:
+        text = path.read_text()
+        for match in re.finditer(r"^executor\s*\{", text, re.MULTILINE):
+            body = text[match.end():block_end(text, match.end())]
+            for key, value in re.findall(r"^\s*(queueSize|submitRateLimit)\s*=\s*(.+?)\s*$", body, re.MULTILINE):
+                settings[key] = value
+    return settings
+
+
+def infer_triggers(submit: np.ndarray, complete: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Task whose completion triggered the submission of each task, and the lag between the two.
+
+    Traces do not record the dependencies between tasks, but Nextflow submits
+    a task as soon as its inputs are available: the last task completed before
+    a task was submitted is taken as its parent. Tasks submitted before any
+    completion are roots (parent -1), their lag is counted from the start of the run.
+    """
+    order = np.argsort(complete, kind="stable")
+    completes = complete[order]
+    parents = np.full(len(submit), -1)
+    lags = submit.copy()
+    for i, time in enumerate(submit):
+        position = bisect.bisect_right(completes, time)
+        # A task cannot trigger itself
+        while position > 0 and order[position - 1] == i:
+            position -= 1
+        if position > 0:
+            parents[i] = order[position - 1]
+            lags[i] = time - completes[position - 1]
+    return parents, lags
+
+
+def simulate_run(tasks: pd.DataFrame, executor: Executor) -> dict:
+    """Replay the tasks of one run (with submit_s, complete_s, start_s, cpus and memory_MB
+    columns) on the executor, return the predicted makespan, utilisation and queue wait"""
+    submit = tasks["submit_s"].to_numpy(float)
+    complete = tasks["complete_s"].to_numpy(float)
+    durations = np.maximum(complete - tasks["start_s"].to_numpy(float), 0)
+    cpus = np.minimum(tasks["cpus"].to_numpy(int), executor.cores_per_node)
+    memory = np.minimum(tasks["memory_MB"].to_numpy(float), executor.node_memory)
+    parents, lags = infer_triggers(submit, complete)
+
+    children = [[] for _ in range(len(tasks))]
+    events = []  # (time, sequence, kind, task)
+    sequence = 0
+    for i, parent in enumerate(parents):
+        if parent < 0:
+            events.append((lags[i], sequence, "ready", i))
+            sequence += 1
+        else:
+            children[parent].append(i)
+    heapq.heapify(events)
+
+    free_cores = [executor.cores_per_node] * executor.nodes
+    free_memory = [executor.node_memory] * executor.nodes
+    placement = {}
+    pending = deque()  # ready, waiting to be submitted by Nextflow
+    queued = []  # submitted, waiting for resources
+    submitted = 0
+    next_submit = 0.0
+    wakeup = None
+    ready_time = np.zeros(len(tasks))
+    start_time = np.zeros(len(tasks))
+    end = 0.0
+
+    while events:
+        now, _, kind, task = heapq.heappop(events)
+        if kind == "ready":
+            ready_time[task] = now
+            pending.append(task)
+        elif kind == "queued":
+            queued.append(task)
+        elif kind == "finish":
+            node = placement.pop(task)
+            free_cores[node] += cpus[task]
+            free_memory[node] += memory[task]
+            submitted -= 1
+            end = max(end, now)
+            for child in children[task]:
+                heapq.heappush(events, (now + lags[child], sequence, "ready", child))
+                sequence += 1
+        elif kind == "wakeup":
+            wakeup = None
+
+        # Nextflow submits the ready tasks within its queue size and submit rate
+        while pending and submitted < executor.queue_size:
+            if now < next_submit:
+                if wakeup is None:
+                    wakeup = next_submit
+                    heapq.heappush(events, (next_submit, sequence, "wakeup", -1))
+                    sequence += 1
+                break
+            task = pending.popleft()
+            submitted += 1
+            next_submit = now + 1 / executor.submit_rate
+            heapq.heappush(events, (now + executor.scheduler_delay, sequence, "queued", task))
+            sequence += 1
+
+        # The scheduler starts the submitted tasks in order, on the first node they fit on
+        waiting = []
+        for position, task in enumerate(queued):
+            if not any(free_cores):
+                waiting += queued[position:]
+                break
+            node = next(
+                (node for node in range(executor.nodes)
+                 if free_cores[node] >= cpus[task] and free_memory[node] >= memory[task]),
+                None
+            )
+            if node is None:
+                waiting.append(task)
+                continue
+            free_cores[node] -= cpus[task]
+            free_memory[node] -= memory[task]
+            placement[task] = node
+            start_time[task] = now
+            heapq.heappush(events, (now + durations[task], sequence, "finish", task))
+            sequence += 1
+        queued = waiting
+
+    cpu_time = float((durations * cpus).sum())
+    return {
+        "predicted_makespan_s": end,
+        "predicted_utilisation": cpu_time / (end * executor.cores) if end > 0 else np.nan,
+        "predicted_mean_concurrency": float(durations.sum() / end) if end > 0 else np.nan,
+        "predicted_queue_wait_mean_s": float((start_time - ready_time).mean()),
+        "cpu_time_s": cpu_time,
+    }
+
+
+def task_resources(df: pd.DataFrame, tasks: pd.DataFrame, raw: bool) -> pd.DataFrame:
+    """Add the CPUs and memory (MB) requested by the tasks, or the peak memory they used
+    when the trace does not include the requests"""
+    tasks = tasks.copy()
+    cpus = pd.to_numeric(df.loc[tasks.index, "cpus"], errors="coerce") if "cpus" in df.columns else None
+    tasks["cpus"] = cpus.fillna(1).clip(lower=1).astype(int) if cpus is not None else 1
+    if "memory" in df.columns:
+        memory = df.loc[tasks.index, "memory"]
+        memory = pd.to_numeric(memory, errors="coerce") / 1e6 if raw else convert_memory(memory)
+    else:
+        memory = pd.Series(np.nan, index=tasks.index)
+    # In raw mode, peak_rss is in bytes like memory
+    peak_memory = pd.to_numeric(df.loc[tasks.index, "raw_max_memory"], errors="coerce")
+    tasks["memory_MB"] = memory.fillna(peak_memory / 1e6 if raw else peak_memory).fillna(0)
+    return tasks
+
+
+def simulate(tasks: pd.DataFrame, summary: pd.DataFrame, group_col, executor: Executor) -> pd.DataFrame:
+    """Predicted makespan of each run on the executor, next to the measured one"""
+    rows = []
+    for (group, run), run_tasks in tasks.groupby([group_col, "Run"]):
+        measured = summary[(summary[group_col] == group) & (summary["Run"] == run)].iloc[0]
+        predicted = simulate_run(run_tasks, executor)
+        rows.append({
+            group_col: group,
+            "Run": run,
+            "tasks": len(run_tasks),
+            "measured_makespan_s": measured["makespan_s"],
+            "predicted_makespan_s": predicted["predicted_makespan_s"],
+            "change_pct": 100 * (predicted["predicted_makespan_s"] / measured["makespan_s"] - 1),
+            "measured_mean_concurrency": measured["mean_concurrency"],
+            "predicted_mean_concurrency": predicted["predicted_mean_concurrency"],
+            "predicted_utilisation": predicted["predicted_utilisation"],
+            "measured_queue_wait_mean_s": measured["queue_wait_mean_s"],
+            "predicted_queue_wait_mean_s": predicted["predicted_queue_wait_mean_s"],
+        })
+    return pd.DataFrame(rows)
@@ -2,13 +2,17 @@
 
 
 import argparse
+import hashlib
+import importlib.util
 import logging
-import re
+import os
 import sys
 
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 
 
@@ -34,6 +38,45 @@ class ValidateFormats(argparse.Action):
         setattr(args, self.dest, parsed_values)
 
 
+def add_trace_arguments(parser: argparse.ArgumentParser):
+    """Arguments controlling how the trace files are loaded"""
+    parser.add_argument(
+        "--raw",
+        dest="raw",
+        action="store_true",
+        default=False,
+        help=(
+            "Trace files contain raw values (e.g. mem in bytes)\n"
+            "not human readable values (e.g. mem in GB and MB)"
+        )
+    )
+
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of trace files parsed in parallel"
+    )
+
+    parser.add_argument(
+        "--cache_dir",
+        type=Path,
+        default=Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "ips6-benchmarking",
+        help=(
+            "Directory of parsed trace files (Parquet), keyed by trace path, size and mtime, "
+            "so only new or modified traces are parsed again"
+        )
+    )
+
+    parser.add_argument(
+        "--no_cache",
+        dest="cache",
+        action="store_false",
+        default=True,
+        help="Do not read or write the parsed trace cache"
+    )
+
+
 def build_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         prog="IPS6-benchmarking",
@@ -82,17 +125,25 @@ def build_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
         help="Output directory"
     )
 
+    add_trace_arguments(parser)
+
     parser.add_argument(
-        "--raw",
-        dest="raw",
-        action="store_true",
-        default=False,
+        "--max_points",
+        type=int,
+        default=10000,
         help=(
-            "Trace files contain raw values (e.g. mem in bytes)\n"
-            "not human readable values (e.g. mem in GB and MB)"
+            "Largest number of points drawn by a strip plot or concurrency plot, "
+            "larger series are sampled (or binned). 0 to draw all points"
         )
     )
 
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        default=False,
+        help="Render all figures, including those whose data and options have not changed"
+    )
+
     parser.add_argument(
         "--save_data",
         dest="save_data",
@@ -107,154 +158,601 @@ def build_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
         return parser.parse_args(argv)
 
 
+
+def build_compare_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="IPS6-benchmarking compare",
+        description=(
+            "Compare the per-process runtime and maximum memory of a candidate group of runs "
+            "with a baseline group, and exit with status 1 if a process got significantly worse"
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "data_files",
+        type=Path,
+        help="Path to the JSON file listing the trace files of each group"
+    )
+
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        required=True,
+        help="Name of the baseline group in the JSON file"
+    )
+
+    parser.add_argument(
+        "--candidate",
+        type=str,
+        required=True,
+        help="Name of the candidate group in the JSON file"
+    )
+
+    parser.add_argument(
+        "--max_runtime_increase",
+        type=float,
+        default=0.1,
+        help="Largest accepted increase of a process median runtime (0.1 = 10%%)"
+    )
+
+    parser.add_argument(
+        "--max_memory_increase",
+        type=float,
+        default=0.1,
+        help="Largest accepted increase of a process median maximum memory (0.1 = 10%%)"
+    )
+
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Significance level, applied to Benjamini-Hochberg adjusted p-values"
+    )
+
+    parser.add_argument(
+        "--min_tasks",
+        type=int,
+        default=5,
+        help="Minimum number of tasks of a process in each group to test it"
+    )
+
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=1000,
+        help="Number of bootstrap resamples for the confidence intervals"
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Seed of the bootstrap resampling"
+    )
+
+    parser.add_argument(
+        "--outdir",
+        type=Path,
+        default=None,
+        help="Output directory for the full comparison table (compare.csv)"
+    )
+
+    add_trace_arguments(parser)
+    parser.set_defaults(group_name=None)
+
+    if argv is None:
+        return parser
+    else:
+        return parser.parse_args(argv)
+
+
+def build_recommend_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="IPS6-benchmarking recommend",
+        description=(
+            "Fit per-process cost models across groups of runs with different batch sizes "
+            "(the groups must be named after their batch size), and recommend the batch size "
+            "and process resources minimising the makespan within a memory cap"
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "data_files",
+        type=Path,
+        help="Path to the JSON file listing the trace files of each batch size"
+    )
+
+    parser.add_argument(
+        "--benchmark_sequences",
+        type=int,
+        required=True,
+        help="Number of sequences in the input of the benchmark runs"
+    )
+
+    parser.add_argument(
+        "--sequences",
+        type=int,
+        default=None,
+        help="Number of sequences of the analyses to optimise for (default: --benchmark_sequences)"
+    )
+
+    parser.add_argument(
+        "--total_cpus",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of CPUs available to the pipeline"
+    )
+
+    parser.add_argument(
+        "--max_memory",
+        type=str,
+        default="8 GB",
+        help="Largest memory a task can be given, e.g. '8 GB'"
+    )
+
+    parser.add_argument(
+        "--memory_headroom",
+        type=float,
+        default=1.2,
+        help="Factor applied to the predicted peak memory of the tasks"
+    )
+
+    parser.add_argument(
+        "--max_cpus",
+        type=int,
+        default=16,
+        help="Largest number of CPUs a task can be given"
+    )
+
+    parser.add_argument(
+        "--batch_sizes",
+        nargs="+",
+        type=int,
+        default=None,
+        help="Candidate batch sizes (default: between the smallest and largest tested ones)"
+    )
+
+    parser.add_argument(
+        "--outdir",
+        type=Path,
+        default=Path("ips6-batch-size"),
+        help="Output directory"
+    )
+
+    add_trace_arguments(parser)
+    parser.set_defaults(group_name=None)
+
+    if argv is None:
+        return parser
+    else:
+        return parser.parse_args(argv)
+
+
+def build_rightsize_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="IPS6-benchmarking rightsize",
+        description=(
+            "Compare the CPUs, memory and time requested for each process through the labels "
+            "in conf/profiles with the resources used by its tasks, and propose right-sized requests"
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "data_files",
+        type=Path,
+        help="Path to the JSON file listing the trace files of each group"
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=str,
+        choices=["base", "local", "slurm", "lsf"],
+        default="base",
+        help="Profile the runs used"
+    )
+
+    parser.add_argument(
+        "--pipeline_dir",
+        type=Path,
+        default=Path(__file__).resolve().parents[2],
+        help="IPS6 directory, with the conf/profiles and modules directories"
+    )
+
+    parser.add_argument(
+        "--quantile",
+        type=float,
+        default=0.95,
+        help="Quantile of the CPUs used, memory and run time of the tasks reported for each process"
+    )
+
+    parser.add_argument(
+        "--memory_headroom",
+        type=float,
+        default=1.2,
+        help="Factor applied to the largest peak memory of the tasks of a process"
+    )
+
+    parser.add_argument(
+        "--time_headroom",
+        type=float,
+        default=2.0,
+        help="Factor applied to the longest run time of the tasks of a process"
+    )
+
+    parser.add_argument(
+        "--node_cpus",
+        type=int,
+        default=32,
+        help="CPUs of a cluster node, to report the number of tasks per node"
+    )
+
+    parser.add_argument(
+        "--node_memory",
+        type=str,
+        default="128 GB",
+        help="Memory of a cluster node, to report the number of tasks per node"
+    )
+
+    parser.add_argument(
+        "--outdir",
+        type=Path,
+        default=Path("ips6-rightsize"),
+        help="Output directory"
+    )
+
+    add_trace_arguments(parser)
+    parser.set_defaults(group_name=None)
+
+    if argv is None:
+        return parser
+    else:
+        return parser.parse_args(argv)
+
+
+def build_simulate_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="IPS6-benchmarking simulate",
+        description=(
+            "Replay the tasks of recorded runs on another executor configuration, "
+            "and report the predicted makespan and utilisation next to the measured ones"
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "data_files",
+        type=Path,
+        help="Path to the JSON file listing the trace files of each group"
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=str,
+        choices=["local", "slurm", "lsf"],
+        default="local",
+        help="Profile whose executor queueSize and submitRateLimit are used by default"
+    )
+
+    parser.add_argument(
+        "--pipeline_dir",
+        type=Path,
+        default=Path(__file__).resolve().parents[2],
+        help="IPS6 directory, with the conf/profiles directory"
+    )
+
+    parser.add_argument(
+        "--nodes",
+        type=int,
+        default=1,
+        help="Number of nodes"
+    )
+
+    parser.add_argument(
+        "--cores_per_node",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of cores per node"
+    )
+
+    parser.add_argument(
+        "--node_memory",
+        type=str,
+        default=None,
+        help="Memory per node, e.g. '256 GB' (default: unlimited)"
+    )
+
+    parser.add_argument(
+        "--queue_size",
+        type=int,
+        default=None,
+        help="Maximum number of tasks submitted at once (default: queueSize of the profile, or all cores for local)"
+    )
+
+    parser.add_argument(
+        "--submit_rate",
+        type=str,
+        default=None,
+        help="Maximum submission rate, as a Nextflow submitRateLimit, e.g. '50/1min' (default: from the profile)"
+    )
+
+    parser.add_argument(
+        "--scheduler_delay",
+        type=float,
+        default=0.0,
+        help="Seconds between the submission of a task and the scheduler being able to start it"
+    )
+
+    parser.add_argument(
+        "--outdir",
+        type=Path,
+        default=None,
+        help="Output directory for the predictions of each run (simulate.csv)"
+    )
+
+    add_trace_arguments(parser)
+    parser.set_defaults(group_name=None)
+
+    if argv is None:
+        return parser
+    else:
+        return parser.parse_args(argv)
+
+
+def build_watch_parser(argv: Optional[List] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="IPS6-benchmarking watch",
+        description=(
+            "Follow the trace file of a running IPS6 analysis and report rolling per-process "
+            "throughput, run time and memory statistics"
+        ),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "trace_file",
+        type=Path,
+        help="Path to the Nextflow trace file of the running analysis, e.g. ips6.trace.txt"
+    )
+
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=30,
+        help="Seconds between two reads of the trace file"
+    )
+
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=3600,
+        help="Length (in seconds) of the rolling window the statistics are computed over"
+    )
+
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=None,
+        help="Number of sequences per batch (--batchSize of the run), to report sequences per hour"
+    )
+
+    parser.add_argument(
+        "--prom_file",
+        type=Path,
+        default=None,
+        help=(
+            "Prometheus file to write the statistics to, in the directory "
+            "of the node exporter textfile collector (e.g. ips6.prom)"
+        )
+    )
+
+    parser.add_argument(
+        "--raw",
+        dest="raw",
+        action="store_true",
+        default=False,
+        help="Trace file contains raw values (e.g. mem in bytes)"
+    )
+
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        default=False,
+        help="Read the trace file once, report and exit"
+    )
+
+    if argv is None:
+        return parser
+    else:
+        return parser.parse_args(argv)
+
+
+RAW_COLUMNS = ["raw_realtime", "raw_process", "raw_memory_MB", "raw_max_memory"]
+
+
 def load_data(data_files: dict[str, list[str]], args: argparse.ArgumentParser):
     """Load all trace files and combine into a single dataframe.
     Standardise the values also if raw values not provided.
 
+    Trace files are parsed in parallel, and cached (if enabled) so that
+    only new or modified traces are parsed on the next run.
+
     :param config_data: dict of config file content
     :param args: clu args parser
     """
     group_name = args.group_name if args.group_name else "Groups"
-    first = True
-    for group, file_paths in data_files.items():
-        run = 1
-        for file_path in file_paths:
-            if first:
-                all_data = load_dataframe(file_path, group, group_name, run)
-                first = False
-            else:
-                all_data = pd.concat([all_data, load_dataframe(file_path, group, group_name, run)])
-            run += 1
-
-    if not args.raw:
-        all_data["raw_realtime"] = convert_realtime(all_data["realtime"])
-        all_data["raw_process"] = convert_process_names(all_data["process"])
-        all_data["raw_memory_MB"] = convert_memory(all_data["rss"])
-        all_data["raw_max_memory"] = convert_memory(all_data["peak_rss"])
+    cache_dir = args.cache_dir if args.cache and parquet_available() else None
+    if cache_dir:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # The same trace file can be listed in several groups
+    unique_paths = list(dict.fromkeys(path for file_paths in data_files.values() for path in file_paths))
+    jobs = [(path, args.raw, cache_dir) for path in unique_paths]
+    threads = min(args.threads or 1, len(jobs))
+    if threads > 1:
+        with ProcessPoolExecutor(max_workers=threads) as pool:
+            traces = dict(zip(unique_paths, pool.map(load_trace, *zip(*jobs))))
     else:
-        all_data["raw_realtime"] = all_data["realtime"]
-        all_data["raw_process"] = all_data["process"]
-        all_data["raw_memory_MB"] = all_data["rss"]
-        all_data["raw_max_memory"] = all_data["peak_rss"]
+        traces = {path: load_trace(*job) for path, job in zip(unique_paths, jobs)}
+
+    frames = []
+    for group, file_paths in data_files.items():
+        for run, file_path in enumerate(file_paths, start=1):
+            df = traces[file_path].copy()
+            df[group_name] = group
+            df['Run'] = run
+            frames.append(df)
+
+    all_data = pd.concat(frames, ignore_index=True)
+    columns = [col for col in all_data.columns if col not in RAW_COLUMNS]
+    return all_data[columns + RAW_COLUMNS]
+
+
+def parquet_available() -> bool:
+    if importlib.util.find_spec("pyarrow") is None:
+        logger.warning("pyarrow is not installed: parsed trace files will not be cached")
+        return False
+    return True
 
-    return all_data
 
+def trace_cache_path(cache_dir: Path, data_file: str, raw: bool) -> Path:
+    """Cache file of a trace, keyed by its absolute path, size and modification time"""
+    stat = os.stat(data_file)
+    key = f"{Path(data_file).resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}\0{'raw' if raw else 'human'}"
+    return cache_dir / f"{hashlib.sha1(key.encode()).hexdigest()}.parquet"
 
-def load_dataframe(data_file: str, group: str, group_name: str, run: int) -> pd.DataFrame:
-    df = pd.read_table(data_file)
-    df[group_name] = [group] * len(df)
-    df['Run'] = [run] * len(df)
-    df = df[~df['status'].isin(['FAILED', 'ABORTED'])]
+
+def load_trace(data_file: str, raw: bool, cache_dir: Path|None = None) -> pd.DataFrame:
+    """Load a trace file from the cache, or parse it (and cache it)"""
+    if cache_dir is None:
+        return load_dataframe(data_file, raw)
+
+    cache_path = trace_cache_path(cache_dir, data_file, raw)
+    if cache_path.exists():
+        return pd.read_parquet(cache_path)
+
+    df = load_dataframe(data_file, raw)
+    # Write to a temporary file first so readers never see a partial file
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
     return df
 
 
-def convert_memory(mem: list[str]) -> list[str]:
-    """Convert human readable value into float"""
-    raw_mem = []
-    for item in mem:
-        if item == '-' or item == '0':
-            raw_mem.append(0)
-        elif item.endswith('KB'):
-            raw_mem.append(float(item.split()[0]) / 1000)
-        elif item.endswith('MB'):
-            raw_mem.append(float(item.split()[0]))
-        elif item.endswith('GB'):
-            raw_mem.append(float(item.split()[0]) * 1000)
-        else:
-            print('Not recognised', item)
+def load_dataframe(data_file: str, raw: bool) -> pd.DataFrame:
+    return convert_trace(pd.read_table(data_file), raw)
+
+
+def convert_trace(df: pd.DataFrame, raw: bool) -> pd.DataFrame:
+    """Drop the failed tasks of a trace and add the standardised raw_ columns"""
+    df = df[~df['status'].isin(['FAILED', 'ABORTED'])].reset_index(drop=True)
+
+    if not raw:
+        df["raw_realtime"] = convert_realtime(df["realtime"])
+        df["raw_process"] = convert_process_names(df["process"])
+        df["raw_memory_MB"] = convert_memory(df["rss"])
+        df["raw_max_memory"] = convert_memory(df["peak_rss"])
+    else:
+        df["raw_realtime"] = df["realtime"]
+        df["raw_process"] = df["process"]
+        df["raw_memory_MB"] = df["rss"]
+        df["raw_max_memory"] = df["peak_rss"]
+
+    return df
+
+
+def standard_units(df: pd.DataFrame, raw: bool) -> pd.DataFrame:
+    """raw_realtime in seconds and raw_max_memory in MB, as with the converted values:
+    in raw mode, convert_trace keeps the trace values, in milliseconds and bytes"""
+    if not raw:
+        return df
+    return df.assign(
+        raw_realtime=pd.to_numeric(df["raw_realtime"], errors="coerce") / 1e3,
+        raw_max_memory=pd.to_numeric(df["raw_max_memory"], errors="coerce") / 1e6,
+    )
+
+
+# Nextflow memory units, as powers of 1000 of a MB
+MEMORY_UNITS = {"B": -2, "KB": -1, "MB": 0, "GB": 1, "TB": 2, "PB": 3, "EB": 4}
+MEMORY_PATTERN = r"^\s*(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>[KMGTPE]?B)\s*$"
+
+# Nextflow duration units, in seconds (milliseconds are divided by 1000)
+DURATION_UNITS = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+DURATION_PATTERN = (
+    r"^\s*(?:(?P<ms>\d+(?:\.\d+)?)ms"
+    r"|(?=\d)(?:(?P<d>\d+(?:\.\d+)?)d\s*)?(?:(?P<h>\d+(?:\.\d+)?)h\s*)?"
+    r"(?:(?P<m>\d+(?:\.\d+)?)m\s*)?(?:(?P<s>\d+(?:\.\d+)?)s)?)\s*$"
+)
+
+PROCESS_PREFIXES = (
+    'PARSE_SEQUENCE', 'SEQUENCE_PRECALC',
+    'AGGREGATE_PARSED_SEQS', 'AGGREGATE_RESULTS',
+    'REPRESENTATIVE_DOMAINS', 'XREFS', 'WRITE_RESULTS'
+)
+
+
+def convert_distinct(values: pd.Series, convert) -> pd.Series:
+    """Apply a vectorised conversion to the distinct values only: trace columns
+    repeat the same few strings, so this is much cheaper than parsing every row"""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=True)
+    converted = convert(pd.Series(uniques, dtype=object).astype(str)).to_numpy()
+    converted = np.append(converted, np.nan if converted.dtype.kind == "f" else None)
+    return pd.Series(converted[codes], index=values.index)
+
+
+def parse_memory(mem: pd.Series) -> pd.Series:
+    parts = mem.str.extract(MEMORY_PATTERN)
+    value = parts["value"].astype(float)
+    exponent = parts["unit"].map(MEMORY_UNITS).astype(float)
+    scale = 1000.0 ** exponent.abs()
+    raw_mem = value.where(exponent < 0, value * scale).where(exponent >= 0, value / scale)
+    return raw_mem.mask(mem.str.strip().isin(['-', '0']), 0.0)
+
+
+def convert_memory(mem: pd.Series) -> pd.Series:
+    """Convert human readable values (e.g. '1.2 GB') into floats (in MB)"""
+    raw_mem = convert_distinct(mem, parse_memory)
+
+    unrecognised = raw_mem.isna() & mem.notna()
+    if unrecognised.any():
+        logger.error("Memory value(s) not recognised: %s", ", ".join(mem[unrecognised].astype(str).unique()))
 
     return raw_mem
 
 
-def convert_process_names(processes: list[str]) -> list[str]:
+def convert_process_names(processes: pd.Series) -> pd.Series:
     """Convert the process names to be shorter, and a standardised
     format with MEMBER_DB: RUNER/PARSER/POST_PROCESS/FILTER
     respectively."""
-    shortened_processses = []
-    unrecognised_processes = False
-    for process in processes:
-        if process.startswith(
-            (
-                'PARSE_SEQUENCE', 'SEQUENCE_PRECALC',
-                'AGGREGATE_PARSED_SEQS', 'AGGREGATE_RESULTS',
-                'REPRESENTATIVE_DOMAINS', 'XREFS', 'WRITE_RESULTS'
-            )
-        ):
-            shortened_processses.append(process)
-        elif process.startswith('SEQUENCE_ANALYSIS:'):
-            shortened_processses.append(process.replace('SEQUENCE_ANALYSIS:', ''))
-        else:
-            print('Unrecognised process', process)
-            unrecognised_processes = True
-
-    if unrecognised_processes:
-        sys.exit(1)
-
-    return shortened_processses
-
-
-def convert_realtime(realtimes) -> list[int]:
-    """Convert human written values to standardised intergers
-    (in seconds)."""
-    sec_pattern = re.compile(r"^(\d+\.\d+|\d+)s$")
-    min_pattern = re.compile(r"^(\d+)m\s(\d+)s$")
-    min_only_pattern = re.compile(r"^(\d+)m$")
-    hr_sec_pattern = re.compile(r"^(\d+)h\s(\d+)s$")
-    hr_min_pattern = re.compile(r"^(\d+)h\s(\d+)m$")
-    hr_min_sec_pattern = re.compile(r"^(\d+)h\s(\d+)m\s(\d+)s$")
-    raw_realtime = []
-
-    for value in realtimes:
-        value = value.strip()
-
-        if value == '-':
-            raw_realtime.append(0)
-            continue
-
-        if value.endswith('ms'):
-            raw_realtime.append(int(value.strip('ms'))/1000)
-            continue
-
-        min_data = min_only_pattern.match(value)
-        if min_data:
-            raw_realtime.append(int(min_data.group(1)) * 60)
-            continue
-
-        min_data = min_pattern.match(value)
-        if min_data:
-            mins = int(min_data.group(1)) * 60
-            secs = int(min_data.group(2))
-            raw_realtime.append(mins + secs)
-            continue
-
-        sec_data = sec_pattern.match(value)
-        if sec_data:
-            raw_realtime.append(float(sec_data.group(1)))
-            continue
-
-        hr_sec_data = hr_sec_pattern.match(value)
-        if hr_sec_data:
-            raw_realtime.append((int(hr_sec_data.group(1))) * 60 * 60 + int(hr_sec_data.group(2)))
-            continue
-
-        hr_min_data = hr_min_pattern.match(value)
-        if hr_min_data:
-            raw_realtime.append((int(hr_min_data.group(1))) * 60 * 60 + int(hr_min_data.group(2)) * 60)
-            continue
-
-        hr_min_sec_data = hr_min_sec_pattern.match(value)
-        if hr_min_sec_data:
-            raw_realtime.append(
-                (
-                    int(hr_min_sec_data.group(1))
-                ) * 60 * 60 + int(
-                    hr_min_sec_data.group(2)
-                ) * 60 + int(
-                    hr_min_sec_data.group(3)
-                )
-            )
-            continue
+    def shorten(names: pd.Series) -> pd.Series:
+        in_subworkflow = names.str.startswith('SEQUENCE_ANALYSIS:')
+        recognised = in_subworkflow | names.str.startswith(PROCESS_PREFIXES)
+        if not recognised.all():
+            for process in names[~recognised]:
+                print('Unrecognised process', process)
+            sys.exit(1)
+        return names.mask(in_subworkflow, names.str.replace('SEQUENCE_ANALYSIS:', '', regex=False))
+
+    return convert_distinct(processes, shorten)
+
+
+def parse_realtime(realtimes: pd.Series) -> pd.Series:
+    parts = realtimes.str.extract(DURATION_PATTERN).astype(float)
+    seconds = parts[list(DURATION_UNITS)] * pd.Series(DURATION_UNITS)
+    seconds["ms"] = parts["ms"] / 1000
+    raw_realtime = seconds.sum(axis=1, min_count=1)
+    return raw_realtime.mask(realtimes.str.strip() == '-', 0.0)
+
+
+def convert_realtime(realtimes: pd.Series) -> pd.Series:
+    """Convert human written values (e.g. '1d 2h 3m 4s', '1.5s', '250ms')
+    to standardised floats (in seconds)."""
+    raw_realtime = convert_distinct(realtimes, parse_realtime)
 
-        logger.error(f"Time value not recognised: {value}")
+    unrecognised = raw_realtime.isna() & realtimes.notna()
+    if unrecognised.any():
+        logger.error("Time value(s) not recognised: %s", ", ".join(realtimes[unrecognised].astype(str).unique()))
 
     return raw_realtime
@@ -0,0 +1,231 @@
+"""Follow the trace file of a running IPS6 analysis and keep rolling
+per-process throughput, latency and memory statistics, printed to the
+terminal and written for the Prometheus node exporter textfile collector."""
+
+
+import io
+import logging
+import os
+import time
+
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import MEMBER_STAGE, assign_stage, convert_timestamps
+from src.utilities import convert_process_names, convert_trace
+
+
+logger = logging.getLogger(__name__)
+
+
+class TraceTail:
+    """Read the lines appended to a Nextflow trace file since the last call.
+
+    Nextflow appends one line per task when it completes, so only whole lines
+    are read and a partially written last line is left for the next call.
+    The file is read again from the start if it is replaced or truncated
+    (e.g. by a resumed run).
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.header = None
+        self.offset = 0
+        self.inode = None
+
+    def read(self) -> pd.DataFrame | None:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            if self.inode is not None:
+                logger.warning("%s was replaced or truncated: reading it from the start", self.path)
+            self.header, self.offset, self.inode = None, 0, stat.st_ino
+
+        with open(self.path, "rb") as fh:
+            fh.seek(self.offset)
+            data = fh.read()
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return None
+        self.offset += end
+        lines = data[:end].decode()
+
+        if self.header is None:
+            self.header, _, lines = lines.partition("\n")
+            self.header += "\n"
+        if not lines:
+            return None
+        return pd.read_table(io.StringIO(self.header + lines))
+
+
+class RollingStats:
+    """Per-process statistics of the tasks completed in the last `window` seconds,
+    and counts of all the tasks completed since the start of the run.
+
+    Times are taken from the 'complete' column of the trace when present, so
+    the window follows the run (including when replaying a finished trace),
+    otherwise from the time the tasks were read.
+    """
+    def __init__(self, window: float, raw: bool, batch_size: int | None = None):
+        self.window = window
+        self.raw = raw
+        self.batch_size = batch_size
+        self.tasks = pd.DataFrame({
+            "raw_process": pd.Series(dtype=str),
+            "raw_realtime": pd.Series(dtype=float),
+            "raw_memory_MB": pd.Series(dtype=float),
+            "raw_max_memory": pd.Series(dtype=float),
+            "time": pd.Series(dtype=float),
+        })
+        self.completed = pd.Series(dtype=int)
+        self.failed = pd.Series(dtype=int)
+        self.first_time = None
+        self.last_time = None
+
+    def update(self, trace: pd.DataFrame | None):
+        if trace is not None and not trace.empty:
+            failed = trace["status"].isin(["FAILED", "ABORTED"])
+            if failed.any():
+                processes = trace.loc[failed, "process"]
+                processes = processes if self.raw else convert_process_names(processes)
+                self.failed = self.failed.add(processes.value_counts(), fill_value=0).astype(int)
+
+            tasks = convert_trace(trace, self.raw)
+            tasks["time"] = self.completion_times(tasks)
+            self.completed = self.completed.add(tasks["raw_process"].value_counts(), fill_value=0).astype(int)
+            if not tasks.empty:
+                tasks = tasks[self.tasks.columns]
+                self.tasks = tasks if self.tasks.empty else pd.concat([self.tasks, tasks], ignore_index=True)
+                start = (tasks["time"] - tasks["raw_realtime"].fillna(0)).min()
+                self.first_time = start if self.first_time is None else min(start, self.first_time)
+                end = tasks["time"].max()
+                self.last_time = end if self.last_time is None else max(end, self.last_time)
+
+        if self.last_time is not None:
+            # Only the tasks in the window are kept, so memory use does not grow during multi-day runs
+            self.tasks = self.tasks[self.tasks["time"] > self.last_time - self.window].reset_index(drop=True)
+
+    def completion_times(self, tasks: pd.DataFrame) -> np.ndarray:
+        """Completion time of the tasks, in seconds since the epoch"""
+        now = time.time()
+        if "complete" not in tasks.columns:
+            return np.full(len(tasks), now)
+        times = convert_timestamps(tasks["complete"], self.raw)
+        if not self.raw:
+            # Nextflow writes the local time
+            times = times.dt.tz_localize(datetime.now().astimezone().tzinfo, ambiguous="NaT", nonexistent="NaT")
+        else:
+            times = times.dt.tz_localize("UTC")
+        seconds = (times - pd.Timestamp(0, tz="UTC")).dt.total_seconds()
+        return seconds.fillna(now).to_numpy()
+
+    def span(self) -> float:
+        """Duration (s) the rates are computed over: the window, or less at the start of the run"""
+        if self.last_time is None:
+            return 0.0
+        return min(self.window, self.last_time - self.first_time)
+
+    def summary(self) -> pd.DataFrame:
+        processes = self.tasks.groupby("raw_process")
+        summary = pd.DataFrame({
+            "completed": self.completed,
+            "failed": self.failed,
+            "window_tasks": processes.size(),
+            "busy_s": processes["raw_realtime"].sum(),
+            "realtime_median_s": processes["raw_realtime"].median(),
+            "realtime_p95_s": processes["raw_realtime"].quantile(0.95),
+            "rss_median_MB": processes["raw_memory_MB"].median(),
+            "peak_rss_max_MB": processes["raw_max_memory"].max(),
+        })
+        summary.index.name = "process"
+        counts = ["completed", "failed", "window_tasks"]
+        summary[counts] = summary[counts].fillna(0).astype(int)
+        summary["busy_s"] = summary["busy_s"].fillna(0)
+
+        span = self.span()
+        summary["tasks_per_hour"] = summary["window_tasks"] * 3600 / span if span > 0 else np.nan
+        if self.batch_size:
+            summary["sequences_per_hour"] = summary["tasks_per_hour"] * self.batch_size
+        summary["stage"] = assign_stage(summary.index.to_series())
+        return summary.sort_values("busy_s", ascending=False)
+
+
+def bottleneck(summary: pd.DataFrame) -> str | None:
+    """Member analysis with the most task time in the window"""
+    members = summary[(summary["stage"] == MEMBER_STAGE) & (summary["window_tasks"] > 0)]
+    return members["busy_s"].idxmax() if not members.empty else None
+
+
+def format_summary(summary: pd.DataFrame, stats: RollingStats, path: Path) -> str:
+    columns = ["completed", "failed", "tasks_per_hour", "realtime_median_s", "realtime_p95_s", "peak_rss_max_MB"]
+    if "sequences_per_hour" in summary.columns:
+        columns.insert(3, "sequences_per_hour")
+
+    header = (
+        f"{time.strftime('%Y-%m-%d %H:%M:%S')}  {path}  "
+        f"{int(summary['completed'].sum())} tasks completed, {int(summary['failed'].sum())} failed, "
+        f"rates over the last {stats.span() / 60:.0f} min"
+    )
+    slowest = bottleneck(summary)
+    if slowest:
+        header += f"\nBottleneck: {slowest}"
+    if summary.empty:
+        return header
+    table = summary[columns].to_string(float_format=lambda value: f"{value:.1f}", na_rep="-")
+    return f"{header}\n{table}"
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+# Name, type, help and summary column of each exported metric
+PROMETHEUS_METRICS = [
+    ("ips6_tasks_completed_total", "counter", "Tasks completed since the start of the run", "completed"),
+    ("ips6_tasks_failed_total", "counter", "Tasks failed or aborted since the start of the run", "failed"),
+    ("ips6_process_tasks_per_hour", "gauge", "Tasks completed per hour in the rolling window", "tasks_per_hour"),
+    ("ips6_process_sequences_per_hour", "gauge", "Sequences processed per hour (tasks per hour x batch size)", "sequences_per_hour"),
+    ("ips6_process_busy_seconds", "gauge", "Sum of the task run times in the rolling window", "busy_s"),
+    ("ips6_process_realtime_median_seconds", "gauge", "Median task run time in the rolling window", "realtime_median_s"),
+    ("ips6_process_realtime_p95_seconds", "gauge", "95th percentile of the task run time in the rolling window", "realtime_p95_s"),
+    ("ips6_process_rss_median_megabytes", "gauge", "Median task RSS in the rolling window", "rss_median_MB"),
+    ("ips6_process_peak_rss_max_megabytes", "gauge", "Largest task peak RSS in the rolling window", "peak_rss_max_MB"),
+]
+
+
+def write_prometheus(summary: pd.DataFrame, stats: RollingStats, path: Path):
+    """Write the statistics in the Prometheus text format.
+
+    The file is written to a temporary file then renamed, so the textfile
+    collector never reads a partial file.
+    """
+    lines = []
+    for name, kind, description, column in PROMETHEUS_METRICS:
+        if column not in summary.columns:
+            continue
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        for process, value in summary[column].dropna().items():
+            lines.append(f'{name}{{process="{escape_label(process)}"}} {value:g}')
+
+    slowest = bottleneck(summary)
+    lines += [
+        "# HELP ips6_bottleneck Member analysis with the most task time in the rolling window",
+        "# TYPE ips6_bottleneck gauge",
+    ]
+    if slowest:
+        lines.append(f'ips6_bottleneck{{process="{escape_label(slowest)}"}} 1')
+    lines += [
+        "# HELP ips6_trace_last_task_timestamp_seconds Completion time of the last task read from the trace",
+        "# TYPE ips6_trace_last_task_timestamp_seconds gauge",
+        f"ips6_trace_last_task_timestamp_seconds {stats.last_time or 0:g}",
+    ]
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
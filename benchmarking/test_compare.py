@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# (c) EMBL-EBI 2024
+"""Checks of the regression gate in src/compare.py, run with
+    python -m pytest test_compare.py
+from the benchmarking directory."""
+
+
+import numpy as np
+import pandas as pd
+
+from src.compare import change_pct, compare_groups
+
+
+def tasks(group: str, memory: list) -> pd.DataFrame:
+    return pd.DataFrame({"Groups": group, "raw_process": "PFAM", "raw_max_memory": memory})
+
+
+def test_change_pct():
+    assert change_pct(100, 150) == 50
+    assert change_pct(0, 0) == 0
+    assert change_pct(0, 200) == np.inf
+
+
+def test_zero_baseline_is_a_regression():
+    df = pd.concat([tasks("old", [0.0] * 10), tasks("new", [500.0] * 10)], ignore_index=True)
+    results = compare_groups(df, "Groups", "old", "new", {"raw_max_memory": 0.1})
+    assert results["change_pct"].tolist() == [np.inf]
+    assert results["regression"].tolist() == [True]
+
+
+def test_zero_baseline_and_candidate_is_not_a_regression():
+    df = pd.concat([tasks("old", [0.0] * 10), tasks("new", [0.0] * 10)], ignore_index=True)
+    results = compare_groups(df, "Groups", "old", "new", {"raw_max_memory": 0.1})
+    assert results["regression"].tolist() == [False]
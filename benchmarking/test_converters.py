@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# (c) EMBL-EBI 2024
+"""Checks of the vectorised trace converters in src/utilities.py against the former
+loop-based ones of benchmark_converters.py, run with
+    python -m pytest test_converters.py
+from the benchmarking directory."""
+
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark_converters import reference_convert_memory, reference_convert_process_names, reference_convert_realtime
+from src.utilities import convert_memory, convert_process_names, convert_realtime
+
+
+# Trace written with the fields listed in the README
+TRACE = Path(__file__).parent / "test_data" / "ips6.trace.txt"
+
+
+@pytest.fixture(scope="module")
+def trace() -> pd.DataFrame:
+    return pd.read_table(TRACE)
+
+
+@pytest.mark.parametrize("column, reference, vectorised", [
+    ("realtime", reference_convert_realtime, convert_realtime),
+    ("duration", reference_convert_realtime, convert_realtime),
+    ("rss", reference_convert_memory, convert_memory),
+    ("peak_rss", reference_convert_memory, convert_memory),
+    ("memory", reference_convert_memory, convert_memory),
+])
+def test_vectorised_values_equal_loop_values(trace, column, reference, vectorised):
+    expected = pd.Series(reference(trace[column]), index=trace.index, dtype=float)
+    observed = vectorised(trace[column])
+    assert expected.notna().all()
+    np.testing.assert_array_equal(observed.to_numpy(dtype=float), expected.to_numpy())
+
+
+def test_vectorised_process_names_equal_loop_names(trace):
+    expected = reference_convert_process_names(trace["process"])
+    assert convert_process_names(trace["process"]).tolist() == expected
+
+
+def test_vectorised_converter_reads_values_the_loop_did_not(trace):
+    # Requested times without minutes or seconds, e.g. '2h'
+    assert reference_convert_realtime(["2h"]) == [None]
+    assert convert_realtime(trace["time"]).tolist() == [
+        float(value[:-1]) * 3600 for value in trace["time"]
+    ]
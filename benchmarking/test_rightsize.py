@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# (c) EMBL-EBI 2024
+"""Checks of the resource right-sizing in src/rightsize.py, run with
+    python -m pytest test_rightsize.py
+from the benchmarking directory."""
+
+
+import pandas as pd
+
+from src.rightsize import nextflow_config, rightsize
+from src.utilities import convert_trace
+
+
+SELECTORS = [("withLabel", "tiny", {"cpus": 1, "memory": 2000, "time": 7200})]
+PROCESS_LABELS = {"XREFS": ["tiny"]}
+
+
+def trace(raw: bool) -> pd.DataFrame:
+    """The same two tasks (1.5 GB and 1 GB peak memory, 30 and 20 min), as written
+    with or without `trace.raw = true`"""
+    if raw:
+        memory, realtime = [1.5e9, 1e9], [1.8e6, 1.2e6]
+    else:
+        memory, realtime = ["1.5 GB", "1 GB"], ["30m", "20m"]
+    df = pd.DataFrame({
+        "process": ["XREFS", "XREFS"],
+        "status": ["COMPLETED", "COMPLETED"],
+        "realtime": realtime,
+        "rss": memory,
+        "peak_rss": memory,
+        "%cpu": ["98.0%", "99.5%"] if not raw else [98.0, 99.5],
+    })
+    return convert_trace(df, raw)
+
+
+def test_raw_trace_in_mb_and_seconds():
+    report = rightsize(trace(raw=True), PROCESS_LABELS, SELECTORS, raw=True).iloc[0]
+    assert report["peak_rss_max_MB"] == 1500
+    assert report["realtime_max_s"] == 1800
+    assert not report["under_requested"]
+
+
+def test_raw_and_converted_traces_propose_the_same_requests():
+    raw = rightsize(trace(raw=True), PROCESS_LABELS, SELECTORS, raw=True)
+    converted = rightsize(trace(raw=False), PROCESS_LABELS, SELECTORS)
+    assert raw["proposed_memory_MB"].tolist() == converted["proposed_memory_MB"].tolist() == [2000]
+    assert raw["proposed_time"].tolist() == converted["proposed_time"].tolist() == [3600]
+    assert nextflow_config(raw, "local") == nextflow_config(converted, "local")
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# (c) EMBL-EBI 2024
+"""Checks of the batch size scaling model in src/scaling.py, run with
+    python -m pytest test_scaling.py
+from the benchmarking directory."""
+
+
+import math
+
+import pandas as pd
+
+from src.scaling import fit_models, recommend
+
+
+def trace(raw: bool) -> pd.DataFrame:
+    """Runs of 2000 sequences with batches of 500 and 1000: tasks take 10 s + 0.01 s
+    and use 100 MB + 0.1 MB per sequence, in ms and bytes in raw traces"""
+    rows = []
+    for batch_size in (500, 1000):
+        for _ in range(math.ceil(2000 / batch_size)):
+            realtime = 10 + 0.01 * batch_size
+            memory = 100 + 0.1 * batch_size
+            rows.append({
+                "Groups": str(batch_size),
+                "Run": "1",
+                "raw_process": "XREFS",
+                "raw_realtime": realtime * 1e3 if raw else realtime,
+                "raw_max_memory": memory * 1e6 if raw else memory,
+                "cpus": 1,
+                "%cpu": 100.0 if raw else "100.0%",
+            })
+    return pd.DataFrame(rows)
+
+
+def test_raw_trace_fits_the_same_models():
+    raw = fit_models(trace(raw=True), "Groups", 2000, raw=True)
+    converted = fit_models(trace(raw=False), "Groups", 2000)
+    pd.testing.assert_frame_equal(raw, converted)
+    assert round(raw.loc["XREFS", "memory_fixed_MB"]) == 100
+
+
+def test_raw_trace_batch_size_fits_memory():
+    models = fit_models(trace(raw=True), "Groups", 2000, raw=True)
+    predictions, cpus, batch_size = recommend(models, [500, 1000], 2000, 4, max_memory=1000)
+    assert predictions["fits_memory"].all()
+    assert batch_size is not None
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# (c) EMBL-EBI 2024
+"""Checks of the executor simulator in src/simulate.py, run with
+    python -m pytest test_simulate.py
+from the benchmarking directory."""
+
+
+import numpy as np
+import pandas as pd
+
+from src.simulate import Executor, simulate_run, task_resources
+from src.utilities import convert_trace
+
+
+def raw_trace(memory=None) -> pd.DataFrame:
+    """Trace written with `trace.raw = true`: peak_rss and memory in bytes"""
+    df = pd.DataFrame({
+        "process": ["A", "B"],
+        "status": ["COMPLETED", "COMPLETED"],
+        "realtime": [1000, 2000],
+        "rss": [4e8, 5e8],
+        "peak_rss": [4e8, 5e8],
+        "cpus": [1, 2],
+    })
+    if memory is not None:
+        df["memory"] = memory
+    return convert_trace(df, raw=True)
+
+
+def test_raw_trace_without_memory_uses_peak_rss_in_mb():
+    df = raw_trace()
+    tasks = task_resources(df, df[["process"]], raw=True)
+    assert tasks["memory_MB"].tolist() == [400.0, 500.0]
+    assert tasks["cpus"].tolist() == [1, 2]
+
+
+def test_raw_trace_fills_missing_memory_requests_with_peak_rss():
+    df = raw_trace(memory=[2e9, np.nan])
+    tasks = task_resources(df, df[["process"]], raw=True)
+    assert tasks["memory_MB"].tolist() == [2000.0, 500.0]
+
+
+def test_raw_trace_without_memory_does_not_take_a_whole_node():
+    # Two 500 MB tasks fit together on one 4 GB node: they run concurrently
+    df = raw_trace()
+    tasks = task_resources(df, df[["process"]], raw=True)
+    tasks["submit_s"] = [0.0, 0.0]
+    tasks["start_s"] = [0.0, 0.0]
+    tasks["complete_s"] = [10.0, 10.0]
+    executor = Executor(nodes=1, cores_per_node=4, queue_size=10, node_memory=4000)
+    assert simulate_run(tasks, executor)["predicted_makespan_s"] == 10.0
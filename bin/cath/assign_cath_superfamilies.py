@@ -1,74 +1,67 @@
-"""Takes the output from Cath Resolve Hits and assigns CATH superfamilies based on domain id's"""
+"""Takes the output from Cath Resolve Hits and assigns CATH superfamilies based on domain id's
 
+Single file:
+    assign_cath_superfamilies.py MAP DISC_REGS resolved.out cath.tsv
 
-import sys
-import pickle as pkl
-import os
-import itertools
-from collections import defaultdict
-import csv
-import gzip
-import re
+Gene3D matches as JSON (the schema of lib/Match.groovy), joining the assigned domains
+with the hmmsearch output cath-resolve-hits was run on:
+    assign_cath_superfamilies.py MAP DISC_REGS resolved.out cathgene3d.json --hmmsearch hmmsearch.out
 
-domain_to_family_map_file = sys.argv[1]
-discontinuous_regs_file = sys.argv[2]
-infile = sys.argv[3]
-outfile = sys.argv[4]
+Batch mode, one tab separated input, output and optional hmmsearch path per line of the manifest:
+    assign_cath_superfamilies.py MAP DISC_REGS --manifest manifest.tsv
 
-evalue_coff = 0.001
+Worker mode, reads manifest lines from stdin and reports each job on stdout
+as 'OK<tab>output' or 'ERROR<tab>output<tab>message':
+    assign_cath_superfamilies.py MAP DISC_REGS --worker
 
-discontinuous_regs = pkl.load(open(discontinuous_regs_file, 'rb'), encoding='utf-8')
+The reference data is loaded once and shared by all files processed in batch and worker mode.
+Input files may be gzip, bzip2, xz or zstd compressed (detected from their content).
+Output files are compressed according to --compress or their extension (.gz, .bz2, .xz, .zst).
 
-mode = "with_family"
-if len(sys.argv) > 2:
-   mode = sys.argv[2]
+With --workers N, each file is split on query id boundaries and the shards are assigned
+in a pool of N forked processes sharing the reference data, then written in input order.
+"""
 
 
-ofh = None
-# if infile.endswith(".gz"):
-#     ofh = csv.writer(gzip.open(infile.replace(".gz", ".csv.gz"),"w"))
-# else:
-#     ofh = csv.writer(open(infile + ".csv","w"))
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
 
-#output file
-ofh = csv.writer(open(outfile,"w"), delimiter='\t')
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-dom_to_fam={}
+import numpy as np
 
-for line in open(domain_to_family_map_file):
-    if line.strip():
-        vals = re.split(r'\s+', line)
-        domain_id = vals[0].strip()
-        domain_id = re.sub(r'^"|"$', '', domain_id)
-        if '-' in domain_id:
-            domain_id = domain_id[:-3]
-        superfamily = vals[1].strip()
-        superfamily = re.sub(r'^"|"$', '', superfamily)
-        dom_to_fam[domain_id] = superfamily
+import hmmer3
+from cath_index import load_discontinuous_regs, load_domain_map
+from cath_io import CODECS, createText, openText
 
-# for line in open(domain_to_family_map_file):
-#     vals = line.split()
-#     dom_to_fam[vals[1].strip()] = vals[0]
-#
-# for line in open("./cath_release/CathDomainList"):
-#
-#     line =line.replace("\n","")
-#
-#     if line.startswith("#"):continue
-#
-#     vals = line.split()
-#     superfamily= ".".join(vals[1:5])
-#     domain_id =vals[0]
-#     dom_to_fam[domain_id] = superfamily
 
+evalue_coff = 0.001
+member_db = "CATH-Gene3D"
+shard_size = 20000  # lines
+
+# Reference data inherited by the forked worker processes
+_reference = None
+# Barrier the worker processes wait on when the pool is started
+_started = None
 
 
-def rangesAsList(i, merge_small_gaps=False):
-    x=[]
-    for start,stop in ranges(i):
-        x.append([start, stop])
+class CathReference:
+    """Domain to superfamily map and discontinuous regions, with the
+    per-HMM arrays built on first use"""
+    def __init__(self, domain_to_family_map_file, discontinuous_regs_file):
+        self.dom_to_fam = load_domain_map(domain_to_family_map_file)
+        self.discontinuous_regs = load_discontinuous_regs(discontinuous_regs_file)
+        self.plup_arrays = {}
+
+    def plupArrays(self, hmm_id):
+        if hmm_id not in self.plup_arrays:
+            self.plup_arrays[hmm_id] = plupAsArrays(self.discontinuous_regs[hmm_id])
+        return self.plup_arrays[hmm_id]
 
-    return x
 
 def getRegionsAsString(regions):
 
@@ -78,129 +71,420 @@ def getRegionsAsString(regions):
     return ",".join(a)
 
 
-def ranges(i):
-    for a, b in itertools.groupby(enumerate(i), lambda x_y: x_y[1] - x_y[0]):
-        b = list(b)
-        yield b[0][1], b[-1][1]
-
-
-"""open cath resolve hits file, add a CATH superfamily column and split up discontinous HMM's into component domains"""
-ifh = None
-if infile.endswith(".gz"): ifh = gzip.open(infile)
-else: ifh = open(infile)
-
-for line in ifh:
-    line = line.rstrip()
-    vals =line.split()
-
-    if line.startswith("#"):
-        if line.startswith("#FIELD"):
-            ofh.writerow(["#domain_id","cath-superfamily"] + vals[1:])
-        continue
-
-
-
-    hmm_id = vals[1]
-    if hmm_id.startswith("dc_") is False:
-        dom = hmm_id.split("-")[0]
-        sfam = dom_to_fam.get(dom, "-")
-
-        if mode =="with_family":
-            if len(sfam)==0: continue
-
-            evalue = float(vals[-1])
-
-            if evalue > evalue_coff: continue
-
-        ofh.writerow([dom,sfam] + vals + [""])
-        continue
-
-    sequence_id, hmm_id, bit_score, start_stop, final_start_stop, alignment_regs,cond_eval, ind_eval = vals
-
-    final_start_stop_list=[]
-    for i in final_start_stop.split(","):
-        final_start_stop_list.append(list(map(int,i.split("-"))))
-    plup = discontinuous_regs[hmm_id]
-
-
-    mda_resolved_aas = set()
-    for start,stop in final_start_stop_list:
-        mda_resolved_aas |= set(range(start, stop +1))
-
-
-    dom_sequence_regs = defaultdict(list)
-
-    resi_dom={}
-    for areg in alignment_regs.split(";"):
-        hmm_region, seq_region = areg.split(",")
-        hmm_start, hmm_stop = list(map(int, hmm_region.split("-")))
-        seq_start, seq_stop = list(map(int, seq_region.split("-")))
-        seq_pos = list(range(seq_start, seq_stop +1))
-
-
-        for c,i in enumerate(range(hmm_start, hmm_stop+1)):
-
-            dom, resi, ostat = plup.get(i-1, [None,None,None]) #zero indexed
-            aa_num = seq_pos[c]
-            if aa_num not in mda_resolved_aas: continue
-
-            resi_dom[seq_pos[c]]=[dom,ostat]
-            if dom:
-                dom_sequence_regs[dom].append(seq_pos[c])
-    #fill
-    for dom, regs in list(dom_sequence_regs.items()):
-        
-        sequence_regs = rangesAsList(regs)
-        new_sequence_regs=[]
-        for c,reg in enumerate(sequence_regs):
-         
-            if c==0:
-                new_sequence_regs.append(reg)
-                continue
+def plupAsArrays(plup):
+    """Convert a {hmm position: [domain, residue, overlap status]} map into arrays
+    indexed by HMM position, holding codes into the domain and status lists.
+    The last element of each array is a sentinel (-1) for positions without a domain."""
+    dom_codes, ostat_codes = {}, {}
+    size = max(plup) + 1 if plup else 0
+    dom_at = np.full(size + 1, -1, dtype=np.int32)
+    ostat_at = np.full(size + 1, -1, dtype=np.int32)
+
+    for pos, (dom, resi, ostat) in plup.items():
+        if dom is not None:
+            dom_at[pos] = dom_codes.setdefault(dom, len(dom_codes))
+        ostat_at[pos] = ostat_codes.setdefault(ostat, len(ostat_codes))
+
+    doms = list(dom_codes)
+    # domains reported in the output, indexed by code (-1 -> False)
+    reported = np.array([bool(dom) for dom in doms] + [False])
+    return doms, reported, list(ostat_codes), dom_at, ostat_at
+
+
+def runs(values):
+    """Start and end of each run of consecutive integers, in order"""
+    ends = np.flatnonzero(np.diff(values) != 1)
+    starts = np.concatenate(([0], ends + 1))
+    ends = np.append(ends, len(values) - 1)
+    return values[starts].tolist(), values[ends].tolist()
+
+
+def projectDomains(plup_arrays, final_start_stop, alignment_regs):
+    """Project the domains of a discontinuous HMM onto the resolved residues of the query.
+    Yields each domain with its (gap merged) sequence regions and overlap status string."""
+    doms, reported, ostats, hmm_dom_at, hmm_ostat_at = plup_arrays
+
+    resolved = np.array(
+        [list(map(int, i.split("-"))) for i in final_start_stop.split(",")],
+        dtype=np.int64
+    )
+    aligned = np.array(
+        [list(map(int, areg.replace(",", "-").split("-"))) for areg in alignment_regs.split(";")],
+        dtype=np.int64
+    )
+    hmm_lengths = aligned[:, 1] - aligned[:, 0] + 1
+    offsets = np.arange(hmm_lengths.sum()) - np.repeat(np.cumsum(hmm_lengths) - hmm_lengths, hmm_lengths)
+    hmm_pos = np.repeat(aligned[:, 0] - 1, hmm_lengths) + offsets  # zero indexed
+    seq_pos = np.repeat(aligned[:, 2], hmm_lengths) + offsets
+
+    # Mask of residues kept by cath-resolve-hits
+    size = max(int(resolved[:, 1].max()), int(seq_pos.max())) + 2
+    delta = np.zeros(size, dtype=np.int32)
+    np.add.at(delta, resolved[:, 0], 1)
+    np.add.at(delta, resolved[:, 1] + 1, -1)
+    is_resolved = np.cumsum(delta) > 0
+
+    keep = is_resolved[seq_pos]
+    hmm_pos, seq_pos = hmm_pos[keep], seq_pos[keep]
+
+    # HMM position -> domain, then residue -> domain
+    hmm_pos = np.minimum(hmm_pos, len(hmm_dom_at) - 1)
+    res_dom = hmm_dom_at[hmm_pos]
+    res_ostat = hmm_ostat_at[hmm_pos]
+    dom_at = np.full(size, -1, dtype=np.int32)
+    ostat_at = np.full(size, -1, dtype=np.int32)
+    dom_at[seq_pos] = res_dom
+    ostat_at[seq_pos] = res_ostat
+
+    # Domains in order of first occurrence, skipping residues without a domain
+    has_dom = reported[res_dom]
+    codes, first = np.unique(res_dom[has_dom], return_index=True)
+
+    for code in codes[np.argsort(first)]:
+        starts, ends = runs(seq_pos[has_dom & (res_dom == code)])
+        # number of residues assigned to another domain up to each position
+        conflicts = np.concatenate(([0], np.cumsum((dom_at >= 0) & (dom_at != code)))).tolist()
+
+        #fill
+        new_sequence_regs = [[starts[0], ends[0]]]
+        for start, end in zip(starts[1:], ends[1:]):
             prev_reg = new_sequence_regs[-1]
-
-            if reg[0] - prev_reg[1] <=20:
-                conflict = False
-               
-                
-                for resi in range(prev_reg[0]+1, reg[1]):
-                    dom2,ostat = resi_dom.get(resi,[None, None])
-                    if dom2 is None: continue
-                    if dom2 != dom: 
-                        conflict =True
-                        break
-
-                if conflict is False:
-                    new_reg = [prev_reg[0], reg[1]]
-                    new_sequence_regs[-1]= new_reg    
-
-                else:new_sequence_regs.append(reg)
+            if start - prev_reg[1] <= 20:
+                if conflicts[end] - conflicts[prev_reg[0] + 1] > 0:
+                    new_sequence_regs.append([start, end])
+                else:
+                    new_sequence_regs[-1] = [prev_reg[0], end]
+            else:
+                new_sequence_regs.append([start, end])
+
+        reg_ostats = []
+        for start, end in new_sequence_regs:
+            reg_ostat = {ostats[ostat_at[start]], ostats[ostat_at[end]]}
+            reg_ostats.append("*" if len(reg_ostat) > 1 else "".join(reg_ostat))
+
+        yield doms[code], new_sequence_regs, "".join(reg_ostats)
+
+
+def assignLines(ref, lines, with_family=False):
+    """Add a CATH superfamily column to cath resolve hits lines and split up discontinous HMM's
+    into component domains. Yields the output rows."""
+    for line in lines:
+        line = line.rstrip()
+        vals =line.split()
+
+        if line.startswith("#"):
+            if line.startswith("#FIELD"):
+                yield ["#domain_id","cath-superfamily"] + vals[1:]
+            continue
+
+        hmm_id = vals[1]
+        if hmm_id.startswith("dc_") is False:
+            dom = hmm_id.split("-")[0]
+            sfam = ref.dom_to_fam.get(dom, "-")
+
+            if with_family:
+                if len(sfam)==0: continue
+
+                evalue = float(vals[-1])
+
+                if evalue > evalue_coff: continue
+
+            yield [dom,sfam] + vals + [""]
+            continue
+
+        sequence_id, hmm_id, bit_score, start_stop, final_start_stop, alignment_regs,cond_eval, ind_eval = vals
+
+        for dom, new_sequence_regs, reg_ostats_string in projectDomains(
+            ref.plupArrays(hmm_id), final_start_stop, alignment_regs
+        ):
+            sequence_regs_string = getRegionsAsString(new_sequence_regs)
+            tot_res = 0
+            for start,stop in new_sequence_regs:
+                tot_res += (stop - start) +1
+            if tot_res < 10: continue
+            vals[1] = hmm_id + "_" + dom
+            vals[4] =sequence_regs_string
+
+            sfam =  ref.dom_to_fam.get(dom,"-")
+            if with_family:
+                if len(sfam) ==0: continue
+                evalue = float(vals[-1])
+                if evalue > evalue_coff: continue
+
+            yield [dom, sfam] +  vals + [reg_ostats_string]
+
+
+def splitShards(lines, size):
+    """Group lines into shards of about `size` lines, never splitting the hits of a query"""
+    shard = []
+    prev_query = None
+    for line in lines:
+        query = None if line.startswith("#") else line.split(None, 1)[0]
+        if len(shard) >= size and query is not None and query != prev_query:
+            yield shard
+            shard = []
+        shard.append(line)
+        if query is not None:
+            prev_query = query
+    if shard:
+        yield shard
+
+
+def assignShard(lines, with_family):
+    """Run in a worker process: assign one shard of lines"""
+    return list(assignLines(_reference, lines, with_family))
+
+
+def startPool(workers):
+    """Fork all the worker processes now, before any input is opened: a process forked
+    while a thread (e.g. a --threaded-io reader) holds a lock would deadlock on it.
+    ProcessPoolExecutor otherwise forks them on the first submit (one per submit before
+    Python 3.11), so each worker waits on a barrier until all of them are running."""
+    global _started
+    context = multiprocessing.get_context("fork")
+    _started = context.Barrier(workers + 1)
+    pool = ProcessPoolExecutor(workers, mp_context=context)
+    futures = [pool.submit(waitStarted) for _ in range(workers)]
+    _started.wait(timeout=60)
+    for future in futures:
+        future.result()
+    return pool
+
+
+def waitStarted():
+    """Run in a worker process: wait for the other workers to be forked"""
+    _started.wait(timeout=60)
+
+
+def assignRows(ref, lines, with_family, pool=None, workers=1):
+    """Assign all lines, in a pool of processes if one is given. Rows are yielded in input order."""
+    if pool is None:
+        yield from assignLines(ref, lines, with_family)
+        return
+
+    # Keep a bounded number of shards in flight
+    pending = deque()
+    for shard in splitShards(lines, shard_size):
+        pending.append(pool.submit(assignShard, shard, with_family))
+        if len(pending) >= 2 * workers:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def parseBoundaries(boundaries):
+    """'1-10,20-30' -> [(1, 10), (20, 30)], sorted by start then end"""
+    return sorted(tuple(map(int, reg.split("-"))) for reg in boundaries.split(","))
+
+
+def domainKey(row):
+    """Key of the hmmsearch domain a CATH domain comes from: model-envelope start-envelope end"""
+    domain_id, match_id, boundaries = row[0], row[3], parseBoundaries(row[5])
+    if match_id.startswith("dc_"):
+        match_id = match_id.replace("_" + domain_id, "")
+    return f"{match_id}-{min(s for s, e in boundaries)}-{max(e for s, e in boundaries)}"
+
+
+def buildMatches(rows, hmmsearch_file, threaded=False):
+    """Join the assigned domains with their hmmsearch domains, and build Gene3D matches
+    in the schema of the Match class (lib/Match.groovy): {sequence id: {domain id: match}}"""
+    domains = {}
+    for row in rows:
+        if row[0].startswith("#"):
+            continue
+        domains.setdefault(row[2], []).append((row, domainKey(row)))
+
+    wanted = {(seq_id, key) for seq_id, seq_domains in domains.items() for _, key in seq_domains}
+    hmmer_domains = {}
+    with openText(hmmsearch_file, threaded) as fh:
+        for target_id, model_acc, hit, location in hmmer3.parseDomains(
+            fh,
+            lambda target_id, model_acc, start, end: (target_id, f"{model_acc}-{start}-{end}") in wanted
+        ):
+            key = f"{model_acc}-{location['envelopeStart']}-{location['envelopeEnd']}"
+            hmmer_domains[(target_id, key)] = (hit, location)
+
+    results = {}
+    for seq_id, seq_domains in domains.items():
+        matches = results[seq_id] = {}
+        for row, key in seq_domains:
+            try:
+                hit, hmmer_location = hmmer_domains[(seq_id, key)]
+            except KeyError:
+                raise ValueError(f"No hmmsearch domain {key} for {seq_id} in {hmmsearch_file}")
+
+            resolved = parseBoundaries(row[6])
+            if len(resolved) > 1:
+                statuses = ["C_TERMINAL_DISC"] + ["NC_TERMINAL_DISC"] * (len(resolved) - 2) + ["N_TERMINAL_DISC"]
             else:
-                new_sequence_regs.append(reg)
-        
-        reg_ostats=[]
-        for reg in new_sequence_regs:
-            reg_ostat = set([resi_dom[reg[0]][1],  resi_dom[reg[1]][1] ])
-            if len(reg_ostat) > 1: reg_ostat = "*"
-            else:  reg_ostat = "".join(list(reg_ostat))
-            reg_ostats.append(reg_ostat)
-
-        reg_ostats_string = "".join(reg_ostats)
-        sequence_regs_string = getRegionsAsString(new_sequence_regs)
-        tot_res = 0
-        for start,stop in new_sequence_regs:
-            tot_res += (stop - start) +1
-        if tot_res < 10: continue
-        vals[1] = hmm_id + "_" + dom
-        vals[4] =sequence_regs_string
-
-
-        sfam =  dom_to_fam.get(dom,"-")
-        if mode =="with_family":   
-            if len(sfam) ==0: continue
-            evalue = float(vals[-1])
-            if evalue > evalue_coff: continue
-
-        ofh.writerow([dom, sfam] +  vals + [reg_ostats_string])
-
-ifh.close()
+                statuses = ["CONTINUOUS"]
+
+            location = {
+                "start": min(s for s, e in resolved),
+                "end": max(e for s, e in resolved),
+                "hmmStart": hmmer_location["hmmStart"],
+                "hmmEnd": hmmer_location["hmmEnd"],
+                "hmmLength": hmmer_location["hmmLength"],
+                "hmmBounds": hmmer_location["hmmBounds"],
+                "envelopeStart": hmmer_location["envelopeStart"],
+                "envelopeEnd": hmmer_location["envelopeEnd"],
+                "evalue": float(row[9]),
+                "score": float(row[4]),
+                "bias": None,
+                "queryAlignment": None,
+                "targetAlignment": None,
+                "sequenceFeature": None,
+                "pvalue": None,
+                "motifNumber": None,
+                "level": None,
+                "cigarAlignment": None,
+                "fragments": [
+                    {"start": start, "end": end, "dcStatus": status}
+                    for (start, end), status in zip(resolved, statuses)
+                ],
+                "sites": [],
+                "representative": False,
+                "included": True,
+            }
+
+            domain_id = row[0]
+            if domain_id in matches:
+                matches[domain_id]["locations"].append(location)
+                continue
+
+            matches[domain_id] = {
+                "modelAccession": domain_id,
+                "evalue": hit["evalue"],
+                "score": hit["score"],
+                "bias": hit["bias"],
+                "signature": {
+                    "accession": f"G3DSA:{row[1]}",
+                    "name": None,
+                    "description": None,
+                    "type": None,
+                    "signatureLibraryRelease": {"library": member_db, "version": None},
+                    "entry": None,
+                },
+                "locations": [location],
+                "included": True,
+                "representativeInfo": None,
+                "treegrafter": None,
+                "graphscan": None,
+            }
+
+    return results
+
+
+def assignFile(ref, infile, outfile, args, pool=None, hmmsearch_file=None):
+    """open cath resolve hits file and write the assigned domains to outfile, as TSV,
+    or as Gene3D matches (JSON) if the hmmsearch output is given"""
+    with openText(infile, args.threaded_io) as ifh, createText(outfile, args.compress, args.compress_level) as fh:
+        rows = assignRows(ref, ifh, args.with_family, pool, args.workers)
+        if hmmsearch_file:
+            json.dump(buildMatches(rows, hmmsearch_file, args.threaded_io), fh, separators=(",", ":"))
+        else:
+            ofh = csv.writer(fh, delimiter='\t')
+            ofh.writerows(rows)
+
+
+def readJobs(fh):
+    """Yield (input, output, hmmsearch output or None) from tab separated lines,
+    skipping blank and comment lines"""
+    for line in fh:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        fields = line.split("\t")
+        if len(fields) not in (2, 3):
+            raise ValueError(f"Expected 'input<tab>output[<tab>hmmsearch]', got: {line}")
+        yield fields[0], fields[1], fields[2] if len(fields) == 3 else None
+
+
+def runWorker(ref, args, pool=None):
+    for infile, outfile, hmmsearch_file in readJobs(sys.stdin):
+        try:
+            assignFile(ref, infile, outfile, args, pool, hmmsearch_file)
+        except Exception as exc:
+            print(f"ERROR\t{outfile}\t{exc}", flush=True)
+        else:
+            print(f"OK\t{outfile}", flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Assign CATH superfamilies to cath-resolve-hits output"
+    )
+    parser.add_argument("domain_to_family_map_file", help="Domain to superfamily map")
+    parser.add_argument("discontinuous_regs_file", help="Discontinuous regions pickle")
+    parser.add_argument("infile", nargs="?", help="cath-resolve-hits output")
+    parser.add_argument("outfile", nargs="?", help="Output file")
+    parser.add_argument(
+        "--hmmsearch",
+        help="hmmsearch output the hits were resolved from. Write Gene3D matches as JSON instead of TSV"
+    )
+    parser.add_argument("--manifest", help="File listing tab separated input, output [and hmmsearch output] paths")
+    parser.add_argument("--worker", action="store_true", help="Read manifest lines from stdin")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to assign each file"
+    )
+    parser.add_argument(
+        "--compress",
+        choices=CODECS,
+        default=None,
+        help="Compression of the output files. Default: inferred from the output file extension"
+    )
+    parser.add_argument("--compress-level", type=int, default=None, help="Compression level of the output files")
+    parser.add_argument(
+        "--threaded-io",
+        action="store_true",
+        help="Read and decompress the input files on a separate thread"
+    )
+    parser.add_argument(
+        "--with-family",
+        action="store_true",
+        help=f"Only report domains with a superfamily and an independent E-value <= {evalue_coff}"
+    )
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    single = args.infile is not None and args.outfile is not None
+    if sum([single, args.manifest is not None, args.worker]) != 1:
+        parser.error("provide either INFILE and OUTFILE, --manifest, or --worker")
+
+    if args.hmmsearch and not single:
+        parser.error("--hmmsearch applies to INFILE, use a third manifest column in batch and worker mode")
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    global _reference
+    ref = _reference = CathReference(args.domain_to_family_map_file, args.discontinuous_regs_file)
+
+    pool = None
+    if args.workers > 1:
+        # Fork after loading the reference data so the workers share it copy-on-write
+        pool = startPool(args.workers)
+
+    try:
+        if args.worker:
+            runWorker(ref, args, pool)
+        elif args.manifest:
+            with open(args.manifest) as fh:
+                for infile, outfile, hmmsearch_file in readJobs(fh):
+                    assignFile(ref, infile, outfile, args, pool, hmmsearch_file)
+        else:
+            assignFile(ref, args.infile, args.outfile, args, pool, args.hmmsearch)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Compact, memory-mapped indexes for the CATH-Gene3D reference data used by
+assign_cath_superfamilies.py.
+
+The indexes are built once, when the data is released, and written next to
+their source file as `<source>.idx`:
+
+    python cath_index.py \
+        --domain-map model_to_family_map.tsv \
+        --disc-regs discontinuous_regs.pkl.py3
+
+Each index records the size, modification time and SHA-256 checksum of the
+file it was built from. An index whose source has changed since is ignored
+and the source file is parsed instead. When only the modification time changed
+(e.g. the data directory was copied), the index header is updated so that the
+checksum is computed once.
+
+Index layout (offsets are unsigned 32-bit integers in native byte order):
+    header | key offsets [n + 1] | value offsets [n + 1] | keys | values
+Keys are sorted so that a lookup is a binary search over the mapped file.
+"""
+
+
+import argparse
+import hashlib
+import mmap
+import os
+import pickle as pkl
+import re
+import shutil
+import struct
+import sys
+
+from array import array
+
+
+INDEX_SUFFIX = ".idx"
+DOMAIN_MAP_MAGIC = b"CATHMAP1"
+DISC_REGS_MAGIC = b"CATHDCR1"
+
+# magic, source size, source mtime (ns), number of keys, padding, source sha256
+HEADER = struct.Struct("<8sQqI4x32s")
+
+
+def parse_domain_map(domain_to_family_map_file: str) -> dict:
+    """Parse the domain to superfamily text map, e.g. '1abcA01  3.40.50.300'"""
+    dom_to_fam = {}
+    for line in open(domain_to_family_map_file):
+        if line.strip():
+            vals = re.split(r'\s+', line)
+            domain_id = vals[0].strip()
+            domain_id = re.sub(r'^"|"$', '', domain_id)
+            if '-' in domain_id:
+                domain_id = domain_id[:-3]
+            superfamily = vals[1].strip()
+            superfamily = re.sub(r'^"|"$', '', superfamily)
+            dom_to_fam[domain_id] = superfamily
+    return dom_to_fam
+
+
+def checksum(path: str) -> bytes:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    return sha.digest()
+
+
+def write_index(index_path: str, source_path: str, magic: bytes, items: dict):
+    """Write a sorted key/offset index of {bytes: bytes} items built from source_path"""
+    keys = sorted(items)
+    key_offsets, value_offsets = array("I", [0]), array("I", [0])
+    for key in keys:
+        key_offsets.append(key_offsets[-1] + len(key))
+        value_offsets.append(value_offsets[-1] + len(items[key]))
+
+    stat = os.stat(source_path)
+    header = HEADER.pack(magic, stat.st_size, stat.st_mtime_ns, len(keys), checksum(source_path))
+
+    # Write to a temporary file first so readers never see a partial index
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(header)
+        key_offsets.tofile(fh)
+        value_offsets.tofile(fh)
+        fh.write(b"".join(keys))
+        fh.write(b"".join(items[key] for key in keys))
+    os.replace(tmp_path, index_path)
+
+
+def is_fresh(index_path: str, source_path: str, magic: bytes) -> bool:
+    """Check the index exists and was built from the current version of source_path.
+    Size and mtime are compared first, the checksum only when the mtime differs
+    (e.g. after the data directory was copied), in which case the new mtime is
+    recorded in the index."""
+    try:
+        with open(index_path, "rb") as fh:
+            header = fh.read(HEADER.size)
+        stat = os.stat(source_path)
+    except OSError:
+        return False
+
+    if len(header) != HEADER.size:
+        return False
+
+    idx_magic, size, mtime_ns, _, digest = HEADER.unpack(header)
+    if idx_magic != magic or size != stat.st_size:
+        return False
+
+    if mtime_ns == stat.st_mtime_ns:
+        return True
+    if digest != checksum(source_path):
+        return False
+
+    try:
+        update_mtime(index_path, header, stat.st_mtime_ns)
+    except OSError as exc:
+        print(f"WARNING: cannot update {index_path} ({exc}), rebuild it with cath_index.py "
+              f"to avoid checksumming {source_path} on every run", file=sys.stderr)
+    return True
+
+
+def update_mtime(index_path: str, header: bytes, mtime_ns: int):
+    """Replace the source mtime in the header of the index, on a copy of the index
+    swapped in atomically, so that readers never see a partial index"""
+    magic, size, _, count, digest = HEADER.unpack(header)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        shutil.copy(index_path, tmp_path)
+        with open(tmp_path, "r+b") as fh:
+            fh.write(HEADER.pack(magic, size, mtime_ns, count, digest))
+        os.replace(tmp_path, index_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class Index:
+    """Read-only view on an index written by write_index()"""
+    def __init__(self, index_path: str, magic: bytes):
+        with open(index_path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        idx_magic, _, _, count, _ = HEADER.unpack_from(self._mm)
+        if idx_magic != magic:
+            raise ValueError(f"{index_path} is not a valid index")
+
+        view = memoryview(self._mm)
+        width = array("I").itemsize
+        start = HEADER.size
+        self._key_offsets = view[start:start + (count + 1) * width].cast("I")
+        start += (count + 1) * width
+        self._value_offsets = view[start:start + (count + 1) * width].cast("I")
+        start += (count + 1) * width
+        self._keys_start = start
+        self._values_start = start + self._key_offsets[count]
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def _key(self, i: int) -> bytes:
+        return self._mm[self._keys_start + self._key_offsets[i]:self._keys_start + self._key_offsets[i + 1]]
+
+    def get_bytes(self, key: bytes):
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self._count and self._key(lo) == key:
+            return self._mm[self._values_start + self._value_offsets[lo]:self._values_start + self._value_offsets[lo + 1]]
+        return None
+
+
+class DomainMap(Index):
+    """Domain id to CATH superfamily lookups, decoding only the keys requested"""
+    def __init__(self, index_path: str):
+        super().__init__(index_path, DOMAIN_MAP_MAGIC)
+        self._cache = {}
+
+    def get(self, domain_id: str, default=None):
+        try:
+            superfamily = self._cache[domain_id]
+        except KeyError:
+            value = self.get_bytes(domain_id.encode())
+            superfamily = value.decode() if value is not None else None
+            self._cache[domain_id] = superfamily
+        return default if superfamily is None else superfamily
+
+
+def build_domain_map_index(domain_to_family_map_file: str) -> str:
+    index_path = domain_to_family_map_file + INDEX_SUFFIX
+    dom_to_fam = parse_domain_map(domain_to_family_map_file)
+    items = {dom.encode(): sfam.encode() for dom, sfam in dom_to_fam.items()}
+    write_index(index_path, domain_to_family_map_file, DOMAIN_MAP_MAGIC, items)
+    return index_path
+
+
+def load_domain_map(domain_to_family_map_file: str):
+    """Use the prebuilt index when it is up to date, otherwise parse the text map"""
+    index_path = domain_to_family_map_file + INDEX_SUFFIX
+    if is_fresh(index_path, domain_to_family_map_file, DOMAIN_MAP_MAGIC):
+        return DomainMap(index_path)
+    if os.path.exists(index_path):
+        print(f"WARNING: {index_path} is out of date, parsing {domain_to_family_map_file}", file=sys.stderr)
+    return parse_domain_map(domain_to_family_map_file)
+
+
+class DiscontinuousRegions(Index):
+    """Per-HMM residue maps of discontinuous (dc_*) models. Each map is pickled
+    separately so only the HMMs requested are ever deserialised."""
+    def __init__(self, index_path: str):
+        super().__init__(index_path, DISC_REGS_MAGIC)
+        self._cache = {}
+
+    def __getitem__(self, hmm_id: str):
+        try:
+            return self._cache[hmm_id]
+        except KeyError:
+            value = self.get_bytes(hmm_id.encode())
+            if value is None:
+                raise
+            plup = self._cache[hmm_id] = pkl.loads(value)
+            return plup
+
+
+def build_disc_regs_index(discontinuous_regs_file: str) -> str:
+    index_path = discontinuous_regs_file + INDEX_SUFFIX
+    with open(discontinuous_regs_file, "rb") as fh:
+        discontinuous_regs = pkl.load(fh, encoding='utf-8')
+    items = {
+        hmm_id.encode(): pkl.dumps(plup, protocol=pkl.HIGHEST_PROTOCOL)
+        for hmm_id, plup in discontinuous_regs.items()
+    }
+    write_index(index_path, discontinuous_regs_file, DISC_REGS_MAGIC, items)
+    return index_path
+
+
+def load_discontinuous_regs(discontinuous_regs_file: str):
+    """Use the prebuilt index when it is up to date, otherwise unpickle the whole dict"""
+    index_path = discontinuous_regs_file + INDEX_SUFFIX
+    if is_fresh(index_path, discontinuous_regs_file, DISC_REGS_MAGIC):
+        return DiscontinuousRegions(index_path)
+    if os.path.exists(index_path):
+        print(f"WARNING: {index_path} is out of date, loading {discontinuous_regs_file}", file=sys.stderr)
+    with open(discontinuous_regs_file, "rb") as fh:
+        return pkl.load(fh, encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build indexes for the CATH-Gene3D reference data")
+    parser.add_argument("--domain-map", help="Domain to superfamily map, e.g. model_to_family_map.tsv")
+    parser.add_argument("--disc-regs", help="Discontinuous regions pickle, e.g. discontinuous_regs.pkl.py3")
+    args = parser.parse_args()
+
+    if not args.domain_map and not args.disc_regs:
+        parser.error("at least one of --domain-map or --disc-regs is required")
+
+    if args.domain_map:
+        print(f"Index written to {build_domain_map_index(args.domain_map)}")
+    if args.disc_regs:
+        print(f"Index written to {build_disc_regs_index(args.disc_regs)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Compressed, buffered text I/O for the CATH scripts.
+
+Input compression is detected from the first bytes of the file, so gzip, bzip2,
+xz and zstd (if the zstandard package is installed) files can be read whatever
+their name. Output compression is chosen explicitly or from the file extension.
+"""
+
+
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+BUFFER_SIZE = 1 << 20  # 1 MiB
+
+MAGIC_NUMBERS = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+}
+CODECS = ("none", "gzip", "bz2", "xz", "zstd")
+DEFAULT_LEVELS = {"gzip": 6, "bz2": 9, "xz": 6, "zstd": 3}
+
+
+def detectCodec(path):
+    with open(path, "rb") as fh:
+        head = fh.read(6)
+    for magic, codec in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return codec
+    return "none"
+
+
+def codecFromName(path):
+    for ext, codec in EXTENSIONS.items():
+        if path.endswith(ext):
+            return codec
+    return "none"
+
+
+def requireZstandard():
+    if zstandard is None:
+        raise RuntimeError("zstd compression requires the 'zstandard' Python package")
+
+
+def openBinary(path, mode, codec, level=None):
+    """Open a (de)compressing binary stream"""
+    if codec == "none":
+        return open(path, mode + "b")
+    if level is None and mode == "w":
+        level = DEFAULT_LEVELS[codec]
+
+    if codec == "gzip":
+        return gzip.open(path, mode + "b", compresslevel=level) if mode == "w" else gzip.open(path, "rb")
+    elif codec == "bz2":
+        return bz2.open(path, mode + "b", compresslevel=level) if mode == "w" else bz2.open(path, "rb")
+    elif codec == "xz":
+        return lzma.open(path, mode + "b", preset=level) if mode == "w" else lzma.open(path, "rb")
+    elif codec == "zstd":
+        requireZstandard()
+        if mode == "w":
+            return zstandard.ZstdCompressor(level=level).stream_writer(open(path, "wb"), closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    raise ValueError(f"Unknown compression codec '{codec}'")
+
+
+class ThreadedReader(io.RawIOBase):
+    """Read a binary stream on a background thread, so that decompression
+    overlaps with the processing of the data already read"""
+    def __init__(self, stream, block_size=BUFFER_SIZE, max_blocks=8):
+        self._stream = stream
+        self._block_size = block_size
+        self._blocks = queue.Queue(max_blocks)
+        self._current = memoryview(b"")
+        self._error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._fill, daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                block = self._stream.read(self._block_size)
+                self._blocks.put(block)
+                if not block:
+                    break
+        except Exception as exc:
+            self._error = exc
+            self._blocks.put(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._current:
+            block = self._blocks.get()
+            if self._error is not None:
+                raise self._error
+            if not block:
+                self._blocks.put(b"")  # keep returning EOF
+                return 0
+            self._current = memoryview(block)
+        n = min(len(buffer), len(self._current))
+        buffer[:n] = self._current[:n]
+        self._current = self._current[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            # Unblock the reader thread if it is waiting on a full queue
+            while self._thread.is_alive():
+                try:
+                    self._blocks.get_nowait()
+                except queue.Empty:
+                    self._thread.join(0.01)
+            self._stream.close()
+        super().close()
+
+
+def openText(path, threaded=False):
+    """Open a plain or compressed text file for reading"""
+    stream = openBinary(path, "r", detectCodec(path))
+    if threaded:
+        stream = io.BufferedReader(ThreadedReader(stream), BUFFER_SIZE)
+    return io.TextIOWrapper(stream)
+
+
+def createText(path, codec=None, level=None):
+    """Open a text file for buffered writing, compressed with codec (inferred from the file extension if None)"""
+    codec = codec or codecFromName(path)
+    stream = openBinary(path, "w", codec, level)
+    return io.TextIOWrapper(io.BufferedWriter(stream, BUFFER_SIZE), newline="")
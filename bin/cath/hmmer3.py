@@ -0,0 +1,104 @@
+"""Streaming reader for HMMER3 hmmsearch output (-o), the Python counterpart of
+HMMER3.parseOutput (lib/HMMER3.groovy) for the fields needed to build CATH matches.
+
+Only the per-sequence top hits and the domain tables are parsed: alignments are
+skipped, and domains can be filtered while reading so that only the ones needed
+are kept in memory.
+"""
+
+
+import re
+
+
+QUERY = re.compile(r"^Query:\s*(.+)\s+\[\w=(\d+)\]$")
+ACCESSION = re.compile(r"^Accession:\s*(.+)$")
+
+
+def parseDomains(lines, wanted=None):
+    """Yield (target_id, model_accession, hit, location) for each domain of each sequence hit.
+
+    hit holds the full sequence evalue, score and bias. location the domain fields
+    of the Location class (lib/Match.groovy). If wanted is given, it is called with
+    (target_id, model_accession, envelope_start, envelope_end) and only domains for
+    which it returns True are yielded.
+    """
+    lines = iter(lines)
+    query_name = query_length = query_accession = None
+
+    for line in lines:
+        if query_name is None:
+            match = QUERY.match(line.rstrip("\n"))
+            if match:
+                query_name = match.group(1).strip()
+                query_length = int(match.group(2))
+                query_accession = None
+            continue
+
+        if not line.startswith("Scores for complete sequences"):
+            match = ACCESSION.match(line.rstrip("\n"))
+            if match:
+                query_accession = match.group(1).strip()
+            continue
+
+        # Fallback to query name if HMM doesn't have an ACC field
+        query_accession = query_accession or query_name
+
+        # Skip the header, then parse the sequence top hits
+        for _ in range(3):
+            next(lines)
+        hits = {}
+        for line in lines:
+            line = line.strip()
+            if not line or "[No hits detected that satisfy reporting thresholds]" in line:
+                break
+            elif line.startswith("------ inclusion threshold"):
+                continue
+            fields = line.split()
+            hits[fields[8]] = {
+                "evalue": float(fields[0]),
+                "score": float(fields[1]),
+                "bias": float(fields[2]),
+            }
+
+        # Domain tables, until the end of the query block
+        target_id = None
+        for line in lines:
+            line = line.strip()
+            if line == "//":
+                break
+            elif line.startswith(">>"):
+                target_id = line[2:].split()[0]
+                line = next(lines).strip()
+                if line.startswith("[No individual domains"):
+                    target_id = None
+                    continue
+                next(lines)  # skip the "---" line
+
+                hit = hits.get(target_id)
+                for line in lines:
+                    fields = line.split()
+                    if not fields:
+                        break
+                    assert len(fields) == 16
+                    if hit is None:
+                        continue
+
+                    envelope_start, envelope_end = int(fields[12]), int(fields[13])
+                    if wanted is not None and not wanted(target_id, query_accession, envelope_start, envelope_end):
+                        continue
+
+                    yield target_id, query_accession, hit, {
+                        "start": int(fields[9]),
+                        "end": int(fields[10]),
+                        "hmmStart": int(fields[6]),
+                        "hmmEnd": int(fields[7]),
+                        "hmmLength": query_length,
+                        "hmmBounds": fields[8],
+                        "envelopeStart": envelope_start,
+                        "envelopeEnd": envelope_end,
+                        "evalue": float(fields[5]),
+                        "score": float(fields[2]),
+                        "bias": float(fields[3]),
+                    }
+
+        query_name = None
@@ -0,0 +1,135 @@
+"""Minimal Newick reader for the PANTHER family trees and the trees of EPA-ng
+jplace files, without the Bio.Phylo object graph.
+
+The tree is read in a single pass over its tokens into flat arrays, with nodes
+numbered in preorder (root = 0), so the subtree of node i is the range
+[i, i + size[i]). Branch lengths are skipped. The edge numbers of jplace trees,
+e.g. `AN12:0.0731{42}`, are kept in `edges` (-1 when absent).
+"""
+
+
+import re
+
+
+TOKENS = re.compile(r"'(?:[^']|'')*'|\[[^\]]*\]|[(),:;{}]|[^\s()\[\]':;,{}]+")
+
+
+class Tree:
+    def __init__(self, parent: list, names: list, edges: list):
+        self.parent = parent
+        self.names = names
+        self.edges = edges
+
+        n = len(parent)
+        self.size = [1] * n
+        for node in range(n - 1, 0, -1):
+            self.size[parent[node]] += self.size[node]
+
+        self.depth = [0] * n
+        for node in range(1, n):
+            self.depth[node] = self.depth[parent[node]] + 1
+
+        # First leaf of the subtree of each node, in preorder
+        self.first_leaf = list(range(n))
+        for node in range(n - 2, -1, -1):
+            if self.size[node] > 1:
+                self.first_leaf[node] = self.first_leaf[node + 1]
+
+    def __len__(self):
+        return len(self.parent)
+
+    def is_leaf(self, node: int) -> bool:
+        return self.size[node] == 1
+
+    def last_leaf(self, node: int) -> int:
+        return node + self.size[node] - 1
+
+    def leaves(self, node: int):
+        """Yield the leaves below node, in preorder"""
+        for leaf in range(node, node + self.size[node]):
+            if self.size[leaf] == 1:
+                yield leaf
+
+    def lca(self, u: int, v: int) -> int:
+        while self.depth[u] > self.depth[v]:
+            u = self.parent[u]
+        while self.depth[v] > self.depth[u]:
+            v = self.parent[v]
+        while u != v:
+            u, v = self.parent[u], self.parent[v]
+        return u
+
+
+def unquote(label: str) -> str:
+    if label.startswith("'"):
+        return label[1:-1].replace("''", "'")
+    return label
+
+
+def is_number(label: str) -> bool:
+    try:
+        float(label)
+    except ValueError:
+        return False
+    return True
+
+
+def parse(text: str) -> Tree:
+    parent, names, edges = [], [], []
+    stack = []       # open internal nodes
+    current = None   # node whose label, length or edge number comes next
+    field = None     # ":" (branch length) or "{" (edge number)
+
+    def new_node():
+        parent.append(stack[-1] if stack else -1)
+        names.append("")
+        edges.append(-1)
+        return len(parent) - 1
+
+    for match in TOKENS.finditer(text):
+        token = match.group()
+        if token == "(":
+            stack.append(new_node())
+            current = None
+        elif token in ",);":
+            if current is None and (token == "," or parent):
+                current = new_node()  # leaf without label
+            if token == ";":
+                break
+            elif token == ")":
+                current = stack.pop()
+            else:
+                current = None
+            field = None
+        elif token == ":" or token == "{":
+            if current is None:
+                current = new_node()
+            field = token
+        elif token == "}" or token.startswith("["):
+            continue
+        elif field == ":":
+            field = None
+        elif field == "{":
+            edges[current] = int(token)
+            field = None
+        else:
+            if current is None:
+                current = new_node()
+            names[current] = unquote(token)
+
+    if stack:
+        raise ValueError("unbalanced parentheses in Newick tree")
+
+    tree = Tree(parent, names, edges)
+
+    # As in Bio.Phylo, numeric labels of internal nodes are support values, not names
+    for node, name in enumerate(names):
+        if name and not tree.is_leaf(node) and is_number(name):
+            names[node] = ""
+
+    return tree
+
+
+def read(newick_file: str) -> Tree:
+    with open(newick_file, "rt") as fh:
+        return parse(fh.read())
@@ -1,52 +1,93 @@
+"""Find the PANTHER tree node of the sequences grafted by EPA-ng.
+
+Single family:
+    parse_epang.py epa_result.jplace PTHR10000.newick
+        prints "query node" for each query of the jplace file
+
+Many families:
+    parse_epang.py --msf Tree_MSF --manifest jplaces.tsv
+        where each line of the manifest is "family<TAB>jplace file",
+        prints "query family node" for each query of each jplace file
+"""
+import argparse
 import json
-import re
+import os
 import sys
 
-from Bio import Phylo
-from Bio.Phylo import NewickIO
+import newick
+from tree_index import load_index
 
 
-def main():
-    jplace_file = sys.argv[1]
-    newick_file = sys.argv[2]
-
+def get_placements(jplace_file):
+    """Yield the query id and the leaves (AN labels) below the common ancestor
+    of the placement locations of each query"""
     with open(jplace_file, "rt") as fh:
         results = json.load(fh)
 
-    tree_string = results["tree"]
-    matches = re.findall(r"AN(\d+):\d+\.\d+\{(\d+)\}", tree_string)
+    tree = newick.parse(results["tree"])
+    edge_nodes = {edge: node for node, edge in enumerate(tree.edges) if edge >= 0}
 
-    an_label = {}
-    for [an, r] in matches:
-        an_label["AN" + an] = "R" + r
-        an_label["R" + r] = "AN" + an
-
-    newick_string = re.sub(r"(AN\d+)?\:\d+\.\d+{(\d+)}", r"R\g<2>",
-                           tree_string)
-
-    newick_string = re.sub(r"AN\d+", r"", newick_string)
-    newick_string = re.sub(r"BI\d+", r"", newick_string)
-    mytree = Phylo.read(NewickIO.StringIO(newick_string), "newick")
-    
     for placement in results["placements"]:
-        query_id = placement["n"][0]
+        # The common ancestor of the terminals below all placement locations
+        # is the common ancestor of the first and last of them in preorder
+        lo = hi = None
+        for maploc in placement["p"]:
+            node = edge_nodes[maploc[0]]
+            first, last = tree.first_leaf[node], tree.last_leaf(node)
+            lo = first if lo is None else min(lo, first)
+            hi = last if hi is None else max(hi, last)
+
         child_ids = []
-        ter = []
+        if lo is not None:
+            comonancestor = tree.lca(lo, hi)
+            child_ids = [tree.names[leaf] for leaf in tree.leaves(comonancestor)]
 
-        for maploc in placement["p"]:
-            rloc = "R" + str(maploc[0])
-            clade_obj = mytree.find_clades(rloc)
+        # Identical queries can be reported together, with "nm" instead of "n"
+        names = placement["n"] if "n" in placement else [nm[0] for nm in placement["nm"]]
+        for query_id in names:
+            yield query_id, child_ids
+
+
+def graft(jplace_file, newick_file):
+    """Yield the query id and the family tree node of each query of a jplace file"""
+    # Prebuilt LCA index of the family tree (see tree_index.py) if available
+    family_tree = load_index(newick_file)
 
-            node = next(clade_obj)
-            ter.extend(node.get_terminals())
-            comonancestor = mytree.common_ancestor(ter)
+    for query_id, child_ids in get_placements(jplace_file):
+        yield query_id, family_tree.label(family_tree.common_ancestor(child_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse EPA-ng placements on PANTHER family trees")
+    parser.add_argument("jplace", nargs="?", help="EPA-ng results (epa_result.jplace)")
+    parser.add_argument("newick", nargs="?", help="Family tree (<family>.newick)")
+    parser.add_argument("--msf", help="Directory of family trees, e.g. panther/Tree_MSF")
+    parser.add_argument("--manifest", help="Tab-separated file of family and jplace file pairs")
+    args = parser.parse_args()
 
-            for leaf in comonancestor.get_terminals():
-                child_ids.append(an_label[leaf.name])
+    if args.manifest:
+        if not args.msf or args.jplace:
+            parser.error("--manifest requires --msf and no positional arguments")
 
-        newtree = Phylo.read(newick_file, "newick")
-        common_an = newtree.common_ancestor(child_ids)
-        print(query_id, str(common_an) if common_an else "root")
+        with open(args.manifest, "rt") as fh:
+            for line in fh:
+                if not line.strip():
+                    continue
+                family, jplace_file = line.rstrip("\n").split("\t")
+                newick_file = os.path.join(args.msf, f"{family}.newick")
+                try:
+                    # Parse the whole family first so it is either fully reported or skipped
+                    nodes = list(graft(jplace_file, newick_file))
+                except Exception as exc:
+                    print(f"WARNING: could not parse {jplace_file} ({family}): {exc}", file=sys.stderr)
+                    continue
+                for query_id, common_an in nodes:
+                    print(query_id, family, common_an)
+    elif args.jplace and args.newick:
+        for query_id, common_an in graft(args.jplace, args.newick):
+            print(query_id, common_an)
+    else:
+        parser.error("either JPLACE and NEWICK, or --msf and --manifest are required")
 
 
 if __name__ == "__main__":
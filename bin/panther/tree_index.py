@@ -0,0 +1,263 @@
+"""Precomputed lowest common ancestor (LCA) indexes for the PANTHER family trees
+used by parse_epang.py.
+
+The indexes are built once, when the data is released, and written next to
+each family tree as `<family>.newick.lca`:
+
+    python tree_index.py /path/to/panther/Tree_MSF [--threads 8]
+
+Each index stores the tree as flat arrays (nodes numbered in preorder, root = 0),
+the Euler tour of the tree and a sparse table over the depths of the tour, so
+the LCA of two nodes is found in constant time without parsing the Newick file.
+Like the CATH-Gene3D indexes, an index records the size, modification time and
+SHA-256 checksum of its tree, and is ignored if the tree has changed since.
+
+Index layout (32-bit integers in native byte order):
+    header | parent [n] | depth [n] | first [n] | sparse [k * m]
+           | name offsets [n + 1] | names
+where m = 2n - 1 is the length of the Euler tour and level 0 of the sparse
+table is the tour itself.
+"""
+
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import newick
+
+
+INDEX_SUFFIX = ".lca"
+LCA_MAGIC = b"PTHRLCA1"
+
+# magic, source size, source mtime (ns), number of nodes, sparse table levels, source sha256
+HEADER = struct.Struct("<8sQqII32s")
+
+
+def checksum(path: str) -> bytes:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    return sha.digest()
+
+
+def euler_tour(parents: list):
+    """Return the depth of each node, the Euler tour of the tree,
+    and the position of the first occurrence of each node in the tour"""
+    n = len(parents)
+    children = [[] for _ in range(n)]
+    for node in range(1, n):
+        children[parents[node]].append(node)
+
+    depth = array("i", [0]) * n
+    first = array("i", [0]) * n
+    tour = array("i", [0])
+    stack = [(0, iter(children[0]))]
+    while stack:
+        node, it = stack[-1]
+        child = next(it, None)
+        if child is None:
+            stack.pop()
+            if stack:
+                tour.append(stack[-1][0])
+        else:
+            depth[child] = depth[node] + 1
+            first[child] = len(tour)
+            tour.append(child)
+            stack.append((child, iter(children[child])))
+    return depth, tour, first
+
+
+def sparse_table(tour: array, depth: array) -> list:
+    """Level j holds, at position i, the shallowest node of tour[i:i + 2**j]"""
+    levels = [tour]
+    span = 1
+    while span * 2 <= len(tour):
+        prev = levels[-1]
+        level = array("i", prev)
+        for i in range(len(tour) - span * 2 + 1):
+            a, b = prev[i], prev[i + span]
+            level[i] = a if depth[a] <= depth[b] else b
+        levels.append(level)
+        span *= 2
+    return levels
+
+
+def build_index(newick_file: str) -> str:
+    index_path = newick_file + INDEX_SUFFIX
+    tree = LcaTree.from_newick(newick_file)
+
+    encoded = [name.encode() for name in tree.names]
+    name_offsets = array("I", [0])
+    for name in encoded:
+        name_offsets.append(name_offsets[-1] + len(name))
+
+    stat = os.stat(newick_file)
+    header = HEADER.pack(LCA_MAGIC, stat.st_size, stat.st_mtime_ns, len(tree), len(tree.levels), checksum(newick_file))
+
+    # Write to a temporary file first so readers never see a partial index
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(header)
+        array("i", tree.parent).tofile(fh)
+        tree.depth.tofile(fh)
+        tree.first.tofile(fh)
+        for level in tree.levels:
+            level.tofile(fh)
+        name_offsets.tofile(fh)
+        fh.write(b"".join(encoded))
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def is_fresh(index_path: str, source_path: str) -> bool:
+    """Check the index exists and was built from the current version of source_path.
+    Size and mtime are compared first, the checksum only when the mtime differs
+    (e.g. after the data directory was copied)."""
+    try:
+        with open(index_path, "rb") as fh:
+            header = fh.read(HEADER.size)
+        stat = os.stat(source_path)
+    except OSError:
+        return False
+
+    if len(header) != HEADER.size:
+        return False
+
+    magic, size, mtime_ns, _, _, digest = HEADER.unpack(header)
+    if magic != LCA_MAGIC or size != stat.st_size:
+        return False
+
+    return mtime_ns == stat.st_mtime_ns or digest == checksum(source_path)
+
+
+class LcaTree:
+    """Constant-time LCA queries on a tree stored as flat arrays"""
+    def __init__(self, parent, depth, first, levels, names):
+        self.parent = parent
+        self.depth = depth
+        self.first = first
+        self.levels = levels
+        self.names = names
+
+        # Same as Bio.Phylo: a name refers to the first node with that name in preorder
+        self._nodes = {}
+        for node, name in enumerate(self.names):
+            if name:
+                self._nodes.setdefault(name, node)
+
+    @classmethod
+    def from_newick(cls, newick_file: str):
+        tree = newick.read(newick_file)
+        depth, tour, first = euler_tour(tree.parent)
+        return cls(tree.parent, depth, first, sparse_table(tour, depth), tree.names)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def node(self, name: str) -> int:
+        try:
+            return self._nodes[name]
+        except KeyError:
+            raise ValueError(f"target '{name}' is not in this tree") from None
+
+    def lca(self, u: int, v: int) -> int:
+        i, j = self.first[u], self.first[v]
+        if i > j:
+            i, j = j, i
+        level = (j - i + 1).bit_length() - 1
+        a = self.levels[level][i]
+        b = self.levels[level][j - (1 << level) + 1]
+        return a if self.depth[a] <= self.depth[b] else b
+
+    def common_ancestor(self, names) -> int:
+        """Return the LCA of the named nodes (the root if there are none).
+        The LCA of a set of nodes is the LCA of the two that come first
+        and last in the Euler tour."""
+        lo = hi = None
+        for name in names:
+            node = self.node(name)
+            if lo is None or self.first[node] < self.first[lo]:
+                lo = node
+            if hi is None or self.first[node] > self.first[hi]:
+                hi = node
+        return 0 if lo is None else self.lca(lo, hi)
+
+    def label(self, node: int) -> str:
+        """Format a node like str(Bio.Phylo.BaseTree.Clade)"""
+        name = self.names[node]
+        if name:
+            return name[:37] + "..." if len(name) > 40 else name
+        return "Clade"
+
+
+class TreeIndex(LcaTree):
+    """Read-only view on a family tree index written by build_index()"""
+    def __init__(self, index_path: str):
+        with open(index_path, "rb") as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, _, _, n, k, _ = HEADER.unpack_from(self._mm)
+        if magic != LCA_MAGIC:
+            raise ValueError(f"{index_path} is not a valid index")
+
+        view = memoryview(self._mm)
+        width = array("i").itemsize
+        m = 2 * n - 1
+        start = HEADER.size
+        parent = view[start:start + n * width].cast("i")
+        start += n * width
+        depth = view[start:start + n * width].cast("i")
+        start += n * width
+        first = view[start:start + n * width].cast("i")
+        start += n * width
+        levels = []
+        for _ in range(k):
+            levels.append(view[start:start + m * width].cast("i"))
+            start += m * width
+        name_offsets = view[start:start + (n + 1) * width].cast("I")
+        start += (n + 1) * width
+        names = [
+            self._mm[start + name_offsets[i]:start + name_offsets[i + 1]].decode()
+            for i in range(n)
+        ]
+        super().__init__(parent, depth, first, levels, names)
+
+
+def load_index(newick_file: str):
+    """Use the prebuilt index of a family tree when it is up to date, otherwise parse the tree"""
+    index_path = newick_file + INDEX_SUFFIX
+    if is_fresh(index_path, newick_file):
+        return TreeIndex(index_path)
+    if os.path.exists(index_path):
+        print(f"WARNING: {index_path} is out of date, parsing {newick_file}", file=sys.stderr)
+    return LcaTree.from_newick(newick_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build LCA indexes for the PANTHER family trees")
+    parser.add_argument("msf", help="Directory of family trees, e.g. panther/Tree_MSF")
+    parser.add_argument("--threads", type=int, default=1, help="Number of trees indexed in parallel")
+    args = parser.parse_args()
+
+    newick_files = sorted(
+        os.path.join(args.msf, name)
+        for name in os.listdir(args.msf)
+        if name.endswith(".newick") and not name.endswith(".bifurcate.newick")
+    )
+    with ProcessPoolExecutor(max_workers=args.threads) as pool:
+        for _ in pool.map(build_index, newick_files, chunksize=16):
+            pass
+
+    print(f"{len(newick_files)} indexes written to {args.msf}")
+
+
+if __name__ == "__main__":
+    main()
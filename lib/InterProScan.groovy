@@ -85,6 +85,31 @@ class InterProScan {
             name: "batch-size",
             description: null
         ],
+        [
+            name: "batch-residues",
+            description: null
+            // Balance the analysis batches by residues: max residues per batch, batch-size then caps the sequences (0: split by batch-size only)
+        ],
+        [
+            name: "bulk-load",
+            description: null
+            // Load the input sequences with the tuned SeqDB.bulkLoadFastaFile (default), or with loadFastaFile if false
+        ],
+        [
+            name: "load-cpus",
+            description: null
+            // Threads hashing the sequences in LOAD_SEQUENCES and LOAD_ORFS in bulk load mode
+        ],
+        [
+            name: "cath-json",
+            description: null
+            // Write the CATH-Gene3D matches from assign_cath_superfamilies.py instead of PARSE_CATHGENE3D
+        ],
+        [
+            name: "cath-workers",
+            description: null
+            // Processes assigning the CATH superfamilies in ASSIGN_CATH
+        ],
         [
             name: "skip-applications",
             metavar: "<APPLICATIONS>",
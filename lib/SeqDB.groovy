@@ -1,5 +1,11 @@
 import groovy.sql.Sql
+import groovy.transform.CompileStatic
 import java.security.MessageDigest
+import java.util.concurrent.Callable
+import java.util.concurrent.ExecutorService
+import java.util.concurrent.Executors
+import java.util.concurrent.Future
+import java.util.function.Supplier
 import java.util.regex.Pattern
 
 class SeqDB {
@@ -7,6 +13,17 @@ class SeqDB {
     private String path
     private Sql sql
     public static final Pattern eslDescription = ~/^source=(.+?)\s+coords=/
+    // Secondary indexes, built after the sequences in bulk load mode
+    private static final Map<String, Map<String, String>> INDEXES = [
+        NUCLEOTIDE           : [idx_nucleotide_id: "NUCLEOTIDE(id)"],
+        PROTEIN_TO_NUCLEOTIDE: [idx_protein_to_nucleotide_nt_md5: "PROTEIN_TO_NUCLEOTIDE(nt_md5)"]
+    ]
+    private static final int BULK_BATCH_SIZE = 10000
+    private static final int BULK_HASH_CHUNK_SIZE = 1000  // sequences hashed per worker task
+    private static final char[] HEX_DIGITS = "0123456789ABCDEF".toCharArray()
+    private static final ThreadLocal<MessageDigest> MD5 = ThreadLocal.withInitial(
+        { MessageDigest.getInstance("MD5") } as Supplier<MessageDigest>
+    )
 
     SeqDB(String path) {
         this.path = path
@@ -38,6 +55,7 @@ class SeqDB {
                 md5          VARCHAR NOT NULL,
                 id           VARCHAR NOT NULL,
                 description  VARCHAR NOT NULL,
+                source_id    VARCHAR,  -- id of the source nucleotide sequence of an ORF
                 PRIMARY KEY (md5, id, description)
                 FOREIGN KEY (md5) REFERENCES PROTEIN_SEQUENCE(md5)
             )
@@ -60,8 +78,6 @@ class SeqDB {
             )
         """
 
-        String sql5 = "CREATE INDEX IF NOT EXISTS idx_nucleotide_id ON NUCLEOTIDE(id)"
-
         String sql6 = """
             CREATE TABLE IF NOT EXISTS PROTEIN_TO_NUCLEOTIDE (
                 protein_md5  VARCHAR NOT NULL,
@@ -76,8 +92,22 @@ class SeqDB {
         this.sql.execute(sql2)
         this.sql.execute(sql3)
         this.sql.execute(sql4)
-        this.sql.execute(sql5)
         this.sql.execute(sql6)
+        this.createIndexes()
+    }
+
+    private void createIndexes(String table = null) {
+        INDEXES.findAll { !table || it.key == table }.each { String indexedTable, Map<String, String> indexes ->
+            indexes.each { String name, String columns ->
+                this.sql.execute("CREATE INDEX IF NOT EXISTS ${name} ON ${columns}".toString())
+            }
+        }
+    }
+
+    private void dropIndexes(String table) {
+        INDEXES.getOrDefault(table, [:]).each { String name, String columns ->
+            this.sql.execute("DROP INDEX IF EXISTS ${name}".toString())
+        }
     }
 
     void close() {
@@ -91,17 +121,19 @@ class SeqDB {
         }
     }
 
-    void loadFastaFile(String fastaFilePath, boolean isNucleic, boolean isTranslated) {
+    int loadFastaFile(String fastaFilePath, boolean isNucleic, boolean isTranslated) {
+        // Return the number of sequences read
         File fastaFile = new File(fastaFilePath)
         def currentHeader = null
         def currentSeq = new StringBuilder()
         Map<String, Set<String>> ntSequences = [:]
+        int count = 0
 
         // Open a transaction
         sql.withTransaction {
             String table = isNucleic ? "NUCLEOTIDE" : "PROTEIN"
             String query1 = "INSERT OR IGNORE INTO ${table}_SEQUENCE (md5, sequence) VALUES (?, ?)"
-            String query2 = "INSERT OR IGNORE INTO ${table} (md5, id, description) VALUES (?, ?, ?)"
+            String query2 = insertSequenceInfoQuery(table, isTranslated)
 
             // Use batches for the sequence table
             sql.withBatch(100, query1) { ps1 ->
@@ -115,19 +147,15 @@ class SeqDB {
                                 String sequence = currentSeq.toString()
                                 def seq = this.processRecord(currentHeader, sequence)
                                 ps1.addBatch(seq.md5, sequence)
-                                ps2.addBatch(seq.md5, seq.id, seq.description)
+                                count++
 
                                 if (isTranslated) {
                                     // Extract the source nucleotide id and add to ntSequences
-                                    def matcher = (seq.description =~ eslDescription)
-                                    if (!matcher.find()) {
-                                        throw new IllegalArgumentException("Invalid esl-translate FASTA header: ${seq.description}")
-                                    }
-                                    String sourceId = matcher.group(1)
-                                    if (!ntSequences.containsKey(sourceId)) {
-                                        ntSequences[sourceId] = [] as Set
-                                    }
-                                    ntSequences[sourceId] << seq.md5
+                                    String ntId = sourceId(seq.description)
+                                    ps2.addBatch(seq.md5, seq.id, seq.description, ntId)
+                                    ntSequences.computeIfAbsent(ntId, { [] as Set }) << seq.md5
+                                } else {
+                                    ps2.addBatch(seq.md5, seq.id, seq.description)
                                 }
                             }
                             currentHeader = line.substring(1).trim()
@@ -141,46 +169,218 @@ class SeqDB {
                         String sequence = currentSeq.toString()
                         def seq = this.processRecord(currentHeader, sequence)
                         ps1.addBatch(seq.md5, sequence)
-                        ps2.addBatch(seq.md5, seq.id, seq.description)
+                        count++
 
                         if (isTranslated) {
-                            def matcher = (seq.description =~ eslDescription)
-                            if (!matcher.find()) {
-                                throw new IllegalArgumentException("Invalid esl-translate FASTA header: ${seq.description}")
-                            }
-                            String sourceId = matcher.group(1)
-                            if (!ntSequences.containsKey(sourceId)) {
-                                ntSequences[sourceId] = [] as Set
-                            }
-                            ntSequences[sourceId] << seq.md5
+                            String ntId = sourceId(seq.description)
+                            ps2.addBatch(seq.md5, seq.id, seq.description, ntId)
+                            ntSequences.computeIfAbsent(ntId, { [] as Set }) << seq.md5
+                        } else {
+                            ps2.addBatch(seq.md5, seq.id, seq.description)
                         }
                     }
                 }
             }
 
             if (isTranslated) {
-                // Insert a mapping between the original nucleic sequences and their translation
-                String query3 = "INSERT OR IGNORE INTO PROTEIN_TO_NUCLEOTIDE (protein_md5, nt_md5) VALUES (?, ?)"
-                sql.withBatch(100, query3) { ps ->
-                    // Get the MD5s of the original (nucleic) sequences using batches
-                    ntSequences.keySet().toList().collate(100).each { List<String> chunk ->
-                        String placeholders = chunk.collect { '?' }.join(',')
-                        String query4 = "SELECT id, md5 FROM NUCLEOTIDE WHERE id IN (${placeholders})"
-                        def records = []
-                        sql.eachRow(query4, chunk) { row ->
-                            String ntId = row.id
-                            String ntMD5 = row.md5
-                            ntSequences[ntId].each { protMD5 ->
-                                records.add([protMD5, ntMD5])
+                this.insertProteinToNucleotide(ntSequences, 100)
+            }
+        }
+        return count
+    }
+
+    int bulkLoadFastaFile(String fastaFilePath, boolean isNucleic, boolean isTranslated, int threads = 1) {
+        return this.bulkLoadFastaFiles([fastaFilePath], isNucleic, isTranslated, threads)
+    }
+
+    int bulkLoadFastaFiles(List<String> fastaFilePaths, boolean isNucleic, boolean isTranslated, int threads = 1) {
+        /* Same as loadFastaFile(), tuned for loading many sequences in a database written by
+        this process only: the journal is not synced to disk, the inserts are sent in large
+        batches, the secondary indexes are built once all files are loaded, the sequences are
+        hashed by a pool of threads while the file is still being read, and the ORFs are mapped
+        to their source nucleotide sequences by a single join on the stored source ids.
+        Return the number of sequences read. */
+        String table = isNucleic ? "NUCLEOTIDE" : "PROTEIN"
+        List<String> indexedTables = isTranslated ? [table, "PROTEIN_TO_NUCLEOTIDE"] : [table]
+        int count = 0
+        threads = Math.max(1, threads)
+        ExecutorService pool = Executors.newFixedThreadPool(threads)
+        // Hashed chunks waiting to be inserted, in the order of the file
+        ArrayDeque<Future<List<Map>>> pending = new ArrayDeque<>()
+
+        this.setBulkLoadPragmas(true)
+        indexedTables.each { this.dropIndexes(it) }
+        try {
+            String query1 = "INSERT OR IGNORE INTO ${table}_SEQUENCE (md5, sequence) VALUES (?, ?)"
+            String query2 = insertSequenceInfoQuery(table, isTranslated)
+            fastaFilePaths.each { String fastaFilePath ->
+                sql.withTransaction {
+                    sql.withBatch(BULK_BATCH_SIZE, query1) { ps1 ->
+                        sql.withBatch(BULK_BATCH_SIZE, query2) { ps2 ->
+                            Closure insertChunk = { Future<List<Map>> future ->
+                                future.get().each { Map seq ->
+                                    ps1.addBatch(seq.md5, seq.sequence)
+                                    if (isTranslated) {
+                                        ps2.addBatch(seq.md5, seq.id, seq.description, sourceId(seq.description))
+                                    } else {
+                                        ps2.addBatch(seq.md5, seq.id, seq.description)
+                                    }
+                                    count++
+                                }
+                            }
+                            Closure submitChunk = { List<List<String>> records ->
+                                pending.add(pool.submit({ records.collect { hashRecord(it[0], it[1]) } } as Callable<List<Map>>))
+                                // Bound the number of chunks held in memory
+                                while (pending.size() > 2 * threads) {
+                                    insertChunk(pending.poll())
+                                }
                             }
-                        }
 
-                        records.each {
-                            ps.addBatch(it)
+                            List<List<String>> records = []
+                            readFasta(fastaFilePath) { String header, String sequence ->
+                                records << [header, sequence]
+                                if (records.size() >= BULK_HASH_CHUNK_SIZE) {
+                                    submitChunk(records)
+                                    records = []
+                                }
+                            }
+                            if (records) {
+                                submitChunk(records)
+                            }
+                            while (pending) {
+                                insertChunk(pending.poll())
+                            }
                         }
                     }
                 }
             }
+
+            if (isTranslated) {
+                sql.execute("""INSERT OR IGNORE INTO PROTEIN_TO_NUCLEOTIDE (protein_md5, nt_md5)
+                    SELECT P.md5, N.md5
+                    FROM PROTEIN AS P
+                    INNER JOIN NUCLEOTIDE AS N ON P.source_id = N.id
+                    WHERE P.source_id IS NOT NULL""")
+            }
+        } finally {
+            pool.shutdownNow()
+            indexedTables.each { this.createIndexes(it) }
+            this.setBulkLoadPragmas(false)
+        }
+        return count
+    }
+
+    private static String insertSequenceInfoQuery(String table, boolean isTranslated) {
+        // ORFs also store the id of their source nucleotide sequence
+        return isTranslated ?
+            "INSERT OR IGNORE INTO PROTEIN (md5, id, description, source_id) VALUES (?, ?, ?, ?)" :
+            "INSERT OR IGNORE INTO ${table} (md5, id, description) VALUES (?, ?, ?)"
+    }
+
+    private void setBulkLoadPragmas(boolean bulkLoad) {
+        if (bulkLoad) {
+            this.sql.execute("PRAGMA journal_mode = WAL")
+            this.sql.execute("PRAGMA synchronous = OFF")
+            this.sql.execute("PRAGMA cache_size = -262144")  // 256 MB
+            this.sql.execute("PRAGMA temp_store = MEMORY")
+        } else {
+            // Back to a single file with the default settings, for the processes reading the database
+            this.sql.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            this.sql.execute("PRAGMA journal_mode = DELETE")
+            this.sql.execute("PRAGMA synchronous = FULL")
+            this.sql.execute("PRAGMA cache_size = -2000")
+            this.sql.execute("PRAGMA temp_store = DEFAULT")
+        }
+    }
+
+    private static void readFasta(String fastaFilePath, Closure onRecord) {
+        // Call onRecord(header, sequence) for each record of a FASTA file
+        String header = null
+        StringBuilder sequence = new StringBuilder()
+        new File(fastaFilePath).withReader { Reader reader ->
+            BufferedReader lines = new BufferedReader(reader, 1 << 20)
+            String line
+            while ((line = lines.readLine()) != null) {
+                line = line.trim()
+                if (line.startsWith(">")) {
+                    if (header) {
+                        onRecord(header, sequence.toString())
+                    }
+                    header = line.substring(1).trim()
+                    sequence.setLength(0)
+                } else {
+                    sequence.append(line)
+                }
+            }
+        }
+        if (header) {
+            onRecord(header, sequence.toString())
+        }
+    }
+
+    private static Map hashRecord(String header, String sequence) {
+        def tokens = header.split(/\s+/, 2)
+        return [
+            id         : tokens[0],
+            description: tokens.length > 1 ? tokens[1] : "",
+            md5        : md5Hex(sequence),
+            sequence   : sequence
+        ]
+    }
+
+    @CompileStatic
+    static String md5Hex(String sequence) {
+        /* Same digest as processRecord(): MD5 of the upper case sequence, in upper case hex,
+        without building the upper case string and with one MessageDigest per thread */
+        int length = sequence.length()
+        byte[] bytes = new byte[length]
+        for (int i = 0; i < length; i++) {
+            int c = (int) sequence.charAt(i)
+            if (c > 127) {
+                bytes = sequence.toUpperCase().bytes
+                break
+            }
+            bytes[i] = (byte) (c >= 97 && c <= 122 ? c - 32 : c)
+        }
+        byte[] digest = MD5.get().digest(bytes)
+        char[] hex = new char[digest.length * 2]
+        for (int i = 0; i < digest.length; i++) {
+            hex[2 * i] = HEX_DIGITS[(digest[i] >> 4) & 0xF]
+            hex[2 * i + 1] = HEX_DIGITS[digest[i] & 0xF]
+        }
+        return new String(hex)
+    }
+
+    private static String sourceId(String description) {
+        // Source nucleotide id of an ORF translated by esl-translate
+        def matcher = (description =~ eslDescription)
+        if (!matcher.find()) {
+            throw new IllegalArgumentException("Invalid esl-translate FASTA header: ${description}")
+        }
+        return matcher.group(1)
+    }
+
+    private void insertProteinToNucleotide(Map<String, Set<String>> ntSequences, int batchSize) {
+        // Insert a mapping between the original nucleic sequences and their translation
+        String query3 = "INSERT OR IGNORE INTO PROTEIN_TO_NUCLEOTIDE (protein_md5, nt_md5) VALUES (?, ?)"
+        sql.withBatch(batchSize, query3) { ps ->
+            // Get the MD5s of the original (nucleic) sequences using batches
+            ntSequences.keySet().toList().collate(100).each { List<String> chunk ->
+                String placeholders = chunk.collect { '?' }.join(',')
+                String query4 = "SELECT id, md5 FROM NUCLEOTIDE WHERE id IN (${placeholders})"
+                def records = []
+                sql.eachRow(query4, chunk) { row ->
+                    String ntId = row.id
+                    String ntMD5 = row.md5
+                    ntSequences[ntId].each { protMD5 ->
+                        records.add([protMD5, ntMD5])
+                    }
+                }
+
+                records.each {
+                    ps.addBatch(it)
+                }
+            }
         }
     }
 
@@ -196,116 +396,157 @@ class SeqDB {
         return [id: id, description: description, md5: md5]
     }
 
-    void splitFasta(String outputPrefix, int maxSequencesPerFile, boolean nucleic) {
+    void splitFasta(String outputPrefix, int maxSequencesPerFile, boolean nucleic, long maxResiduesPerFile = 0) {
+        /* Write the unique protein sequences to FASTA files of at most maxSequencesPerFile sequences
+        and, if maxResiduesPerFile > 0, of at most maxResiduesPerFile residues: the analyses run in a
+        time proportional to the number of residues, so chunks of long sequences would otherwise
+        run much longer than the others. A limit <= 0 is not applied. The ORFs of a nucleotide seq
+        are always written to the same file, which may exceed the limits by the rest of its ORFs.
+        The sequences are written as they are read, without holding a batch in memory. */
         String query = nucleic ? """SELECT P2N.nt_md5, S.md5, S.sequence
             FROM PROTEIN_SEQUENCE AS S
             INNER JOIN PROTEIN AS P ON S.md5 = P.md5
             INNER JOIN PROTEIN_TO_NUCLEOTIDE AS P2N ON P.md5 = P2N.protein_md5
             ORDER BY P2N.nt_md5""" : "SELECT NULL AS nt_md5, md5, sequence FROM PROTEIN_SEQUENCE ORDER BY md5"
-        int fileIndex = 1
-        def batch = []
-        def currentMD5 = null
-        def writer = null
-
-        this.sql.eachRow(query) { row ->
-            // If we encounter a new nt_md5 and the batch is full --> write to a new batch
-            if (currentMD5 && currentMD5 != row.nt_md5 && batch.size() >= maxSequencesPerFile) {
-                writer = new File("${outputPrefix}.${fileIndex}.fasta").newWriter()
-                for (record in batch) {
-                    writer.writeLine(">${record.md5}")
-                    String sequence = record.sequence
-                    for (int i = 0; i < sequence.length(); i += 60) {
-                        int end = Math.min(i + 60, sequence.length())
-                        writer.writeLine(sequence.substring(i, end))
-                    }
+        int fileIndex = 0
+        int fileSequences = 0
+        long fileResidues = 0
+        String currentMD5 = null
+        BufferedWriter writer = null
+
+        try {
+            this.sql.eachRow(query) { row ->
+                String md5 = nucleic ? row.nt_md5 : row.md5
+                String sequence = row.sequence
+                boolean full = (maxSequencesPerFile > 0 && fileSequences >= maxSequencesPerFile) ||
+                    (maxResiduesPerFile > 0 && fileResidues + sequence.length() > maxResiduesPerFile)
+                // Only start a new file on a new nt_md5, to keep the ORFs of a nucleotide seq together
+                if (writer == null || (full && md5 != currentMD5)) {
+                    writer?.close()
+                    fileIndex++
+                    writer = new File("${outputPrefix}.${fileIndex}.fasta").newWriter()
+                    fileSequences = 0
+                    fileResidues = 0
                 }
-                writer.close()
-                fileIndex++
-                batch.clear()
+                writer.write(">${row.md5}")
+                writer.newLine()
+                for (int i = 0; i < sequence.length(); i += 60) {
+                    writer.write(sequence, i, Math.min(60, sequence.length() - i))
+                    writer.newLine()
+                }
+                fileSequences++
+                fileResidues += sequence.length()
+                currentMD5 = md5
             }
-            // Don't add the GroovyResultSet item, else when writing the final batch we will get a ResultSet closed error
-            batch.add([
-                nt_md5  : row.nt_md5,
-                md5     : row.md5,
-                sequence: row.sequence
-            ])
-            currentMD5 = nucleic ? row.nt_md5 : row.md5
+        } finally {
+            writer?.close()
         }
+    }
 
-        // write the final batch
-        if (!batch.isEmpty()) {
-            writer = new File("${outputPrefix}.${fileIndex}.fasta").newWriter()
-            batch.each { record ->
-                writer.writeLine(">${record.md5}")
-                def seq = record.sequence
-                for (int i = 0; i < seq.length(); i += 60) {
-                    writer.writeLine(seq.substring(i, Math.min(i + 60, seq.length())))
-                }
+    private void withQueryMd5s(Collection<String> md5s, Closure body) {
+        /* Stage the MD5s of a chunk in a temporary table (private to this connection),
+        so that the accessors fetch all their rows with one indexed join. The accessors use
+        CROSS JOIN, which SQLite never reorders: without table statistics, the planner could
+        otherwise scan a whole table rather than start from the staged MD5s. */
+        this.sql.execute("CREATE TEMP TABLE IF NOT EXISTS QUERY_MD5 (md5 VARCHAR NOT NULL PRIMARY KEY) WITHOUT ROWID")
+        this.sql.withTransaction {
+            this.sql.execute("DELETE FROM QUERY_MD5")
+            this.sql.withBatch(BULK_BATCH_SIZE, "INSERT OR IGNORE INTO QUERY_MD5 (md5) VALUES (?)") { ps ->
+                md5s.each { String md5 -> ps.addBatch([md5]) }
             }
-            writer.close()
         }
+        body()
     }
 
-    def groupProteins(Map proteinMatches) {
+    Map<String, Set<String>> groupProteins(Map proteinMatches) {
         /* Gather nucleotide Seq IDs and child protein MD5s so we can gather all ORFs from the same
         parent NT seq together in the final output. */
-        def nucleicRelationships = [:]  // [ntSeqId: [proteinMd5]]
-        proteinMatches.each { proteinMD5, matchesNode ->
-            // get all parent NT seq Ids
-            def query = """SELECT DISTINCT nt_md5
-                FROM PROTEIN_TO_NUCLEOTIDE
-                WHERE protein_md5 = ?
-                """
-            this.sql.eachRow(query, [proteinMD5]) { row ->
-                nucleicRelationships.computeIfAbsent(row.nt_md5, { [] as Set })
-                nucleicRelationships[row.nt_md5].add(proteinMD5)
+        Map<String, List<String>> proteinToNucleic = [:]
+        withQueryMd5s(proteinMatches.keySet()) {
+            String query = """SELECT P2N.protein_md5, P2N.nt_md5
+                FROM QUERY_MD5 AS Q
+                CROSS JOIN PROTEIN_TO_NUCLEOTIDE AS P2N ON Q.md5 = P2N.protein_md5"""
+            this.sql.eachRow(query) { row ->
+                proteinToNucleic.computeIfAbsent(row.protein_md5, { [] }) << row.nt_md5
+            }
+        }
+
+        Map<String, Set<String>> nucleicRelationships = [:]  // [ntMd5: [proteinMd5]], in the order of the matches
+        proteinMatches.keySet().each { String proteinMD5 ->
+            proteinToNucleic[proteinMD5]?.each { String ntMD5 ->
+                nucleicRelationships.computeIfAbsent(ntMD5, { [] as Set }) << proteinMD5
             }
         }
         return nucleicRelationships
     }
 
-    List<String> proteinMd5ToNucleicSeq(String proteinMD5) {
-        def query = """SELECT N.id AS nid, N.description, S.sequence, P.id AS pid
-            FROM NUCLEOTIDE AS N
-            INNER JOIN NUCLEOTIDE_SEQUENCE AS S ON N.md5 = S.md5
-            INNER JOIN PROTEIN_TO_NUCLEOTIDE AS N2P ON N.md5 = N2P.nt_md5
-            INNER JOIN PROTEIN AS P ON N2P.protein_md5 = P.md5
-            WHERE P.md5 = ?;
-            """
-        return this.sql.rows(query, [proteinMD5])
+    Map<String, List<Map>> proteinMd5sToNucleicSeqs(Collection<String> proteinMD5s) {
+        // [protein md5: [[nid, description, sequence, pid]]]
+        def query = """SELECT P.md5, N.id AS nid, N.description, S.sequence, P.id AS pid
+            FROM QUERY_MD5 AS Q
+            CROSS JOIN PROTEIN AS P ON Q.md5 = P.md5
+            CROSS JOIN PROTEIN_TO_NUCLEOTIDE AS N2P ON Q.md5 = N2P.protein_md5
+            CROSS JOIN NUCLEOTIDE AS N ON N2P.nt_md5 = N.md5
+            CROSS JOIN NUCLEOTIDE_SEQUENCE AS S ON N.md5 = S.md5"""
+        return this.rowsByMd5(proteinMD5s, query) { row ->
+            [nid: row.nid, description: row.description, sequence: row.sequence, pid: row.pid]
+        }
     }
 
-    List<String> proteinMd5ToProteinSeq(String proteinMD5) {
-        def query = """SELECT P.id, P.description, S.sequence
-            FROM PROTEIN AS P
-            INNER JOIN PROTEIN_SEQUENCE AS S ON P.md5 = S.md5
-            WHERE P.md5 = ?;
-            """
-        return this.sql.rows(query, [proteinMD5])
+    Map<String, List<Map>> proteinMd5sToProteinSeqs(Collection<String> proteinMD5s) {
+        // [protein md5: [[id, description, sequence]]]
+        def query = """SELECT P.md5, P.id, P.description, S.sequence
+            FROM QUERY_MD5 AS Q
+            CROSS JOIN PROTEIN AS P ON Q.md5 = P.md5
+            CROSS JOIN PROTEIN_SEQUENCE AS S ON Q.md5 = S.md5"""
+        return this.rowsByMd5(proteinMD5s, query) { row ->
+            [id: row.id, description: row.description, sequence: row.sequence]
+        }
     }
 
-    List<String> nucleicMd5ToNucleicSeq(String nucleicMD5) {
-        def query = """SELECT N.id, N.description, S.sequence
-            FROM NUCLEOTIDE AS N
-            INNER JOIN NUCLEOTIDE_SEQUENCE AS S ON N.md5 = S.md5
-            WHERE N.md5 = ?;
-            """
-        return this.sql.rows(query, [nucleicMD5])
+    Map<String, List<Map>> nucleicMd5sToNucleicSeqs(Collection<String> nucleicMD5s) {
+        // [nucleic md5: [[id, description, sequence]]]
+        def query = """SELECT N.md5, N.id, N.description, S.sequence
+            FROM QUERY_MD5 AS Q
+            CROSS JOIN NUCLEOTIDE AS N ON Q.md5 = N.md5
+            CROSS JOIN NUCLEOTIDE_SEQUENCE AS S ON Q.md5 = S.md5"""
+        return this.rowsByMd5(nucleicMD5s, query) { row ->
+            [id: row.id, description: row.description, sequence: row.sequence]
+        }
     }
 
-    List<String> getOrfSeq(String proteinMD5, String nucleicMD5) {
-        /* A protein seq may be associated with multiple nucleotide seqs.
+    Map<String, Map<String, List<Map>>> getOrfSeqs(Collection<String> nucleicMD5s) {
+        /* [nucleic md5: [protein md5: [[id, description, nt_id]]]]
+        A protein seq may be associated with multiple nucleotide seqs.
         This could because of duplication or multiple nucleotide seqs encoding the same protein.
         To ensure we return the data for the protein associated for ONLY the current working nucleotide
-        seq we need to check the nucleotide seq ID against the description generated by ESL_translate.
+        seq we need to check the nucleotide seq ID against the source id of the ORF, from the
+        description generated by ESL_translate.
          */
-        def query = """SELECT P.id, P.description, S.sequence, N.id AS nt_id
-            FROM PROTEIN AS P
-            INNER JOIN PROTEIN_SEQUENCE AS S ON P.md5 = S.md5
-            INNER JOIN PROTEIN_TO_NUCLEOTIDE AS N2P ON P.md5 = N2P.protein_md5
-            INNER JOIN NUCLEOTIDE AS N ON N2P.nt_md5 = N.md5
-            WHERE P.md5 = ? AND N.md5 = ? AND P.description LIKE 'source=' || N.id || '%';
-            """
-        return this.sql.rows(query, [proteinMD5, nucleicMD5])
+        Map<String, Map<String, List<Map>>> orfs = [:]
+        withQueryMd5s(nucleicMD5s) {
+            def query = """SELECT N.md5 AS nt_md5, P.md5 AS protein_md5, P.id, P.description, N.id AS nt_id
+                FROM QUERY_MD5 AS Q
+                CROSS JOIN NUCLEOTIDE AS N ON Q.md5 = N.md5
+                CROSS JOIN PROTEIN_TO_NUCLEOTIDE AS N2P ON Q.md5 = N2P.nt_md5
+                CROSS JOIN PROTEIN AS P ON N2P.protein_md5 = P.md5 AND P.source_id = N.id"""
+            this.sql.eachRow(query) { row ->
+                orfs.computeIfAbsent(row.nt_md5, { [:] })
+                    .computeIfAbsent(row.protein_md5, { [] }) << [id: row.id, description: row.description, nt_id: row.nt_id]
+            }
+        }
+        return orfs
+    }
+
+    private Map<String, List<Map>> rowsByMd5(Collection<String> md5s, String query, Closure<Map> toRecord) {
+        /* Run a query joined on the staged MD5s, and group its records by the md5 column.
+        Copy each row: the GroovyResultSet is only valid within eachRow */
+        Map<String, List<Map>> records = [:]
+        withQueryMd5s(md5s) {
+            this.sql.eachRow(query) { row ->
+                records.computeIfAbsent(row.md5, { [] }) << toRecord(row)
+            }
+        }
+        return records
     }
-}
\ No newline at end of file
+}
@@ -0,0 +1,150 @@
+import groovy.sql.Sql
+
+class XRefsDB {
+    /* This class contains the methods for querying the InterPro xrefs store (xrefs.db),
+    built at data release time by utilities/xrefs/build_xrefs_db.py. The results have the
+    same structure as the entries.json, databases.json, goterms and pathways files, but
+    only for the requested accessions. */
+    private String path
+    private Sql sql
+    private static final int QUERY_BATCH_SIZE = 500
+    static final String SCHEMA_VERSION = "1"  // SCHEMA_VERSION of build_xrefs_db.py
+
+    XRefsDB(String path) {
+        this.path = path
+        this.connect()
+    }
+
+    private void connect() {
+        String url = "jdbc:sqlite:${this.path}"
+        String driver = "org.sqlite.JDBC"
+        Properties properties = new Properties()
+        properties.setProperty("open_mode", "1")  // SQLITE_OPEN_READONLY: the store is shared by all tasks
+        try {
+            this.sql = Sql.newInstance(url, properties, driver)
+            // Map the store in memory rather than reading it page by page
+            this.sql.execute("PRAGMA mmap_size = 268435456")
+        } catch (Exception e) {
+            e.printStackTrace()
+            throw e
+        }
+    }
+
+    void close() {
+        try {
+            if (this.sql != null) {
+                this.sql.close()
+            }
+        } catch (Exception e) {
+            e.printStackTrace()
+            throw e
+        }
+    }
+
+    private void eachRowIn(Collection<String> keys, Closure<String> query, Closure rowClosure) {
+        // Query the keys by batches, within the maximum number of parameters of a statement
+        keys.findAll().toList().unique().collate(QUERY_BATCH_SIZE).each { List<String> chunk ->
+            String placeholders = chunk.collect { '?' }.join(',')
+            String statement = query(placeholders)
+            this.sql.eachRow(statement, chunk, rowClosure)
+        }
+    }
+
+    String staleReason(String interproVersion) {
+        /* Why the store cannot be used for this InterPro release (e.g. it was left over from an
+        earlier build, or by another version of build_xrefs_db.py), or null if it can */
+        Map<String, String> metadata = [:]
+        this.sql.eachRow("SELECT key, value FROM METADATA") { row ->
+            metadata[row.key] = row.value
+        }
+        if (metadata.schema_version != SCHEMA_VERSION) {
+            return "schema version ${metadata.schema_version}, expected ${SCHEMA_VERSION}"
+        }
+        if (interproVersion != null && metadata.interpro_version != interproVersion) {
+            return "built for InterPro ${metadata.interpro_version}, expected ${interproVersion}"
+        }
+        return null
+    }
+
+    Map<String, String> databases() {
+        // [member db name: version]
+        Map<String, String> versions = [:]
+        this.sql.eachRow("SELECT name, version FROM DATABASE_VERSION") { row ->
+            versions[row.name] = row.version
+        }
+        return versions
+    }
+
+    Map<String, Map> entries(Collection<String> accessions) {
+        // [accession: signature or entry info] of the signatures, and of the InterPro entries they are integrated in
+        Map<String, Map> entries = [:]
+        Closure<String> query = { String placeholders ->
+            """SELECT accession, name, description, type, integrated, representative_type, representative_index, database
+            FROM ENTRY
+            WHERE accession IN (${placeholders})"""
+        }
+        Closure addEntry = { row ->
+            entries[row.accession] = [
+                name          : row.name,
+                description   : row.description,
+                type          : row.type,
+                integrated    : row.integrated,
+                representative: row.representative_index == null ? null : [
+                    type : row.representative_type,
+                    index: row.representative_index
+                ],
+                database      : row.database
+            ]
+        }
+        eachRowIn(accessions, query, addEntry)
+        Set<String> interproAccessions = entries.values().collect { it.integrated }.findAll { it && !entries.containsKey(it) } as Set
+        eachRowIn(interproAccessions, query, addEntry)
+        return entries
+    }
+
+    List goTerms(Collection<String> interproAccessions) {
+        /* [ipr2go, goInfo]: [interpro acc: [GO ids]] and [terms: [GO id: [name, category]]]
+        GO terms that are not associated with these entries (e.g. from PAINT annotations)
+        are looked up when first accessed. */
+        Map<String, List<String>> ipr2go = [:]
+        Closure<String> query = { String placeholders ->
+            """SELECT accession, go_id FROM ENTRY_GO_TERM
+            WHERE accession IN (${placeholders})
+            ORDER BY accession, position"""
+        }
+        eachRowIn(interproAccessions, query) { row ->
+            ipr2go.computeIfAbsent(row.accession, { [] }) << row.go_id
+        }
+
+        Map<String, List<String>> terms = [:].withDefault { String goId -> this.goTermInfo([goId])[goId] }
+        terms.putAll(goTermInfo(ipr2go.values().flatten() as Set))
+        return [ipr2go, [terms: terms]]
+    }
+
+    Map<String, List<String>> goTermInfo(Collection<String> goIds) {
+        Map<String, List<String>> terms = [:]
+        eachRowIn(goIds, { String placeholders -> "SELECT id, name, category FROM GO_TERM WHERE id IN (${placeholders})" }) { row ->
+            terms[row.id] = [row.name, row.category]
+        }
+        return terms
+    }
+
+    List pathways(Collection<String> interproAccessions) {
+        // [ipr2pa, paInfo]: [interpro acc: [pathway ids]] and [pathway id: [database, name]]
+        Map<String, List<String>> ipr2pa = [:]
+        Closure<String> query = { String placeholders ->
+            """SELECT accession, pathway_id FROM ENTRY_PATHWAY
+            WHERE accession IN (${placeholders})
+            ORDER BY accession, position"""
+        }
+        eachRowIn(interproAccessions, query) { row ->
+            ipr2pa.computeIfAbsent(row.accession, { [] }) << row.pathway_id
+        }
+
+        Map<String, List<String>> paInfo = [:]
+        eachRowIn(ipr2pa.values().flatten() as Set, { String placeholders -> "SELECT id, database, name FROM PATHWAY WHERE id IN (${placeholders})" }) { row ->
+            paInfo[row.id] = [row.database, row.name]
+        }
+        return [ipr2pa, paInfo]
+    }
+}
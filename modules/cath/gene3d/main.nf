@@ -58,7 +58,8 @@ process ASSIGN_CATH {
         ${dirpath}/${dom2fam} \
         ${dirpath}/${disc_pickle} \
         ${cath_resolve_out} \
-        cath.tsv
+        cath.tsv \
+        --workers ${task.cpus}
     """
 }
 
@@ -80,4 +81,29 @@ process PARSE_CATHGENE3D {
     def outputFilePath = task.workDir.resolve("cathgene3d.json")
     def json = JsonOutput.toJson(matches)
     new File(outputFilePath.toString()).write(json)
-}
\ No newline at end of file
+}
+
+process ASSIGN_CATHGENE3D {
+    // ASSIGN_CATH and PARSE_CATHGENE3D in one step, enabled with --cath-json
+    label 'tiny', 'ips6_container'
+
+    input:
+    tuple val(meta), val(meta2), path(hmmseach_out), path(cath_resolve_out)
+    path dirpath
+    val dom2fam
+    val disc_pickle
+
+    output:
+    tuple val(meta), val(meta2), path("cathgene3d.json")
+
+    script:
+    """
+    python ${projectDir}/bin/cath/assign_cath_superfamilies.py \
+        ${dirpath}/${dom2fam} \
+        ${dirpath}/${disc_pickle} \
+        ${cath_resolve_out} \
+        cathgene3d.json \
+        --workers ${task.cpus} \
+        --hmmsearch ${hmmseach_out}
+    """
+}
@@ -28,16 +28,19 @@ process WRITE_JSON {
         jsonWriter.writeFieldName("results")
         jsonWriter.writeStartArray()  // start of results [...
         matches_files.each { matchFile ->
+            Map proteins = new ObjectMapper().readValue(new File(matchFile.toString()), Map)
+            // Fetch the sequences of the whole file at once, rather than one query per sequence
+            Map seqData = [proteins: db.proteinMd5sToProteinSeqs(proteins.keySet())]
             if (nucleic) {  // input was nucleic acid sequence
-                Map proteins = new ObjectMapper().readValue(new File(matchFile.toString()), Map)
                 nucleicToProteinMd5 = db.groupProteins(proteins)
+                seqData.nucleotides = db.nucleicMd5sToNucleicSeqs(nucleicToProteinMd5.keySet())
+                seqData.orfs = db.getOrfSeqs(nucleicToProteinMd5.keySet())
                 nucleicToProteinMd5.each { String nucleicMd5, Set<String> proteinMd5s ->
-                    writeNucleic(nucleicMd5, proteinMd5s, proteins, jsonWriter, db)
+                    writeNucleic(nucleicMd5, proteinMd5s, proteins, jsonWriter, seqData)
                 }
             } else {  // input was protein sequences
-                Map proteins = new ObjectMapper().readValue(new File(matchFile.toString()), Map)
                 proteins.each { String proteinMd5, Map proteinMatches ->
-                    writeProtein(proteinMd5, proteinMatches, jsonWriter, db)
+                    writeProtein(proteinMd5, proteinMatches, jsonWriter, seqData)
                 }
             }
         }
@@ -45,7 +48,7 @@ process WRITE_JSON {
     }
 }
 
-def writeNucleic(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches, JsonGenerator jsonWriter, SeqDB db) {
+def writeNucleic(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches, JsonGenerator jsonWriter, Map seqData) {
     /* Write data for an input nucleic acid sequence, and then the matches for its associated ORFs
     {"sequence: nt seq, "md5": nt md5,
     "crossReferences": [{ntSeqData}, {ntSeqData}],
@@ -54,7 +57,7 @@ def writeNucleic(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches,
     jsonWriter.writeStartObject()
 
     // 1. {"sequence": seq, "md5": ntMd5}
-    ntSeqData = db.nucleicMd5ToNucleicSeq(nucleicMd5)
+    ntSeqData = seqData.nucleotides[nucleicMd5]
     String sequence = ntSeqData[0].sequence
     jsonWriter.writeStringField("sequence", sequence)
     jsonWriter.writeStringField("md5", nucleicMd5)
@@ -65,18 +68,18 @@ def writeNucleic(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches,
 
     // 3. {..., "openReadingFrames": [{protein}, {protein}]}
     jsonWriter.writeFieldName("openReadingFrames")
-    writeOpenReadingFrames(nucleicMd5, proteinMd5s, proteinMatches, jsonWriter, db)
+    writeOpenReadingFrames(nucleicMd5, proteinMd5s, proteinMatches, jsonWriter, seqData)
 
     jsonWriter.writeEndObject()
 }
 
-def writeOpenReadingFrames(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches, JsonGenerator jsonWriter, SeqDB db){
+def writeOpenReadingFrames(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches, JsonGenerator jsonWriter, Map seqData){
     def SOURCE_NT_PATTERN = Pattern.compile(/^source=[^"]+\s+coords=(\d+)\.\.(\d+)\s+length=\d+\s+frame=(\d+)\s+desc=.*$/)
 
     jsonWriter.writeStartArray()
     proteinMd5s.each { String proteinMd5 ->
         // a proteinSeq/Md5 may be associated with multiple nt md5s/seq, only pull the data where the nt md5/seq is relevant
-        proteinSeqData = db.getOrfSeq(proteinMd5, nucleicMd5)
+        proteinSeqData = seqData.orfs[nucleicMd5]?.get(proteinMd5) ?: []
         proteinSeqData.each { row ->
             def proteinSource = SOURCE_NT_PATTERN.matcher(row.description)
             assert proteinSource.matches()
@@ -85,21 +88,21 @@ def writeOpenReadingFrames(String nucleicMd5, Set<String> proteinMd5s, Map prote
             jsonWriter.writeNumberField("end", proteinSource.group(2) as int)
             jsonWriter.writeStringField("strand", (proteinSource.group(3) as int) < 4 ? "SENSE" : "ANTISENSE")
             jsonWriter.writeFieldName("protein")
-            writeProtein(proteinMd5, proteinMatches[proteinMd5], jsonWriter, db)
+            writeProtein(proteinMd5, proteinMatches[proteinMd5], jsonWriter, seqData)
             jsonWriter.writeEndObject()
         }
     }
     jsonWriter.writeEndArray()
 }
 
-def writeProtein(String proteinMd5, Map proteinMatches, JsonGenerator jsonWriter, SeqDB db) {
+def writeProtein(String proteinMd5, Map proteinMatches, JsonGenerator jsonWriter, Map seqData) {
     /* Write data for a query protein sequence and its matches:
     { "sequence": sequence, "md5": proteinMd5, "matches": [], "xrefs": []}
     There may be multiple seqIds and desc for the same sequence/md5, use the first entry to get the seq. */
     jsonWriter.writeStartObject()
 
     // 1. {"sequence": seq, "md5": proteinMd5}
-    proteinSeqData = db.proteinMd5ToProteinSeq(proteinMd5)
+    proteinSeqData = seqData.proteins[proteinMd5]
     String sequence = proteinSeqData[0].sequence
     jsonWriter.writeStringField("sequence", sequence)
     jsonWriter.writeStringField("md5", proteinMd5)
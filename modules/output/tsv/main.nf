@@ -23,6 +23,8 @@ process WRITE_TSV {
     matchesFiles.each { matchFile ->
         matchFile = new File(matchFile.toString())
         Map proteins = new ObjectMapper().readValue(matchFile, Map)
+        // Fetch the sequences of the whole file at once, rather than one query per match
+        Map<String, List<Map>> seqs = nucleic ? db.proteinMd5sToNucleicSeqs(proteins.keySet()) : db.proteinMd5sToProteinSeqs(proteins.keySet())
         proteins.each { String proteinMd5, Map matchesMap ->
             matchesMap.each { modelAcc, match ->
                 match = Match.fromMap(match)
@@ -32,7 +34,7 @@ process WRITE_TSV {
                 def pathways = match.signature.entry?.pathwayXRefs
                 String entryAcc = match.signature.entry?.accession ?: '-'
                 String entryDesc = match.signature.entry?.description ?: '-'
-                seqData = nucleic ? db.proteinMd5ToNucleicSeq(proteinMd5) : db.proteinMd5ToProteinSeq(proteinMd5)
+                seqData = seqs[proteinMd5] ?: []
                 seqData.each { row ->  // Protein or Nucleic: [id, desc, sequence]
                     String seqId = nucleic ? "${row.nid}_${row.pid}" : row.id
                     int seqLength = row.sequence.trim().length()
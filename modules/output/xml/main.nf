@@ -24,16 +24,19 @@ process WRITE_XML {
 
     xml."results"("interproscan-version": interproscan_version, "interpro-version": db_releases?.interpro?.version) {
         matches_files.each { matchFile ->
+            Map proteins = new ObjectMapper().readValue(new File(matchFile.toString()), Map)
+            // Fetch the sequences of the whole file at once, rather than one query per sequence
+            Map seqData = [proteins: db.proteinMd5sToProteinSeqs(proteins.keySet())]
             if (nucleic) {
-                Map proteins = new ObjectMapper().readValue(new File(matchFile.toString()), Map)
                 nucleicToProteinMd5 = db.groupProteins(proteins)
+                seqData.nucleotides = db.nucleicMd5sToNucleicSeqs(nucleicToProteinMd5.keySet())
+                seqData.orfs = db.getOrfSeqs(nucleicToProteinMd5.keySet())
                 nucleicToProteinMd5.each { String nucleicMd5, Set<String> proteinMd5s ->
-                    addNucleotideNode(nucleicMd5, proteinMd5s, proteins, xml, db)
+                    addNucleotideNode(nucleicMd5, proteinMd5s, proteins, xml, seqData)
                 }
             } else {
-                Map proteins = new ObjectMapper().readValue(new File(matchFile.toString()), Map)
                 proteins.each { String proteinMd5, Map proteinMatches ->
-                    addProteinNodes(proteinMd5, proteinMatches, xml, db)
+                    addProteinNodes(proteinMd5, proteinMatches, xml, seqData)
                 }
             }
         }
@@ -42,7 +45,7 @@ process WRITE_XML {
     new File(output_file).text = writer.toString()
 }
 
-def addNucleotideNode(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches, def xml, SeqDB db) {
+def addNucleotideNode(String nucleicMd5, Set<String> proteinMd5s, Map proteinMatches, def xml, Map seqData) {
     /* Write data for an input nucleic acid seq, and then the matches for its associated ORFs.
     <nucleotide-sequence>
         <sequence md5="" sequence </sequence>
@@ -58,7 +61,7 @@ def addNucleotideNode(String nucleicMd5, Set<String> proteinMd5s, Map proteinMat
     def SOURCE_NT_PATTERN = Pattern.compile(/^source=[^"]+\s+coords=(\d+)\.\.(\d+)\s+length=\d+\s+frame=(\d+)\s+desc=.*$/)
 
     // 1. <nt-seq> <sequence md5="" "<seq>" </sequence>
-    ntSeqData = db.nucleicMd5ToNucleicSeq(nucleicMd5)
+    ntSeqData = seqData.nucleotides[nucleicMd5]
     String sequence = ntSeqData[0].sequence
     xml."nucleotideNode" {
         xml.sequence(md5: nucleicMd5, sequence)
@@ -69,7 +72,7 @@ def addNucleotideNode(String nucleicMd5, Set<String> proteinMd5s, Map proteinMat
         // 3. <orf end="", start="", strand="">
         proteinMd5s.each { proteinMd5 ->
             // a proteinSeq MD5 may be associated with multiple nt seqs, only pull the data where the nt md5/seq is relevant
-            proteinSeqData = db.getOrfSeq(proteinMd5, nucleicMd5)
+            proteinSeqData = seqData.orfs[nucleicMd5]?.get(proteinMd5) ?: []
             proteinSeqData.each { row ->
                 def proteinSource = SOURCE_NT_PATTERN.matcher(row.description)
                 assert proteinSource.matches()
@@ -79,14 +82,14 @@ def addNucleotideNode(String nucleicMd5, Set<String> proteinMd5s, Map proteinMat
                     strand : proteinSource.group(3) as int < 4 ? "SENSE" : "ANTISENSE"
                 ]) {
                     // 4. <protein> ... <\protein>
-                    addProteinNodes(proteinMd5, proteinMatches[proteinMd5], xml, db)
+                    addProteinNodes(proteinMd5, proteinMatches[proteinMd5], xml, seqData)
                 }
             }
         }
     }
 }
 
-def addProteinNodes (String proteinMd5, Map proteinMatches, def xml, SeqDB db) {
+def addProteinNodes (String proteinMd5, Map proteinMatches, def xml, Map seqData) {
     /* Write data for a query protein sequence and its matches:
     <protein>
         <sequence md5="" sequence </sequence>
@@ -96,7 +99,7 @@ def addProteinNodes (String proteinMd5, Map proteinMatches, def xml, SeqDB db) {
     There may be multiple seqIds and desc for the same sequence/md5, use the first entry to get the seq. */
     xml.protein {
         // 1. <sequence md5="" sequence </sequence>
-        proteinSeqData = db.proteinMd5ToProteinSeq(proteinMd5)
+        proteinSeqData = seqData.proteins[proteinMd5]
         String sequence = proteinSeqData[0].sequence
         xml.sequence(md5: proteinMd5, sequence)
 
@@ -12,7 +12,7 @@ process PREPARE_TREEGRAFTER {
 
     output:
     tuple val(meta), path("panther.json"),                             emit: json
-    tuple val(meta), val(sequenceIds), val(familyIds), val(fastas),    emit: fasta
+    tuple val(meta), val(familyIds), val(fastas),                      emit: fasta
     
     exec:
     def hmmerMatches = HMMER3.parseOutput(hmmseach_out.toString(), "PANTHER")
@@ -52,9 +52,8 @@ process PREPARE_TREEGRAFTER {
     def json = JsonOutput.toJson(hmmerMatches)
     new File(outputFilePath.toString()).write(json)
 
-    familyIds = []
-    fastas = []
-    sequenceIds = []
+    // Query sequences to graft, grouped by family: [familyId: [seqId: sequence]]
+    Map<String, Map<String, String>> queries = [:]
     String dirPath = dir.toString()
     hmmerMatches.each { seqId, matches ->
         // Ensure we only have one family
@@ -100,20 +99,28 @@ process PREPARE_TREEGRAFTER {
         String sequence = sb.toString()
         assert sequence.length() == length
 
-        File fastaFile = File.createTempFile("tmp", ".fa", task.workDir.toFile())
+        queries.computeIfAbsent(familyId, { [:] })[seqId] = sequence
+    }
+
+    // One multi-query FASTA file per family, so EPA-ng runs once per family
+    familyIds = []
+    fastas = []
+    queries.each { familyId, sequences ->
+        File fastaFile = task.workDir.resolve("${familyId}.query.fasta").toFile()
         fastaFile.withWriter { writer ->
-            writer.writeLine(">${familyId}")
-            for (int i = 0; i < sequence.length(); i += 80) {
-                int j = Math.min(i + 80, length) - 1
-                String line = sequence[i..j]
-                writer.writeLine(line)                
+            sequences.each { seqId, sequence ->
+                writer.writeLine(">${seqId}")
+                for (int i = 0; i < sequence.length(); i += 80) {
+                    int j = Math.min(i + 80, sequence.length()) - 1
+                    String line = sequence[i..j]
+                    writer.writeLine(line)
+                }
             }
         }
 
         familyIds.add( familyId )
         fastas.add( fastaFile.toString() )
-        sequenceIds.add( seqId )
-    } 
+    }
 }
 
 
@@ -121,7 +128,7 @@ process RUN_TREEGRAFTER {
     label 'small', 'ips6_container'
     
     input:
-    tuple val(meta), val(sequenceIds), val(familyIds), val(fastas)
+    tuple val(meta), val(familyIds), val(fastas)
     path dir
     val msf
 
@@ -131,14 +138,13 @@ process RUN_TREEGRAFTER {
     script:
     def commands = ""
 
-    [sequenceIds, familyIds, fastas]
+    [familyIds, fastas]
         .transpose()
         .each { entry -> 
-            String seqID  = entry[0]
-            String family = entry[1]
-            def fastaPath = entry[2]
+            String family = entry[0]
+            def fastaPath = entry[1]
            
-           // Run EPA-ng
+           // Run EPA-ng on all the sequences of the family at once
             def epang_command = "/opt/epa-ng/bin/epa-ng"
             epang_command += " -G 0.05"
             epang_command += " -m WAG"
@@ -146,23 +152,21 @@ process RUN_TREEGRAFTER {
             epang_command += " -t ${dir.toString()}/${msf}/${family}.bifurcate.newick"
             epang_command += " -s ${dir.toString()}/${msf}/${family}.AN.fasta"
             epang_command += " -q ${fastaPath}"
+            epang_command += " -w ${family}"
             epang_command += " --redo"
 
-            // Parse results
-            def py_command = "python ${projectDir}/bin/panther/parse_epang.py"
-            py_command += " epa_result.jplace"
-            py_command += " ${dir.toString()}/${msf}/${family}.newick"
-
-            // Add sequence ID
-            def awk_command = "awk '{print \"${seqID}\",\$0}'"
-
-            // Only run Python + Awk if EPA-ng doesn't fail
-            commands += "{ ${epang_command} && ${py_command} | ${awk_command} >> epang.tsv; } || :\n"
+            // Only parse the results of the families for which EPA-ng doesn't fail
+            def manifest_command = "printf '%s\\t%s\\n' ${family} ${family}/epa_result.jplace >> jplaces.tsv"
+            commands += "{ mkdir -p ${family} && ${epang_command} && ${manifest_command}; } || :\n"
         }
 
+    // Parse the results of all families at once
     """
-    touch epang.tsv
+    touch jplaces.tsv
     ${commands}
+    python ${projectDir}/bin/panther/parse_epang.py \\
+        --msf ${dir.toString()}/${msf} \\
+        --manifest jplaces.tsv > epang.tsv
     """
 }
 
@@ -25,6 +25,7 @@ process LOAD_SEQUENCES {
     input:
     val fasta
     val nucleic
+    val bulkLoad
 
     output:
     path "sequences.db"
@@ -32,8 +33,10 @@ process LOAD_SEQUENCES {
     exec:
     def outputFilePath = task.workDir.resolve("sequences.db")
     SeqDB db = new SeqDB(outputFilePath.toString())
-    db.loadFastaFile(fasta.toString(), nucleic, false)
+    long start = System.nanoTime()
+    int count = bulkLoad ? db.bulkLoadFastaFile(fasta.toString(), nucleic, false, task.cpus) : db.loadFastaFile(fasta.toString(), nucleic, false)
     db.close()
+    logLoadRate("LOAD_SEQUENCES", count, start)
 }
 
 process LOAD_ORFS {
@@ -45,16 +48,25 @@ process LOAD_ORFS {
     input:
     val translatedFastas  // could be one or multiple paths
     val dbPath
+    val bulkLoad
 
     output:
     val dbPath // ensure BUILD_BATCHES runs after LOAD_ORFS
 
     exec:
     SeqDB db = new SeqDB(dbPath.toString())
-    translatedFastas.each {
-        db.loadFastaFile(it.toString(), false, true)
+    long start = System.nanoTime()
+    int count = 0
+    if (bulkLoad) {
+        // Load all files before building the indexes and mapping the ORFs to their source sequences
+        count = db.bulkLoadFastaFiles(translatedFastas.collect { it.toString() }, false, true, task.cpus)
+    } else {
+        translatedFastas.each {
+            count += db.loadFastaFile(it.toString(), false, true)
+        }
     }
     db.close()
+    logLoadRate("LOAD_ORFS", count, start)
 }
 
 process SPLIT_FASTA {
@@ -65,7 +77,8 @@ process SPLIT_FASTA {
 
     input:
     val dbPath
-    val batchSize
+    val batchSize      // max sequences per batch (<= 0: no limit)
+    val batchResidues  // max residues per batch (<= 0: batches are only limited by batchSize)
     val nucleic
 
     output:
@@ -74,6 +87,12 @@ process SPLIT_FASTA {
     exec:
     String prefix = task.workDir.resolve("input").toString()
     SeqDB db = new SeqDB(dbPath.toString())
-    db.splitFasta(prefix, batchSize, nucleic)
+    db.splitFasta(prefix, batchSize as int, nucleic, batchResidues as long)
     db.close()
-}
\ No newline at end of file
+}
+
+def logLoadRate(String processName, int count, long start) {
+    double seconds = (System.nanoTime() - start) / 1e9
+    log.info "${processName}: loaded ${count} sequences in ${String.format('%.1f', seconds)} s " +
+        "(${String.format('%.0f', seconds > 0 ? count / seconds : 0)} sequences/s)"
+}
@@ -18,21 +18,52 @@ process XREFS {
 
     exec:
     def (databaseInfo, entries, ipr2go, goInfo, ipr2pa, paInfo) = [null, null, null, null, null, null]
+    XRefsDB xrefsDb = null
+    def matchesFileMap = new ObjectMapper().readValue(new File(matches_path.toString()), Map.class)
     if (db_releases.interpro) {
         String interproDir = db_releases.interpro.dirpath.toString()
-        String databasesPath = "${interproDir}/databases.json"
-        File databasesJson = new File(databasesPath)
-        databaseInfo = new ObjectMapper().readValue(databasesJson, Map)
-        String entriesPath = "${interproDir}/entries.json"
-        File entriesJson = new File(entriesPath)
-        entries = new ObjectMapper().readValue(entriesJson, Map)
-        (ipr2go, goInfo) = loadXRefFiles("${interproDir}/goterms")
-        if (add_pathways) {
-            (ipr2pa, paInfo) = loadXRefFiles("${interproDir}/pathways")
+        File xrefsDbFile = new File("${interproDir}/xrefs.db")
+        if (xrefsDbFile.exists()) {
+            xrefsDb = new XRefsDB(xrefsDbFile.toString())
+            String staleReason = xrefsDb.staleReason(db_releases.interpro.version?.toString())
+            if (staleReason) {
+                log.warn "Ignoring ${xrefsDbFile} (${staleReason}): reading the InterPro JSON files instead"
+                xrefsDb.close()
+                xrefsDb = null
+            }
+        }
+        if (xrefsDb) {
+            // Indexed store built at release time: only look up the signatures matched in this chunk
+            Set<String> accessions = [] as Set
+            matchesFileMap.each { String seqMd5, Map matches ->
+                matches.each { modelAcc, matchMap ->
+                    accessions << modelAcc
+                    accessions << matchMap.signature?.accession
+                }
+            }
+            databaseInfo = xrefsDb.databases()
+            entries = xrefsDb.entries(accessions)
+            Set<String> interproAccs = entries.values().collect { it.integrated }.findAll() as Set
+            if (add_goterms) {
+                (ipr2go, goInfo) = xrefsDb.goTerms(interproAccs)
+            }
+            if (add_pathways) {
+                (ipr2pa, paInfo) = xrefsDb.pathways(interproAccs)
+            }
+        } else {
+            String databasesPath = "${interproDir}/databases.json"
+            File databasesJson = new File(databasesPath)
+            databaseInfo = new ObjectMapper().readValue(databasesJson, Map)
+            String entriesPath = "${interproDir}/entries.json"
+            File entriesJson = new File(entriesPath)
+            entries = new ObjectMapper().readValue(entriesJson, Map)
+            (ipr2go, goInfo) = loadXRefFiles("${interproDir}/goterms")
+            if (add_pathways) {
+                (ipr2pa, paInfo) = loadXRefFiles("${interproDir}/pathways")
+            }
         }
     }
 
-    def matchesFileMap = new ObjectMapper().readValue(new File(matches_path.toString()), Map.class)
     matchesFileMap.each { String seqMd5, Map matches ->
         matches.each { modelAcc, matchMap ->
             match = Match.fromMap(matchMap)  // convert Map to Match object
@@ -85,6 +116,7 @@ process XREFS {
             }  // end of if (entries)
         } // end of matches
     }  // end of Json reader / seq Id
+    xrefsDb?.close()
 
     String outputFilePath = task.workDir.resolve("matches2xrefs.json")
     def json = JsonOutput.toJson(matchesFileMap)
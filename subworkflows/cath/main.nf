@@ -1,4 +1,4 @@
-include { SEARCH_GENE3D; RESOLVE_GENE3D; ASSIGN_CATH; PARSE_CATHGENE3D } from  "../../modules/cath/gene3d"
+include { SEARCH_GENE3D; RESOLVE_GENE3D; ASSIGN_CATH; PARSE_CATHGENE3D; ASSIGN_CATHGENE3D } from  "../../modules/cath/gene3d"
 include { PREPARE_FUNFAM; SEARCH_FUNFAM; RESOLVE_FUNFAM; PARSE_FUNFAM  } from  "../../modules/cath/funfam"
 
 workflow CATH {
@@ -35,28 +35,37 @@ workflow CATH {
     // Select best domain matches
     RESOLVE_GENE3D(ch_gene3d)
 
-    // Assign CATH superfamily to matches
-    ASSIGN_CATH(
-        RESOLVE_GENE3D.out,
-        cathgene3d_dir,
-        cathgene3d_model2sfs,
-        cathgene3d_disc_regs
-    )
+    if (params.cathJson) {
+        // Assign CATH superfamily to matches and join them with the hmmsearch domains
+        ASSIGN_CATHGENE3D(
+            ch_gene3d.join(RESOLVE_GENE3D.out, by: [0, 1]),
+            cathgene3d_dir,
+            cathgene3d_model2sfs,
+            cathgene3d_disc_regs
+        )
+        ch_cathgene3d = ASSIGN_CATHGENE3D.out
+    } else {
+        // Assign CATH superfamily to matches
+        ASSIGN_CATH(
+            RESOLVE_GENE3D.out,
+            cathgene3d_dir,
+            cathgene3d_model2sfs,
+            cathgene3d_disc_regs
+        )
 
-    // Join results and parse them
-    ch_cathgene3d = ch_gene3d
-        .join(ASSIGN_CATH.out, by: [0, 1])
-   
-    PARSE_CATHGENE3D(ch_cathgene3d)
+        // Join results and parse them
+        PARSE_CATHGENE3D(ch_gene3d.join(ASSIGN_CATH.out, by: [0, 1]))
+        ch_cathgene3d = PARSE_CATHGENE3D.out
+    }
 
     if (report_cathgene3d) {
-        results = results.mix(PARSE_CATHGENE3D.out)
+        results = results.mix(ch_cathgene3d)
     }
 
     if (report_cathfunfam) {
         // Find unique CATH superfamilies with at least one hit
         PREPARE_FUNFAM(
-            PARSE_CATHGENE3D.out,
+            ch_cathgene3d,
             cathfunfam_dir
         )
 
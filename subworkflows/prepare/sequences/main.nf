@@ -21,7 +21,7 @@ workflow PREPARE_SEQUENCES {
 
     if (params.nucleic) {
         // Store the input seqs in the internal ips6 seq db
-        LOAD_SEQUENCES(fasta, params.nucleic)
+        LOAD_SEQUENCES(fasta, params.nucleic, params.bulkLoad)
 
         // Chunk input file in smaller files for translation
         Channel.fromPath(params.input)
@@ -33,13 +33,13 @@ workflow PREPARE_SEQUENCES {
         ch_translated = ESL_TRANSLATE(ch_fasta).collect()
 
         // Store sequences in the sequence database
-        seq_db_path = LOAD_ORFS(ch_translated, LOAD_SEQUENCES.out)
+        seq_db_path = LOAD_ORFS(ch_translated, LOAD_SEQUENCES.out, params.bulkLoad)
     } else {
         // Store the input seqs in the internal ips6 seq db
-        seq_db_path = LOAD_SEQUENCES(fasta, params.nucleic)
+        seq_db_path = LOAD_SEQUENCES(fasta, params.nucleic, params.bulkLoad)
     }
     // Build batches of unique protein seqs for the analysis
-    SPLIT_FASTA(seq_db_path, params.batchSize, params.nucleic)
+    SPLIT_FASTA(seq_db_path, params.batchSize, params.batchResidues, params.nucleic)
 
     fastaList = SPLIT_FASTA.out.collect()
     // Convert a list (or single file path) to a list of tuples containing indexed fasta file paths
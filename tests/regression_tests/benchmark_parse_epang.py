@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Compare the per-call latency and peak memory of bin/panther/parse_epang.py
+# with another version of the script (e.g. the Biopython-based one), and check
+# that both report the same node for every query.
+#
+#   git show <commit>:bin/panther/parse_epang.py > /tmp/parse_epang_baseline.py
+#   python benchmark_parse_epang.py --baseline /tmp/parse_epang_baseline.py \
+#       --msf /path/to/panther/Tree_MSF --manifest jplaces.tsv
+#
+# where each line of the manifest is "family<TAB>jplace file".
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def run(script, jplace_file, newick_file):
+    """Run the script on one family, return its exit code, output, wall time (s) and peak RSS (MiB)"""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, script, jplace_file, newick_file],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.abspath(script)),
+    )
+    stdout = proc.stdout.read()
+    _, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    proc.stdout.close()
+    return os.waitstatus_to_exitcode(status), stdout, elapsed, rusage.ru_maxrss / 1024
+
+
+def main():
+    default_script = os.path.join(os.path.dirname(__file__), "..", "..", "bin", "panther", "parse_epang.py")
+    parser = argparse.ArgumentParser(prog="IPS_parse_epang_benchmark", description="Benchmark parse_epang.py against a baseline", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--baseline", type=str, required=True, help="Baseline parse_epang.py")
+    parser.add_argument("--observed", type=str, default=os.path.normpath(default_script), help="parse_epang.py to benchmark")
+    parser.add_argument("--msf", type=str, required=True, help="Directory of family trees, e.g. panther/Tree_MSF")
+    parser.add_argument("--manifest", type=str, required=True, help="Tab-separated file of family and jplace file pairs")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of calls per family and script")
+    args = parser.parse_args()
+
+    families = []
+    with open(args.manifest, "r") as fh:
+        for line in fh:
+            if line.strip():
+                family, jplace_file = line.rstrip("\n").split("\t")
+                families.append((family, os.path.abspath(jplace_file), os.path.abspath(os.path.join(args.msf, f"{family}.newick"))))
+
+    scripts = {"baseline": os.path.abspath(args.baseline), "observed": os.path.abspath(args.observed)}
+    times = {name: [] for name in scripts}
+    memory = {name: [] for name in scripts}
+    different = failed = 0
+    for family, jplace_file, newick_file in families:
+        outputs = {}
+        for name, script in scripts.items():
+            for _ in range(args.repeats):
+                returncode, stdout, elapsed, maxrss = run(script, jplace_file, newick_file)
+                times[name].append(elapsed)
+                memory[name].append(maxrss)
+            outputs[name] = stdout if returncode == 0 else None
+
+        if outputs["baseline"] is None or outputs["observed"] is None:
+            print(f"! {family}\tbaseline exit OK: {outputs['baseline'] is not None}, observed exit OK: {outputs['observed'] is not None}")
+            failed += 1
+        elif outputs["baseline"] != outputs["observed"]:
+            print(f"! {family}\toutputs differ")
+            different += 1
+
+    print("============ Summary ============")
+    print(f"Families                 : {len(families)}")
+    for name in scripts:
+        print(
+            f"{name + ' latency (s)':<25}: median {statistics.median(times[name]):.3f}, "
+            f"mean {statistics.mean(times[name]):.3f}, max {max(times[name]):.3f}\n"
+            f"{name + ' peak RSS (MiB)':<25}: median {statistics.median(memory[name]):.1f}, "
+            f"max {max(memory[name]):.1f}"
+        )
+    print(f"Families that differ     : {different}")
+    print(f"Families that failed     : {failed}")
+    if different or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
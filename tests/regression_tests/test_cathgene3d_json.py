@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Test that the CATH-Gene3D matches written by assign_cath_superfamilies.py --hmmsearch
+# (ASSIGN_CATHGENE3D, --cath-json) are identical to the ones built by PARSE_CATHGENE3D
+# (HMMER3.parseOutput + CATH.mergeWithHmmerMatches) from the same hmmsearch output.
+# Run the same batch with and without --cath-json and compare the cathgene3d.json files
+import argparse
+import json
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="IPS_gene3d_json_regression_test", description="Compare two cathgene3d.json files", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--expected", type=str, required=True, help="cathgene3d.json written by PARSE_CATHGENE3D")
+    parser.add_argument("--observed", type=str, required=True, help="cathgene3d.json written by ASSIGN_CATHGENE3D")
+    args = parser.parse_args()
+
+    with open(args.expected, "r") as fh:
+        expected = json.load(fh)
+    with open(args.observed, "r") as fh:
+        observed = json.load(fh)
+
+    expected_only, observed_only, different, both = 0, 0, 0, 0
+    for seq_id in sorted(expected.keys() | observed.keys()):
+        expected_matches = expected.get(seq_id, {})
+        observed_matches = observed.get(seq_id, {})
+        for domain_id in sorted(expected_matches.keys() | observed_matches.keys()):
+            if domain_id not in observed_matches:
+                print(f"< {seq_id}\t{domain_id}")  # Only in expected
+                expected_only += 1
+            elif domain_id not in expected_matches:
+                print(f"> {seq_id}\t{domain_id}")  # Only in observed
+                observed_only += 1
+            elif expected_matches[domain_id] != observed_matches[domain_id]:
+                print(f"! {seq_id}\t{domain_id}\n  expected: {expected_matches[domain_id]}\n  observed: {observed_matches[domain_id]}")
+                different += 1
+            else:
+                both += 1
+
+    print(
+        f"============ Summary ============\n"
+        f"Matches only in expected : {expected_only}\n"
+        f"Matches only in observed : {observed_only}\n"
+        f"Matches that differ      : {different}\n"
+        f"Identical matches        : {both}"
+    )
+    if expected_only or observed_only or different:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,58 +2,325 @@
 # -*- coding: utf-8 -*-
 # Test for mismatches in hits (presence/absence) between two versions of IPS
 # Default args assuming this is running in the root of the repo
-import ast
+# Matches are compared on (md5, signature accession, location start, location end),
+# from the JSON, TSV or XML outputs (the two files can be in different formats)
+# With --max_memory, outputs too large to fit in memory are compared with an
+# external sort: the matches are spilled to sorted runs on disk, then merge-joined
 import argparse
-import difflib
+import heapq
 import json
+import re
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+from collections import Counter
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+
+
+FORMATS = ("json", "tsv", "xml")
+RESULTS_PATTERN = re.compile(r'"results"\s*:\s*\[')
+# A start of RESULTS_PATTERN at the end of the buffer, that the next chunk may complete
+RESULTS_PREFIX_PATTERN = re.compile(r'"(?:r(?:e(?:s(?:u(?:l(?:t(?:s(?:"\s*(?::\s*)?)?)?)?)?)?)?)?)?\Z')
+SEPARATOR_PATTERN = re.compile(r"[\s,]*")
+CHUNK_SIZE = 1 << 20
+KEY_BYTES = 400  # approximate memory used by a match waiting to be sorted
+MAX_OPEN_RUNS = 64
+
 
 def main():
     parser = argparse.ArgumentParser(prog="IPS_match_regression_test", description="Check presence of matches", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument("--expected", type=str, default="tests/data/test_prot.fa.json", help="JSON with expected results")
-    parser.add_argument("--observed", type=str, default="test_prot.fa.json", help="JSON output file from IPS6")
+    parser.add_argument("--expected", type=str, default="tests/data/test_prot.fa.json", help="IPS output with expected results")
+    parser.add_argument("--observed", type=str, default="test_prot.fa.json", help="IPS6 output file")
+    parser.add_argument("--format", type=str, choices=("auto",) + FORMATS, default="auto", help="Format of the outputs, 'auto' uses the file extensions")
+    parser.add_argument("--signatures", type=int, default=20, help="Number of signatures with the most differences to list in the summary (0 lists all)")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary, not every match")
+    parser.add_argument("--exit_code", action="store_true", help="Exit with 1 when matches differ")
+    parser.add_argument("--max_memory", type=int, default=0, help="Memory (MB) for an external sort comparison of outputs too large to fit in memory (0 loads both outputs in memory)")
+    parser.add_argument("--tmp_dir", type=str, default=None, help="Directory for the sorted runs of the external sort")
     args = parser.parse_args()
 
-    with open(args.expected, "r") as fh:
-        expected = flattern_dict(json.load(fh))
-    with open(args.observed, "r") as fh:
-        observed = flattern_dict(json.load(fh))
+    if args.max_memory:
+        counts = compare_sorted(args.expected, args.observed, args.format, args.max_memory, args.tmp_dir, args.quiet)
+    else:
+        expected = read_matches(args.expected, args.format)
+        observed = read_matches(args.observed, args.format)
+        expected_only, observed_only = compare_matches(expected, observed)
 
-    diff = difflib.ndiff(sorted(expected), sorted(observed))
-    expected_only, observed_only, both = 0, 0, 0
-    for line in diff:
-        if line.startswith(("-", "+", " ")):  # skip summary lines such as "?    ^^^^  -    ^^  ^ ^"
-            try:
-                tab_separated = '\t'.join(map(str, ast.literal_eval(line[2:])))  # Safely eval str and convert to tab-sep str
-                if line.startswith("-"):
-                    print(f"< {tab_separated}")  # Only in expected
-                    expected_only += 1
-                elif line.startswith("+"):
-                    print(f"> {tab_separated}")  # Only in observed
-                    observed_only += 1
-                elif line.startswith(" "):
-                    print(f"- {tab_separated}")  # In both
-                    both += 1
-            except (SyntaxError, ValueError):
-                print(f"Could not parse line {line}")
+        if not args.quiet:
+            for key in sorted(expected.keys() | observed.keys()):
+                if key in expected_only:
+                    print(f"< {format_match(key)}")  # Only in expected
+                elif key in observed_only:
+                    print(f"> {format_match(key)}")  # Only in observed
+                else:
+                    print(f"- {format_match(key)}")  # In both
+        counts = summarise(expected, observed, expected_only, observed_only)
 
+    expected_only, observed_only, both = (sum(column) for column in zip([0, 0, 0], *counts.values()))
     print(
         f"============ Summary ============\n"
         f"Matches only in expected : {expected_only}\n"
         f"Matches only in observed : {observed_only}\n"
         f"Matches in both          : {both}"
     )
+    print_summary("Member database", summary_rows(counts, by_library=True))
+    signatures = summary_rows(counts, by_library=False)
+    signatures = [row for row in signatures if row[1] or row[2]]
+    print_summary("Signature", signatures[:args.signatures] if args.signatures else signatures, total=len(signatures))
+
+    if args.exit_code and (expected_only or observed_only):
+        sys.exit(1)
+
+
+def iter_matches(path: str, fmt: str = "auto"):
+    """(md5, member db, signature accession, start, end) of each location of an IPS output"""
+    if fmt == "auto":
+        fmt = path.rsplit(".", 1)[-1].lower()
+        if fmt not in FORMATS:
+            raise ValueError(f"Cannot guess the format of {path}, use --format")
+    readers = {"json": iter_json_matches, "tsv": iter_tsv_matches, "xml": iter_xml_matches}
+    return readers[fmt](path)
+
+
+def read_matches(path: str, fmt: str = "auto") -> dict:
+    """{(md5, signature accession, start, end): member database} of the matches of an IPS output"""
+    return {(md5, sig_acc, start, end): library for md5, library, sig_acc, start, end in iter_matches(path, fmt)}
+
+
+def iter_json_matches(path: str):
+    """Locations of a JSON output"""
+    for result in iter_json_results(path):
+        yield from protein_matches(result)
+
+
+def iter_json_results(path: str):
+    """Items of the "results" array of a JSON output, decoded one at a time
+    so that the whole document is never held in memory"""
+    decoder = json.JSONDecoder()
+    with open(path, "r") as fh:
+        buffer = ""
+        while True:  # IPS writes the version fields, then the results
+            chunk = fh.read(CHUNK_SIZE)
+            buffer += chunk
+            match = RESULTS_PATTERN.search(buffer)
+            if match:
+                buffer, position = buffer[match.end():], 0
+                break
+            if not chunk:
+                raise ValueError(f"No results array in {path}")
+            # Keep the end of the buffer in case the key spans two chunks
+            prefix = RESULTS_PREFIX_PATTERN.search(buffer)
+            buffer = buffer[prefix.start():] if prefix else ""
+
+        while True:
+            position = SEPARATOR_PATTERN.match(buffer, position).end()
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                if position == len(buffer):
+                    raise json.JSONDecodeError("Need more data", buffer, position)
+                result, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The item continues in the next chunk: read at least as much as is pending,
+                # so that a large item is decoded a logarithmic number of times
+                chunk = fh.read(max(CHUNK_SIZE, len(buffer) - position))
+                if not chunk:
+                    raise ValueError(f"Truncated results array in {path}")
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            yield result
+
+
+def protein_matches(protein_dict: dict):
+    """Locations of a protein of the JSON "results", or of the ORFs of a nucleotide sequence"""
+    if "openReadingFrames" in protein_dict:
+        for orf in protein_dict["openReadingFrames"]:
+            yield from protein_matches(orf["protein"])
+        return
+    md5 = protein_dict["md5"].upper()  # account for diff between iprscn 5 and 6
+    for match in protein_dict["matches"]:
+        signature = match["signature"]
+        library = (signature.get("signatureLibraryRelease") or {}).get("library") or "-"
+        for loc in match["locations"]:
+            yield md5, library, signature["accession"], int(loc["start"]), int(loc["end"])
+
+
+def iter_tsv_matches(path: str):
+    """Locations of a TSV output: seqId md5 seqLength memberDb sigAcc sigDesc start end ..."""
+    with open(path, "r") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            fields = line.rstrip("\n").split("\t")
+            yield fields[1].upper(), fields[3], fields[4], int(fields[6]), int(fields[7])
+
+
+def iter_xml_matches(path: str):
+    """Locations of an XML output, parsed one protein at a time"""
+    depth, root = 0, None
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            root = element if root is None else root
+            depth += 1
+            continue
+        depth -= 1
+        if local_name(element.tag) == "protein":
+            yield from xml_protein_matches(element)
+        if depth == 1:
+            # Done with a protein or nucleotide sequence: free it
+            root.clear()
+
+
+def xml_protein_matches(element: ET.Element):
+    md5 = next(
+        child.get("md5") for child in element if local_name(child.tag) == "sequence"
+    ).upper()
+    for match in element.iter():
+        if local_name(match.tag) != "match":
+            continue
+        signature, library = None, "-"
+        for node in match.iter():
+            tag = local_name(node.tag)
+            if tag == "signature" and signature is None:
+                signature = node.get("ac")
+            elif tag == "signature-library-release":
+                library = node.get("library")
+            elif tag == "location":
+                yield md5, library, signature, int(node.get("start")), int(node.get("end"))
+
+
+def local_name(tag: str) -> str:
+    """Tag without its XML namespace"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def compare_matches(expected: dict, observed: dict) -> tuple[set, set]:
+    """Hash join of the match keys: the matches only in expected, and only in observed"""
+    expected_keys, observed_keys = expected.keys(), observed.keys()
+    return expected_keys - observed_keys, observed_keys - expected_keys
+
+
+def summarise(expected: dict, observed: dict, expected_only: set, observed_only: set) -> dict:
+    """{(signature accession, member db): [only in expected, only in observed, in both]}"""
+    expected_total = Counter(zip(map(itemgetter(1), expected), expected.values()))
+    counts = {signature: [0, 0, total] for signature, total in expected_total.items()}
+    for key in expected_only:
+        signature = (key[1], expected[key])
+        counts[signature][0] += 1
+        counts[signature][2] -= 1
+    for key in observed_only:
+        counts.setdefault((key[1], observed[key]), [0, 0, 0])[1] += 1
+    return counts
+
+
+def compare_sorted(expected_path: str, observed_path: str, fmt: str, max_memory: int, tmp_dir: str | None, quiet: bool) -> dict:
+    """Merge join of the externally sorted matches of the two outputs, using about
+    max_memory MB. Print the matches, return the counts of summarise()."""
+    max_matches = max(1000, max_memory * 1000 ** 2 // KEY_BYTES)
+    counts = {}
+    with tempfile.TemporaryDirectory(prefix="ips_matches_", dir=tmp_dir) as tmp:
+        tmp = Path(tmp)
+        expected = external_sort(iter_matches(expected_path, fmt), tmp / "expected", max_matches)
+        observed = external_sort(iter_matches(observed_path, fmt), tmp / "observed", max_matches)
+        for side, key, library in merge_join(expected, observed):
+            counts.setdefault((key[1], library), [0, 0, 0])[side] += 1
+            if not quiet:
+                print(f"{'<>-'[side]} {format_match(key)}")  # Only in expected, only in observed, in both
+    return counts
+
+
+def external_sort(matches, run_dir: Path, max_matches: int):
+    """Sort the matches in runs of max_matches written to run_dir, then merge the runs.
+    Yield the distinct ((md5, signature accession, start, end), member db), in order."""
+    run_dir.mkdir()
+    runs, batch = [], []
+    for md5, library, sig_acc, start, end in matches:
+        batch.append((md5, sig_acc, start, end, library))
+        if len(batch) >= max_matches:
+            runs.append(write_run(batch, run_dir / f"{len(runs)}.tsv"))
+            batch = []
+    if batch or not runs:
+        runs.append(write_run(batch, run_dir / f"{len(runs)}.tsv"))
+    del batch
+
+    # Merge the runs by groups, so that not too many files are open at once
+    while len(runs) > MAX_OPEN_RUNS:
+        merged = []
+        for i in range(0, len(runs), MAX_OPEN_RUNS):
+            group = runs[i:i + MAX_OPEN_RUNS]
+            path = run_dir / f"merged_{len(runs)}_{i}.tsv"
+            with open(path, "w") as fh:
+                fh.writelines(format_run_line(match) for match in heapq.merge(*map(read_run, group)))
+            for run in group:
+                run.unlink()
+            merged.append(path)
+        runs = merged
+
+    for key, group in groupby(heapq.merge(*map(read_run, runs)), key=itemgetter(0, 1, 2, 3)):
+        yield key, next(group)[4]
+
+
+def write_run(batch: list, path: Path) -> Path:
+    batch.sort()
+    with open(path, "w") as fh:
+        fh.writelines(format_run_line(match) for match in batch)
+    return path
+
+
+def format_run_line(match: tuple) -> str:
+    return "\t".join(map(str, match)) + "\n"
+
+
+def read_run(path: Path):
+    with open(path, "r") as fh:
+        for line in fh:
+            md5, sig_acc, start, end, library = line.rstrip("\n").split("\t")
+            yield md5, sig_acc, int(start), int(end), library
+
+
+def merge_join(expected, observed):
+    """Walk two sorted streams of (key, member db): yield (0, key, db) for the keys
+    only in expected, (1, key, db) only in observed, and (2, key, db) in both"""
+    expected_item, observed_item = next(expected, None), next(observed, None)
+    while expected_item is not None or observed_item is not None:
+        if observed_item is None or (expected_item is not None and expected_item[0] < observed_item[0]):
+            yield 0, *expected_item
+            expected_item = next(expected, None)
+        elif expected_item is None or observed_item[0] < expected_item[0]:
+            yield 1, *observed_item
+            observed_item = next(observed, None)
+        else:
+            yield 2, *expected_item
+            expected_item, observed_item = next(expected, None), next(observed, None)
+
+
+def summary_rows(counts: dict, by_library: bool) -> list:
+    """[(member db or signature, only in expected, only in observed, in both)], most differences first"""
+    totals = {}
+    for (sig_acc, library), signature_counts in counts.items():
+        label = library if by_library else f"{sig_acc} ({library})"
+        totals[label] = [a + b for a, b in zip(totals.get(label, [0, 0, 0]), signature_counts)]
+    rows = [(label, *label_counts) for label, label_counts in totals.items()]
+    return sorted(rows, key=lambda row: (-(row[1] + row[2]), row[0]))
+
+
+def print_summary(title: str, rows: list, total: int | None = None):
+    if not rows:
+        return
+    width = max(len(title), *(len(row[0]) for row in rows))
+    heading = f"{title:<{width}}  expected only  observed only      both"
+    print(f"\n{heading}\n{'-' * len(heading)}")
+    for label, expected_only, observed_only, both in rows:
+        print(f"{label:<{width}}  {expected_only:>13}  {observed_only:>13}  {both:>8}")
+    if total is not None and total > len(rows):
+        print(f"... {total - len(rows)} more signatures with differences")
 
 
-def flattern_dict(iprsn_dict: dict):
-    """Convert all matches into lists, keeping only the data we care about"""
-    matches = []  # [[md5, sig_acc, loc start, loc end]]
-    for protein_dict in iprsn_dict["results"]:
-        md5 = protein_dict["md5"].upper()  # account for diff between iprscn 5 and 6
-        for match in protein_dict["matches"]:
-            sig_acc = match["signature"]["accession"]
-            for loc in match["locations"]:
-                matches.append([md5, sig_acc, loc["start"], loc["end"]])
-    return [repr(nested) for nested in matches]
+def format_match(key: tuple) -> str:
+    return "\t".join(map(str, key))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Build xrefs.db, the indexed store of the InterPro entries, member database
+versions, GO terms and pathways read by the XREFS process, from the JSON files
+of an InterPro data release (entries.json, databases.json, goterms.json,
+goterms.ipr.json, pathways.json and pathways.ipr.json).
+
+Run at data release time, e.g.
+    python utilities/xrefs/build_xrefs_db.py --interpro_dir data/interpro/101.0
+
+XREFS then only looks up the signatures matched in each chunk, instead of
+loading all the JSON files for every chunk. With --matches, only the entries
+of the signatures matched in a matches JSON file are kept (and their GO terms
+and pathways), to build small stores for the unit tests.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+
+from pathlib import Path
+
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE METADATA (
+    key          TEXT NOT NULL PRIMARY KEY,
+    value        TEXT
+) WITHOUT ROWID;
+CREATE TABLE DATABASE_VERSION (
+    name         TEXT NOT NULL PRIMARY KEY,
+    version      TEXT
+) WITHOUT ROWID;
+CREATE TABLE ENTRY (
+    accession             TEXT NOT NULL PRIMARY KEY,
+    name                  TEXT,
+    description           TEXT,
+    type                  TEXT,
+    integrated            TEXT,
+    representative_type   TEXT,
+    representative_index  INTEGER,  -- NULL when the signature has no representative info
+    database              TEXT
+) WITHOUT ROWID;
+CREATE TABLE GO_TERM (
+    id           TEXT NOT NULL PRIMARY KEY,
+    name         TEXT,
+    category     TEXT
+) WITHOUT ROWID;
+CREATE TABLE ENTRY_GO_TERM (
+    accession    TEXT NOT NULL,
+    position     INTEGER NOT NULL,
+    go_id        TEXT NOT NULL,
+    PRIMARY KEY (accession, position)
+) WITHOUT ROWID;
+CREATE TABLE PATHWAY (
+    id           TEXT NOT NULL PRIMARY KEY,
+    database     TEXT,
+    name         TEXT
+) WITHOUT ROWID;
+CREATE TABLE ENTRY_PATHWAY (
+    accession    TEXT NOT NULL,
+    position     INTEGER NOT NULL,
+    pathway_id   TEXT NOT NULL,
+    PRIMARY KEY (accession, position)
+) WITHOUT ROWID;
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="build_xrefs_db", description="Build the InterPro xrefs store read by XREFS", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--interpro_dir", type=Path, required=True, help="Directory of the InterPro data release")
+    parser.add_argument("--output", type=Path, default=None, help="Output SQLite file [default: <interpro_dir>/xrefs.db]")
+    parser.add_argument("--matches", type=Path, default=None, help="Only keep the entries of the signatures matched in this matches JSON file")
+    args = parser.parse_args()
+
+    output = args.output or args.interpro_dir / "xrefs.db"
+    databases, entries = load_entries(args.interpro_dir)
+    go_terms, entry_go_terms = load_xrefs(args.interpro_dir / "goterms")
+    pathways, entry_pathways = load_xrefs(args.interpro_dir / "pathways")
+    go_terms = go_terms.get("terms", go_terms)  # {"terms": {id: [name, category]}, ...}
+
+    if args.matches:
+        with open(args.matches, "r") as fh:
+            keep = matched_accessions(json.load(fh), entries)
+        entries = {acc: entries[acc] for acc in keep}
+        entry_go_terms = {acc: ids for acc, ids in entry_go_terms.items() if acc in keep}
+        entry_pathways = {acc: ids for acc, ids in entry_pathways.items() if acc in keep}
+        go_terms = select(go_terms, entry_go_terms)
+        pathways = select(pathways, entry_pathways)
+
+    write_store(output, databases, entries, go_terms, entry_go_terms, pathways, entry_pathways)
+    print(
+        f"Wrote {output}: {len(entries)} entries and signatures, "
+        f"{len(go_terms)} GO terms, {len(pathways)} pathways"
+    )
+
+
+def load_entries(interpro_dir: Path) -> tuple[dict, dict]:
+    """Member database versions and entries of a release: databases.json and entries.json,
+    or a single entries.json with "databases" and "entries" objects"""
+    with open(interpro_dir / "entries.json", "r") as fh:
+        entries = json.load(fh)
+    if "entries" in entries and "databases" in entries:
+        return entries["databases"], entries["entries"]
+    with open(interpro_dir / "databases.json", "r") as fh:
+        return json.load(fh), entries
+
+
+def load_xrefs(prefix: Path) -> tuple[dict, dict]:
+    """Info of each GO term or pathway (<prefix>.json), and the ids of each entry (<prefix>.ipr.json)"""
+    info, ipr2ids = {}, {}
+    if prefix.with_suffix(".json").exists():
+        with open(prefix.with_suffix(".json"), "r") as fh:
+            info = json.load(fh)
+    if prefix.with_suffix(".ipr.json").exists():
+        with open(prefix.with_suffix(".ipr.json"), "r") as fh:
+            ipr2ids = json.load(fh)
+    return info, ipr2ids
+
+
+def matched_accessions(matches: dict, entries: dict) -> set:
+    """Signatures matched in a {seq: {model acc: match}} file, and the entries they are integrated in"""
+    accessions = set()
+    for seq_matches in matches.values():
+        for model_acc, match in seq_matches.items():
+            accessions.add(model_acc)
+            signature = match.get("signature") or {}
+            accessions.add(signature.get("accession") or match.get("accession") or model_acc)
+            entry = signature.get("entry") or match.get("entry") or {}
+            accessions.add(entry.get("accession"))
+    accessions = {acc for acc in accessions if acc in entries}
+    accessions |= {entries[acc]["integrated"] for acc in accessions if entries[acc].get("integrated") in entries}
+    return accessions
+
+
+def select(info: dict, ipr2ids: dict) -> dict:
+    ids = {xref_id for xref_ids in ipr2ids.values() for xref_id in xref_ids}
+    return {xref_id: value for xref_id, value in info.items() if xref_id in ids}
+
+
+def entry_row(accession: str, entry: dict) -> tuple:
+    representative = entry.get("representative")
+    database = entry.get("database")
+    if isinstance(database, dict):
+        database = database.get("name")
+    return (
+        accession,
+        entry.get("name"),
+        entry.get("description"),
+        entry.get("type"),
+        entry.get("integrated"),
+        representative.get("type") if representative is not None else None,
+        representative.get("index") if representative is not None else None,
+        database,
+    )
+
+
+def write_store(
+    output: Path,
+    databases: dict,
+    entries: dict,
+    go_terms: dict,
+    entry_go_terms: dict,
+    pathways: dict,
+    entry_pathways: dict
+):
+    """Write the store to a temporary file, then move it in place:
+    XREFS tasks may be reading the previous one"""
+    tmp_path = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+    tmp_path.unlink(missing_ok=True)
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.execute("PRAGMA journal_mode = OFF")
+        con.execute("PRAGMA synchronous = OFF")
+        con.executescript(SCHEMA)
+        with con:
+            con.executemany(
+                "INSERT INTO METADATA VALUES (?, ?)",
+                [("schema_version", str(SCHEMA_VERSION)), ("interpro_version", databases.get("InterPro"))]
+            )
+            con.executemany("INSERT INTO DATABASE_VERSION VALUES (?, ?)", databases.items())
+            con.executemany(
+                "INSERT INTO ENTRY VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (entry_row(acc, entry) for acc, entry in entries.items())
+            )
+            con.executemany(
+                "INSERT INTO GO_TERM VALUES (?, ?, ?)",
+                ((go_id, name, category) for go_id, (name, category) in go_terms.items())
+            )
+            con.executemany(
+                "INSERT INTO ENTRY_GO_TERM VALUES (?, ?, ?)",
+                ((acc, i, go_id) for acc, go_ids in entry_go_terms.items() for i, go_id in enumerate(go_ids))
+            )
+            con.executemany(
+                "INSERT INTO PATHWAY VALUES (?, ?, ?)",
+                ((pa_id, database, name) for pa_id, (database, name) in pathways.items())
+            )
+            con.executemany(
+                "INSERT INTO ENTRY_PATHWAY VALUES (?, ?, ?)",
+                ((acc, i, pa_id) for acc, pa_ids in entry_pathways.items() for i, pa_id in enumerate(pa_ids))
+            )
+        con.execute("ANALYZE")
+        con.execute("VACUUM")
+    finally:
+        con.close()
+    os.replace(tmp_path, output)
+
+
+if __name__ == "__main__":
+    main()